@@ -0,0 +1,195 @@
+# feedback_store.py
+"""
+Durable thumbs-up/down feedback.
+
+Every vote is appended to a local SQLite log (WAL mode) so it survives the
+browser tab and the process. Clicks only touch memory: they go into a
+write-behind buffer that a background thread flushes in one transaction
+every `flush_interval_s` (or as soon as `max_buffer` votes are waiting),
+and into pre-aggregated counters that are loaded from the log once at
+startup and then read in O(1).
+
+Items are identified by stable keys derived from content rather than from
+their position on the page (see project_key / item_key), so "F1" of two
+different projects never share counts.
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+
+DIRECTIONS = ("up", "down")
+
+
+# ----------------- STABLE KEYS ----------------- #
+
+def _digest(text: str, n: int = 12) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:n]
+
+
+def project_key(text: str) -> str:
+    """
+    Key of a project: hash of its source text (or of anything else that
+    identifies it, e.g. the saved result), e.g. "p-1a2b3c4d5e6f".
+    """
+    return "p-" + _digest(" ".join((text or "").split()))
+
+
+def item_key(proj_key: str, item_type: str, *titles) -> str:
+    """
+    Key of an epic / feature / story inside a project, from its title path:
+      item_key(pk, "epic", epic_title)
+      item_key(pk, "feature", feature_title)
+      item_key(pk, "story", feature_title, story_title)
+    Titles are case- and whitespace-normalized; callers that can have two
+    identical titles under the same parent pass an extra disambiguator.
+    """
+    path = "\x1f".join(" ".join(str(t).lower().split()) for t in titles)
+    return f"{proj_key}:{item_type}:{_digest(path)}"
+
+
+# ----------------- STORE ----------------- #
+
+class FeedbackStore:
+    """
+    Usage:
+        store = FeedbackStore("feedback.db")
+        counts = store.record(pk, "story", key, "up", label="F1-S2")
+        store.counts(key)     # {"up": 1, "down": 0}
+        store.totals()        # {("story", "up"): 1, ...}
+    """
+
+    def __init__(self, path: str = "feedback.db", flush_interval_s: float = 1.0, max_buffer: int = 256):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer = max_buffer
+
+        self._lock = threading.Lock()          # buffer + counters
+        self._write_lock = threading.Lock()    # sqlite connection
+        self._buffer = []
+        self._counts = defaultdict(lambda: {"up": 0, "down": 0})   # item key -> counts
+        self._totals = defaultdict(int)                            # (item_type, direction) -> n
+
+        self._wake = threading.Event()
+        self._closed = False
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS votes (
+                ts          REAL NOT NULL,
+                project_key TEXT NOT NULL,
+                item_type   TEXT NOT NULL,
+                item_key    TEXT NOT NULL,
+                label       TEXT,
+                direction   TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._load_counters()
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="feedback-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # ---------- internals ----------
+
+    def _load_counters(self):
+        rows = self._conn.execute(
+            "SELECT item_type, item_key, direction, COUNT(*) FROM votes "
+            "GROUP BY item_type, item_key, direction"
+        )
+        for item_type, key, direction, n in rows:
+            self._counts[key][direction] += n
+            self._totals[(item_type, direction)] += n
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                # the votes stay buffered; the next flush retries them
+                print(f"⚠️ Could not write feedback to {self.path}: {e}")
+
+    # ---------- public API ----------
+
+    def record(self, proj_key: str, item_type: str, key: str, direction: str, label: str = "") -> dict:
+        """
+        Count one vote and queue it for the log. Returns the item's updated
+        counts. Never touches the disk.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}, got {direction!r}")
+
+        with self._lock:
+            counts = self._counts[key]
+            counts[direction] += 1
+            self._totals[(item_type, direction)] += 1
+            self._buffer.append((time.time(), proj_key, item_type, key, label, direction))
+            full = len(self._buffer) >= self.max_buffer
+            snapshot = dict(counts)
+
+        if full:
+            self._wake.set()
+        return snapshot
+
+    def flush(self) -> int:
+        """
+        Write the buffered votes in one transaction. Returns how many. If
+        the write fails the votes go back to the front of the buffer.
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        try:
+            with self._write_lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO votes (ts, project_key, item_type, item_key, label, direction) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    batch,
+                )
+        except sqlite3.Error:
+            with self._lock:
+                self._buffer[:0] = batch
+            raise
+        return len(batch)
+
+    def counts(self, key: str) -> dict:
+        with self._lock:
+            counts = self._counts.get(key)
+            return dict(counts) if counts else {"up": 0, "down": 0}
+
+    def totals(self) -> dict:
+        """
+        {(item_type, direction): votes} over every project.
+        """
+        with self._lock:
+            return dict(self._totals)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=5)
+        try:
+            self.flush()
+        finally:
+            with self._write_lock:
+                self._conn.close()
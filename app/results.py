@@ -1,11 +1,28 @@
+import os
 import json
+import html
+import base64
+import threading
+import requests
 import gradio as gr
 
 # ---- import your sidebar helpers ----
 from agileai_side import SIDEBAR_CSS, build_sidebar
+from feedback_store import FeedbackStore, project_key, item_key
 
 RESULT_PATH = "training_example_1.json"   # adjust if needed
 
+# agileai-backend /analyze URL (set by docker-compose); votes are also
+# counted there (/feedback -> /metrics)
+BACKEND_URL = os.environ.get("BACKEND_URL", "")
+BACKEND_BASE_URL = BACKEND_URL.rstrip("/").rsplit("/analyze", 1)[0]
+
+# Append-only vote log (SQLite, WAL); survives restarts
+FEEDBACK_DB = os.environ.get("AGILEAI_FEEDBACK_DB", "feedback.db")
+
+# Features rendered before a "Show more" row
+FEATURE_PAGE_SIZE = 20
+
 # Direct icon URLs (CDN) - small thumb favicons
 THUMB_UP_ICON = "https://cdnjs.cloudflare.com/ajax/libs/bootstrap-icons/1.8.2/icons/hand-thumbs-up.svg"
 THUMB_DOWN_ICON = "https://cdnjs.cloudflare.com/ajax/libs/bootstrap-icons/1.8.2/icons/hand-thumbs-down.svg"
@@ -19,10 +36,10 @@ def load_result(path=RESULT_PATH):
 
 
 def story_body_html(story):
-    ac_list = "".join(f"<li>{item}</li>" for item in story["acceptance_criteria"])
-    dor_list = "".join(f"<li>{item}</li>" for item in story["definition_of_ready"])
+    ac_list = "".join(f"<li>{html.escape(item)}</li>" for item in story["acceptance_criteria"])
+    dor_list = "".join(f"<li>{html.escape(item)}</li>" for item in story["definition_of_ready"])
     return f"""
-<p class="story-description">{story['description']}</p>
+<p class="story-description">{html.escape(story['description'])}</p>
 
 <div class="story-section-label">Acceptance criteria</div>
 <ul class="story-list">{ac_list}</ul>
@@ -30,29 +47,392 @@ def story_body_html(story):
 <div class="story-section-label">Definition of Ready</div>
 <ul class="story-list">{dor_list}</ul>
 
-<div class="story-raw-ref">Source: {story['raw_text_reference']}</div>
+<div class="story-raw-ref">Source: {html.escape(story['raw_text_reference'])}</div>
+"""
+
+
+# ----------------- STREAMING ----------------- #
+
+def _replay_events(data):
+    """
+    Turn a finished result JSON into the same event sequence the backend
+    streams, so the progressive view also works without a backend.
+    """
+    features = data["features"]
+    yield {"type": "epic", "epic": {"id": "E1", **data["epic"]}}
+    for f_idx, feat in enumerate(features, start=1):
+        info = {k: v for k, v in feat.items() if k != "stories"}
+        yield {"type": "feature", "feature": {"id": f"F{f_idx}", **info}}
+    for f_idx, feat in enumerate(features, start=1):
+        yield {"type": "stories", "feature_id": f"F{f_idx}", "user_stories": feat["stories"]}
+    yield {"type": "done"}
+
+
+def read_upload(file):
+    """
+    /analyze fields for an uploaded document: {"pdf_base64": ...} for a PDF
+    (the backend extracts and cleans it), {"project_text": ...} otherwise.
+    `file` is a path or a gr.File value.
+    """
+    path = getattr(file, "name", file)
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.lower().endswith(".pdf"):
+        return {"pdf_base64": base64.b64encode(data).decode("ascii")}
+    return {"project_text": data.decode("utf-8", errors="replace")}
+
+
+def iter_result_events(project_text=None, num_features=5, stories_per_feature=3, pdf_base64=None):
+    """
+    Yields pipeline events (see backend titles.iter_agileai_titles):
+    streamed from the backend /analyze/stream when BACKEND_URL is set
+    and there is a document (project_text or pdf_base64), otherwise
+    replayed from RESULT_PATH.
+    """
+    if not (BACKEND_URL and (project_text or pdf_base64)):
+        yield from _replay_events(load_result())
+        return
+
+    document = {"pdf_base64": pdf_base64} if pdf_base64 else {"project_text": project_text}
+    with requests.post(
+        BACKEND_BASE_URL + "/analyze/stream",
+        json={
+            **document,
+            "num_features": num_features,
+            "stories_per_feature": stories_per_feature,
+        },
+        stream=True,
+        timeout=(5, 600),
+    ) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def result_project_key(project_text=None, pdf_base64=None):
+    """
+    Stable feedback key of the project shown by iter_result_events.
+    """
+    if BACKEND_URL and (project_text or pdf_base64):
+        return project_key(project_text or pdf_base64)
+    return project_key(json.dumps(load_result(), sort_keys=True))
+
+
+def new_view(data=None, proj_key=None):
+    """
+    Everything the tree view needs, kept in a gr.State:
+      project_key: stable key of the project (feedback_store.project_key)
+      epic:     {"id", "title", ...} or None while generating
+      features: [{"id", "title", ..., "stories": [...]}]; "stories" is
+                missing until that feature's stories have arrived
+      done:     True once the pipeline finished
+      expanded: ids of the features whose stories are shown
+      visible:  how many features are rendered (grows with "Show more")
+    Epic, features and stories get a stable "key" for feedback.
+    `data` is a finished result JSON (RESULT_PATH format).
+    """
+    if proj_key is None and data is not None:
+        proj_key = project_key(json.dumps(data, sort_keys=True))
+    view = {
+        "project_key": proj_key,
+        "epic": None,
+        "features": [],
+        "done": False,
+        "expanded": [],
+        "visible": FEATURE_PAGE_SIZE,
+    }
+    if data is not None:
+        for event in _replay_events(data):
+            apply_event(view, event)
+    return view
+
+
+def apply_event(view, event):
+    pk = view["project_key"]
+    kind = event["type"]
+    if kind == "epic":
+        epic = dict(event["epic"])
+        epic["key"] = item_key(pk, "epic", epic["title"])
+        view["epic"] = epic
+    elif kind == "feature":
+        feat = dict(event["feature"])
+        feat["key"] = item_key(pk, "feature", feat["title"])
+        view["features"].append(feat)
+    elif kind == "stories":
+        for feat in view["features"]:
+            if feat["id"] == event["feature_id"]:
+                feat["stories"] = [
+                    dict(story, key=item_key(pk, "story", feat["title"], story["title"]))
+                    for story in event["user_stories"]
+                ]
+    elif kind == "done":
+        view["done"] = True
+    elif kind == "error":
+        raise gr.Error(event["error"])
+    return view
+
+
+def stream_results(project_text=None, view=None, pdf_base64=None):
+    """
+    Gradio generator: yields (stats_html, tree_html, view) after every event
+    so the page shows the epic as soon as it exists instead of after the
+    last story.
+
+    `view` is the page's current view state. Streamed nodes are merged into
+    it in place rather than replacing it: handle_tree_action changes the
+    same dict, so features expanded or collapsed while the stream runs stay
+    that way on the next yield (and across a re-run of the same project).
+    """
+    proj_key = result_project_key(project_text, pdf_base64)
+    if view is None or view["project_key"] != proj_key:
+        view = new_view(proj_key=proj_key)
+    else:
+        view.update(epic=None, features=[], done=False)
+    yield stats_html(view), results_tree_html(view), view
+    for event in iter_result_events(project_text, pdf_base64=pdf_base64):
+        apply_event(view, event)
+        yield stats_html(view), results_tree_html(view), view
+
+
+def stream_document(document, view=None):
+    """
+    stream_results for a {"project_text"} / {"pdf_base64"} dict (read_upload).
+    """
+    yield from stream_results(view=view, **(document or {}))
+
+
+def stream_upload(file, view=None):
+    if file is None:
+        return
+    yield from stream_document(read_upload(file), view)
+
+
+# ----------------- TREE VIEW ----------------- #
+
+def stats_html(view):
+    total_features = len(view["features"])
+    total_stories = sum(len(f.get("stories", [])) for f in view["features"])
+    return f"""
+<div class="stats-row">
+  <div class="stat-card">
+    <div class="stat-label">Epics</div>
+    <div class="stat-value">1</div>
+  </div>
+  <div class="stat-card">
+    <div class="stat-label">Features</div>
+    <div class="stat-value">{total_features}</div>
+  </div>
+  <div class="stat-card">
+    <div class="stat-label">User Stories</div>
+    <div class="stat-value">{total_stories}</div>
+  </div>
+</div>
+"""
+
+
+def _vote_row_html(item_type, item, label):
+    # Stored counts are an O(1) dict read, so every rendered item shows them
+    counts = get_feedback_store().counts(item["key"])
+    attrs = (
+        f'data-action="vote" data-type="{item_type}" '
+        f'data-id="{html.escape(item["key"])}" data-label="{html.escape(label)}"'
+    )
+    return f"""
+<div class="vote-row">
+  <span class="vote-count">{counts['up'] or ''}</span>
+  <button class="vote-btn vote-up" {attrs} data-dir="up"></button>
+  <span class="vote-count">{counts['down'] or ''}</span>
+  <button class="vote-btn vote-down" {attrs} data-dir="down"></button>
+</div>
+"""
+
+
+def _story_label(feat, s_idx, story):
+    return story.get("id") or f"{feat['id']}-S{s_idx}"
+
+
+def _story_card_html(feat, s_idx, story):
+    # Backend titles-only stories have no body yet
+    body = story_body_html(story) if "description" in story else ""
+    return f"""
+<div class="story-card">
+  <div class="story-header-row">
+    <div class="story-header-left">
+      <span class="story-id">S{s_idx}</span>
+      <span class="story-title">{html.escape(story['title'])}</span>
+    </div>
+    {_vote_row_html("story", story, _story_label(feat, s_idx, story))}
+  </div>
+  {body}
+</div>
+"""
+
+
+def _feature_html(feat, expanded):
+    stories = feat.get("stories")
+    fid = html.escape(feat["id"])
+    label = f"{fid} · {html.escape(feat['title'])}"
+    if stories is not None:
+        label += f" · {len(stories)} Stories"
+
+    # Collapsed features cost one line; their story cards are only built on expand
+    if not expanded:
+        return (
+            f'<div class="feature-accordion"><details>'
+            f'<summary data-action="toggle" data-id="{fid}">{label}</summary>'
+            f"</details></div>"
+        )
+
+    header = ""
+    if "description" in feat:
+        header = f"""
+<div class="feature-header">
+  <div class="feature-header-title">{html.escape(feat['title'])}</div>
+  <div class="feature-header-sub">{html.escape(feat['description'])}</div>
+  <div class="feature-header-sub"><strong>Web page:</strong> {html.escape(feat.get('webpage', ''))}</div>
+</div>
+"""
+    if stories is None:
+        inner = '<div class="stream-pending">Generating stories…</div>'
+    else:
+        inner = "".join(_story_card_html(feat, i, st) for i, st in enumerate(stories, start=1))
+
+    return (
+        f'<div class="feature-accordion"><details open>'
+        f'<summary data-action="toggle" data-id="{fid}">{label}</summary>'
+        f'{_vote_row_html("feature", feat, feat["id"])}{header}{inner}'
+        f"</details></div>"
+    )
+
+
+def results_tree_html(view):
+    """
+    The whole epic -> features -> stories tree as one HTML string. Clicks
+    are handled by a single delegated listener (TREE_JS) that reports
+    `data-action` elements to `handle_tree_action`.
+    """
+    epic = view["epic"]
+    if epic is None:
+        return '<div class="stream-pending">Generating epic…</div>'
+
+    features = view["features"]
+    expanded = set(view["expanded"])
+    shown = features[:view["visible"]]
+    parts = [_feature_html(feat, feat["id"] in expanded) for feat in shown]
+
+    hidden = len(features) - len(shown)
+    if hidden > 0:
+        parts.append(
+            f'<div class="show-more" data-action="more">Show {min(hidden, FEATURE_PAGE_SIZE)} more '
+            f"of {hidden} remaining features</div>"
+        )
+    if not view["done"] and not features:
+        parts.append('<div class="stream-pending">Generating features…</div>')
+
+    summary = f'<div class="epic-summary">{html.escape(epic["summary"])}</div>' if epic.get("summary") else ""
+    epic_label = f"{html.escape(epic['id'])} · {html.escape(epic['title'])} · {len(features)} Features"
+    return (
+        f'<div class="epic-accordion"><details open><summary>{epic_label}</summary>'
+        f'{_vote_row_html("epic", epic, epic["id"])}{summary}{"".join(parts)}</details></div>'
+    )
+
+
+def handle_tree_action(action, view):
+    """
+    Single handler for every click in the tree.
+
+    action: "toggle|<feature id>", "vote|<item type>|<item key>|<up/down>|<label>"
+            or "more", each followed by "|<nonce>" so repeated clicks still
+            change the hidden textbox.
+    Returns (tree_html, toast, view).
+    """
+    parts = (action or "").split("|")
+    kind = parts[0]
+
+    if kind == "vote" and len(parts) >= 5:
+        item_type, key, direction, label = parts[1:5]
+        msg = handle_feedback(item_type, key, direction, view["project_key"], label)
+        return results_tree_html(view), msg, view
+
+    if kind == "toggle" and len(parts) >= 2:
+        fid = parts[1]
+        if fid in view["expanded"]:
+            view["expanded"].remove(fid)
+        else:
+            view["expanded"].append(fid)
+    elif kind == "more":
+        view["visible"] += FEATURE_PAGE_SIZE
+    else:
+        return gr.update(), gr.update(), view
+
+    return results_tree_html(view), gr.update(), view
+
+
+# Installed once on page load: one document-level listener for the whole tree
+TREE_JS = """
+() => {
+    if (window.__agileaiTreeBound) return [];
+    window.__agileaiTreeBound = true;
+    document.addEventListener("click", (e) => {
+        const el = e.target.closest("#results-tree [data-action]");
+        if (!el) return;
+        e.preventDefault();
+        const box = document.querySelector("#results-action textarea");
+        if (!box) return;
+        const d = el.dataset;
+        const fields = d.action === "vote" ? [d.action, d.type, d.id, d.dir, d.label]
+                     : d.action === "toggle" ? [d.action, d.id]
+                     : [d.action];
+        box.value = fields.concat([Date.now()]).join("|");
+        box.dispatchEvent(new Event("input", { bubbles: true }));
+    });
+    return [];
+}
 """
 
 
 # ----------------- FEEDBACK HANDLER ----------------- #
 
-def handle_feedback(item_type, item_id, direction, state):
+def _post_feedback(item_type, item_id, direction):
+    try:
+        requests.post(
+            BACKEND_BASE_URL + "/feedback",
+            json={"item_type": item_type, "item_id": item_id, "direction": direction},
+            timeout=2,
+        )
+    except Exception:
+        pass   # metrics are best-effort; never block the UI on them
+
+
+_feedback_store = None
+_feedback_store_lock = threading.Lock()
+
+
+def get_feedback_store():
+    global _feedback_store
+    with _feedback_store_lock:
+        if _feedback_store is None:
+            _feedback_store = FeedbackStore(FEEDBACK_DB)
+        return _feedback_store
+
+
+def handle_feedback(item_type, key, direction, proj_key, label):
     """
     item_type: 'epic' | 'feature' | 'story'
-    item_id:   'E1', 'F2', 'S3', etc.
+    key:       stable item key (feedback_store.item_key)
     direction: 'up' | 'down'
-    state:     dict stored in gr.State
+    proj_key:  stable project key
+    label:     what the page shows for the item ('E1', 'F2', 'F2-S3', ...)
     """
-    if state is None:
-        state = {}
+    counts = get_feedback_store().record(proj_key, item_type, key, direction, label=label)
 
-    key = f"{item_type}:{item_id}"
-    counts = state.get(key, {"up": 0, "down": 0})
-    counts[direction] += 1
-    state[key] = counts
+    if BACKEND_URL:
+        threading.Thread(
+            target=_post_feedback, args=(item_type, label, direction), daemon=True
+        ).start()
 
-    msg = f"Recorded {direction} vote for {item_type} {item_id}"
-    return msg, state
+    return f"Recorded {direction} vote for {item_type} {label} (👍 {counts['up']} · 👎 {counts['down']})"
 
 
 # ----------------- RESULTS-PAGE CSS ----------------- #
@@ -373,6 +753,31 @@ body, .gradio-container {{
 .vote-down {{
     background-image: url('{THUMB_DOWN_ICON}');
 }}
+
+.vote-count {{
+    font-size: 11px;
+    color: #6b7280;
+    align-self: center;
+}}
+
+/* hidden textbox the tree's click listener writes into */
+#results-action {{
+    display: none !important;
+}}
+
+.show-more {{
+    font-size: 12px;
+    color: #2563eb;
+    padding: 10px 16px;
+    cursor: pointer;
+}}
+
+/* placeholder while a stage is still generating */
+.stream-pending {{
+    font-size: 12px;
+    color: #6b7280;
+    padding: 8px 16px;
+}}
 """
 
 # combine sidebar + results css
@@ -381,15 +786,18 @@ COMBINED_CSS = SIDEBAR_CSS + RESULTS_CSS
 
 # ----------------- UI ----------------- #
 
-def build_results_app():
-    data = load_result()
-    epic = data["epic"]
-    features = data["features"]
-    total_features = len(features)
-    total_stories = sum(len(f["stories"]) for f in features)
-
+def build_results_app(stream=False, project_text=None, pdf_base64=None):
+    """
+    The backlog is one data-driven gr.HTML tree (see results_tree_html), so
+    the number of components does not depend on the backlog size.
+
+    stream=False: show the saved result from RESULT_PATH.
+    stream=True:  render the backlog progressively as the pipeline produces
+                  it (see stream_results) for `project_text` / `pdf_base64`
+                  (see read_upload), and for every document uploaded on the
+                  page; needs demo.queue() for generators.
+    """
     with gr.Blocks(css=COMBINED_CSS) as demo:
-        feedback_state = gr.State({})
         with gr.Row():
             # ---- SIDEBAR ----
             with gr.Column(elem_id="sidebar", scale=1, min_width=260):
@@ -440,6 +848,8 @@ def build_results_app():
 </div>
 """
                 )
+                if stream:
+                    upload = gr.File(label="Analyze a document", file_types=[".pdf", ".txt", ".md"])
 
                 # AI summary
                 gr.Markdown(
@@ -454,123 +864,37 @@ def build_results_app():
 """
                 )
 
-                # Stats
-                gr.Markdown(
-                    f"""
-<div class="stats-row">
-  <div class="stat-card">
-    <div class="stat-label">Epics</div>
-    <div class="stat-value">1</div>
-  </div>
-  <div class="stat-card">
-    <div class="stat-label">Features</div>
-    <div class="stat-value">{total_features}</div>
-  </div>
-  <div class="stat-card">
-    <div class="stat-label">User Stories</div>
-    <div class="stat-value">{total_stories}</div>
-  </div>
-</div>
-"""
+                stats_box = gr.HTML(elem_id="results-stats")
+                tree_box = gr.HTML(elem_id="results-tree")
+                view_state = gr.State()
+
+                # Hidden channel for the delegated click listener (TREE_JS)
+                action_box = gr.Textbox(elem_id="results-action", show_label=False, container=False)
+                action_box.change(
+                    handle_tree_action,
+                    [action_box, view_state],
+                    [tree_box, feedback_toast, view_state],
                 )
+                demo.load(None, None, None, _js=TREE_JS)
 
-                # ---------- Epic → Features → Stories ----------
-                epic_label = f"E1 · {epic['title']} · {total_features} Features"
-                with gr.Accordion(epic_label, open=True, elem_classes=["epic-accordion"]):
-                    # Epic vote row
-                    with gr.Row(elem_classes=["vote-row"]):
-                        epic_up = gr.Button("", elem_classes=["vote-btn", "vote-up"])
-                        epic_down = gr.Button("", elem_classes=["vote-btn", "vote-down"])
-
-                    gr.Markdown(epic["summary"], elem_classes=["epic-summary"])
-
-                    # Callbacks for epic
-                    def epic_up_fn(state):
-                        return handle_feedback("epic", "E1", "up", state)
-
-                    def epic_down_fn(state):
-                        return handle_feedback("epic", "E1", "down", state)
-
-                    epic_up.click(epic_up_fn, [feedback_state], [feedback_toast, feedback_state])
-                    epic_down.click(epic_down_fn, [feedback_state], [feedback_toast, feedback_state])
-
-                    # Features
-                    for f_idx, feat in enumerate(features, start=1):
-                        feat_id = f"F{f_idx}"
-                        feat_label = f"{feat_id} · {feat['title']} · {len(feat['stories'])} Stories"
-                        with gr.Accordion(feat_label, open=False, elem_classes=["feature-accordion"]):
-                            # Feature vote row
-                            with gr.Row(elem_classes=["vote-row"]):
-                                feat_up = gr.Button("", elem_classes=["vote-btn", "vote-up"])
-                                feat_down = gr.Button("", elem_classes=["vote-btn", "vote-down"])
-
-                            gr.Markdown(
-                                f"""
-<div class="feature-header">
-  <div class="feature-header-title">{feat['title']}</div>
-  <div class="feature-header-sub">{feat['description']}</div>
-  <div class="feature-header-sub"><strong>Web page:</strong> {feat['webpage']}</div>
-</div>
-"""
-                            )
-
-                            # Feature callbacks (capture fid via default arg)
-                            def make_feature_fns(fid):
-                                def fup(state):
-                                    return handle_feedback("feature", fid, "up", state)
-                                def fdown(state):
-                                    return handle_feedback("feature", fid, "down", state)
-                                return fup, fdown
-
-                            fup_fn, fdown_fn = make_feature_fns(feat_id)
-                            feat_up.click(fup_fn, [feedback_state], [feedback_toast, feedback_state])
-                            feat_down.click(fdown_fn, [feedback_state], [feedback_toast, feedback_state])
-
-                            # Stories
-                            for s_idx, story in enumerate(feat["stories"], start=1):
-                                story_id = f"S{s_idx}"
-                                with gr.Group(elem_classes=["story-card"]):
-                                    with gr.Row(elem_classes=["story-header-row"]):
-                                        gr.Markdown(
-                                            f"""
-<div class="story-header-left">
-  <span class="story-id">{story_id}</span>
-  <span class="story-title">{story['title']}</span>
-</div>
-""",
-                                            elem_classes=["story-header-left"],
-                                        )
-                                        with gr.Row(elem_classes=["vote-row"]):
-                                            story_up = gr.Button(
-                                                "", elem_classes=["vote-btn", "vote-up"]
-                                            )
-                                            story_down = gr.Button(
-                                                "", elem_classes=["vote-btn", "vote-down"]
-                                            )
-
-                                    # Story body
-                                    body_html = story_body_html(story)
-                                    gr.Markdown(body_html)
-
-                                    # Story callbacks
-                                    def make_story_fns(sid):
-                                        def sup(state):
-                                            return handle_feedback("story", sid, "up", state)
-                                        def sdown(state):
-                                            return handle_feedback("story", sid, "down", state)
-                                        return sup, sdown
-
-                                    sup_fn, sdown_fn = make_story_fns(story_id)
-                                    story_up.click(
-                                        sup_fn, [feedback_state], [feedback_toast, feedback_state]
-                                    )
-                                    story_down.click(
-                                        sdown_fn, [feedback_state], [feedback_toast, feedback_state]
-                                    )
+                if stream:
+                    document_state = gr.State({"project_text": project_text, "pdf_base64": pdf_base64})
+                    demo.load(stream_document, [document_state, view_state], [stats_box, tree_box, view_state])
+                    upload.upload(stream_upload, [upload, view_state], [stats_box, tree_box, view_state])
+                else:
+                    def show_saved_result():
+                        view = new_view(load_result())
+                        return stats_html(view), results_tree_html(view), view
+
+                    demo.load(show_saved_result, None, [stats_box, tree_box, view_state])
 
     return demo
 
 
 if __name__ == "__main__":
-    demo = build_results_app()
-    demo.launch()
+    # python app/results.py [project.pdf | project.txt]
+    import sys
+
+    document = read_upload(sys.argv[1]) if len(sys.argv) > 1 else {}
+    demo = build_results_app(stream=True, **document)
+    demo.queue().launch()
@@ -0,0 +1,319 @@
+# adapters.py
+"""
+Several LoRA fine-tunes on one shared copy of the TinyLlama base weights.
+
+Each adapter (e.g. agileai_tinyllama_qlora_v4, r=16 on q_proj / v_proj) adds
+~9 MB of float32 LoRA weights to the base model instead of a second 4 GB
+model. Public adapter names map to internal PEFT "slots"
+(<name>__<version>), so a new version of an adapter is loaded next to the
+old one and replaces it in a single assignment:
+
+  - reload_async(name) reads the new adapter files in a background thread,
+  - then, holding `lock`, attaches them as a new slot, repoints the name
+    and deletes the old slot.
+
+Callers hold `lock` while they run a batch, so a swap lands between
+batches and a batch never sees a half-loaded or deleted adapter.
+
+Requests for different adapters can share a batch: PEFT applies each
+row's own LoRA weights when generate() / forward get
+adapter_names=[slot per row] (see slots()). view(name) wraps the model so
+that every call runs with one adapter, for code that does not pass
+adapter_names itself.
+
+Merged fine-tunes (agileai_merged_model_v1) become adapters with
+extract_lora(): the difference to the base weights of a merged LoRA has
+the adapter's rank, so an SVD recovers it.
+
+Usage:
+    registry = AdapterRegistry.from_adapters({"v4": "agileai_tinyllama_qlora_v4"})
+    with registry.lock:
+        model = registry.view("v4")
+        slots = registry.slots(["v4", "base", "v4"])   # adapter_names of a mixed batch
+    registry.reload_async("v4")
+"""
+
+import os
+import json
+import threading
+
+import torch
+from transformers import AutoModelForCausalLM
+
+from result_cache import model_fingerprint
+
+# Public name of "no adapter" (PEFT's placeholder in adapter_names)
+BASE_ADAPTER = "base"
+_PEFT_BASE = "__base__"
+
+
+def _batch_size(args, kwargs) -> int:
+    for key in ("input_ids", "inputs_embeds"):
+        if kwargs.get(key) is not None:
+            return kwargs[key].shape[0]
+    return args[0].shape[0]
+
+
+class AdapterView:
+    """
+    The shared PeftModel with one adapter: generate() and forward calls get
+    adapter_names=[slot] * batch size; everything else is the model's.
+    """
+
+    def __init__(self, model, slot: str):
+        self._model = model
+        self.slot = slot
+
+    @property
+    def cache_key(self):
+        # Views are built per request; caches key on the model and the slot
+        # (slots carry the adapter version) instead of id() of the view
+        return (id(self._model), self.slot)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def __call__(self, *args, **kwargs):
+        kwargs.setdefault("adapter_names", [self.slot] * _batch_size(args, kwargs))
+        return self._model(*args, **kwargs)
+
+    def generate(self, *args, **kwargs):
+        kwargs.setdefault("adapter_names", [self.slot] * _batch_size(args, kwargs))
+        return self._model.generate(*args, **kwargs)
+
+
+# ----------------- REGISTRY ----------------- #
+
+class AdapterRegistry:
+    """
+    base_model: a loaded causal LM; the adapters are attached to it in place
+    """
+
+    def __init__(self, base_model):
+        self.base_model = base_model
+        self.model = None          # PeftModel, created with the first adapter
+        self.lock = threading.RLock()
+        self._adapters = {}        # name -> {"slot", "path", "version"}
+        self._reloads = {}         # name -> Thread
+        self.errors = {}           # name -> last reload error
+        self.swaps = 0
+
+    @classmethod
+    def from_adapters(cls, adapters: dict, base_model_dir: str = None, dtype=torch.float32, device: str = "cpu"):
+        """
+        adapters:       {name: adapter folder}; all must share one base model
+        base_model_dir: base checkpoint (default: the first adapter's
+                        base_model_name_or_path)
+        """
+        if not adapters:
+            raise ValueError("no adapters given")
+        if base_model_dir is None:
+            first = next(iter(adapters.values()))
+            with open(os.path.join(first, "adapter_config.json"), "r", encoding="utf-8") as f:
+                base_model_dir = json.load(f)["base_model_name_or_path"]
+        base = AutoModelForCausalLM.from_pretrained(base_model_dir, dtype=dtype)
+        base.to(device)
+        base.eval()
+
+        registry = cls(base)
+        for name, path in adapters.items():
+            registry.add(name, path)
+        return registry
+
+    # ---------- loading ----------
+
+    @staticmethod
+    def _read(path: str, device):
+        from peft import PeftConfig, load_peft_weights
+
+        config = PeftConfig.from_pretrained(path)
+        config.inference_mode = True
+        return config, load_peft_weights(path, device=str(device))
+
+    def _attach(self, slot: str, config, weights):
+        # caller holds self.lock
+        from peft import PeftModel, set_peft_model_state_dict
+
+        if self.model is None:
+            self.model = PeftModel(self.base_model, config, adapter_name=slot)
+        else:
+            self.model.add_adapter(slot, config)
+        set_peft_model_state_dict(self.model, weights, adapter_name=slot)
+        self.model.eval()
+
+    def add(self, name: str, path: str):
+        """
+        Load the adapter at `path` as `name`, replacing the current version
+        of `name` if there is one. Blocks until attached.
+        """
+        if name == BASE_ADAPTER:
+            raise ValueError(f"{BASE_ADAPTER!r} is reserved for the base model")
+        version = model_fingerprint(path)
+        config, weights = self._read(path, self.base_model.device)
+        with self.lock:
+            old = self._adapters.get(name)
+            if old is not None and old["version"] == version:
+                return
+            slot = f"{name}__{version}"
+            self._attach(slot, config, weights)
+            self._adapters[name] = {"slot": slot, "path": path, "version": version}
+            if old is not None:
+                if self.model.active_adapter == old["slot"]:
+                    self.model.set_adapter(slot)
+                self.model.delete_adapter(old["slot"])
+                self.swaps += 1
+        print(f"Adapter {name} -> {path} ({version})")
+
+    def reload_async(self, name: str, path: str = None) -> threading.Thread:
+        """
+        Load `path` (default: the adapter's current folder, which may hold a
+        newer version) in a background thread and swap it in. A reload
+        already running for `name` is returned instead of starting another.
+        """
+        with self.lock:
+            running = self._reloads.get(name)
+            if running is not None and running.is_alive():
+                return running
+            if path is None:
+                if name not in self._adapters:
+                    raise KeyError(name)
+                path = self._adapters[name]["path"]
+
+        def run():
+            try:
+                self.add(name, path)
+                self.errors.pop(name, None)
+            except Exception as e:
+                self.errors[name] = str(e)
+                print(f"❌ Reloading adapter {name} from {path} failed: {e}")
+
+        thread = threading.Thread(target=run, name=f"adapter-reload-{name}", daemon=True)
+        with self.lock:
+            self._reloads[name] = thread
+        thread.start()
+        return thread
+
+    # ---------- lookup (hold self.lock while the result is in use) ----------
+
+    @property
+    def names(self):
+        return list(self._adapters)
+
+    def version(self, name: str) -> str:
+        if name == BASE_ADAPTER:
+            return BASE_ADAPTER
+        return self._adapters[name]["version"]
+
+    def slot(self, name: str) -> str:
+        if name == BASE_ADAPTER:
+            return _PEFT_BASE
+        return self._adapters[name]["slot"]
+
+    def slots(self, names):
+        """
+        adapter_names for a batch whose rows use the adapters `names`.
+        """
+        return [self.slot(n) for n in names]
+
+    def view(self, name: str) -> AdapterView:
+        return AdapterView(self.model, self.slot(name))
+
+    def stats(self) -> dict:
+        with self.lock:
+            adapters = {}
+            for name, info in self._adapters.items():
+                n_bytes = sum(
+                    p.numel() * p.element_size()
+                    for pname, p in self.model.named_parameters()
+                    if f".{info['slot']}." in pname
+                )
+                adapters[name] = {
+                    "path": info["path"],
+                    "version": info["version"],
+                    "mb": round(n_bytes / 2**20, 2),
+                }
+            base_bytes = sum(
+                p.numel() * p.element_size()
+                for pname, p in self.base_model.named_parameters()
+                if "lora_" not in pname
+            )
+            return {
+                "adapters": adapters,
+                "swaps": self.swaps,
+                "reloading": [n for n, t in self._reloads.items() if t.is_alive()],
+                "errors": dict(self.errors),
+                "base_mb": round(base_bytes / 2**20, 1),
+            }
+
+
+# ----------------- MERGED MODELS ----------------- #
+
+def extract_lora(
+    base_model,
+    merged_dir: str,
+    out_dir: str,
+    rank: int = 16,
+    target_modules=("q_proj", "v_proj"),
+    tolerance: float = 1e-2,
+) -> dict:
+    """
+    Write the LoRA adapter that turns `base_model` into the merged checkpoint
+    in `merged_dir` (safetensors) to `out_dir`.
+
+    Weights outside `target_modules` must match the base; each target
+    weight's difference is factored by a rank-`rank` SVD (B = U S, A = V^T,
+    lora_alpha = rank, i.e. scaling 1). Raises ValueError when the checkpoint
+    is not a LoRA merge of this base (other weights changed, or the rank-r
+    factors miss more than `tolerance` of a difference's norm).
+
+    Returns {"modules": n, "max_rel_error": float}
+    """
+    from safetensors import safe_open
+    from safetensors.torch import save_file
+    from peft import LoraConfig
+
+    files = sorted(f for f in os.listdir(merged_dir) if f.endswith(".safetensors"))
+    if not files:
+        raise ValueError(f"no safetensors weights in {merged_dir}")
+
+    base_state = base_model.state_dict()
+    lora_weights = {}
+    max_rel_error = 0.0
+    for fname in files:
+        with safe_open(os.path.join(merged_dir, fname), framework="pt") as f:
+            for key in f.keys():
+                if key not in base_state:
+                    continue
+                merged = f.get_tensor(key).float()
+                base = base_state[key].float().cpu()
+                module = key[: -len(".weight")] if key.endswith(".weight") else key
+                if not module.endswith(tuple(f".{t}" for t in target_modules)):
+                    if not torch.allclose(merged, base, rtol=1e-3, atol=1e-5):
+                        raise ValueError(f"{key} differs from the base model; not a LoRA merge of {target_modules}")
+                    continue
+
+                delta = merged - base
+                u, s, vh = torch.linalg.svd(delta, full_matrices=False)
+                lora_b = u[:, :rank] * s[:rank]
+                lora_a = vh[:rank]
+                norm = delta.norm()
+                if norm > 0:
+                    max_rel_error = max(max_rel_error, float((delta - lora_b @ lora_a).norm() / norm))
+                lora_weights[f"base_model.model.{module}.lora_A.weight"] = lora_a.contiguous()
+                lora_weights[f"base_model.model.{module}.lora_B.weight"] = lora_b.contiguous()
+
+    if max_rel_error > tolerance:
+        raise ValueError(f"rank {rank} misses {max_rel_error:.1%} of a weight difference")
+
+    os.makedirs(out_dir, exist_ok=True)
+    LoraConfig(
+        r=rank,
+        lora_alpha=rank,
+        target_modules=list(target_modules),
+        lora_dropout=0.0,
+        bias="none",
+        task_type="CAUSAL_LM",
+        base_model_name_or_path=getattr(base_model, "name_or_path", None),
+    ).save_pretrained(out_dir)
+    save_file(lora_weights, os.path.join(out_dir, "adapter_model.safetensors"))
+    return {"modules": len(lora_weights) // 2, "max_rel_error": max_rel_error}
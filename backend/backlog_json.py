@@ -0,0 +1,308 @@
+# backlog_json.py
+"""
+Full-backlog JSON path from inference.ipynb: one prompt asks for the whole
+epic / features / user_stories object as strict JSON.
+
+With constrained=True, decoding is masked against BACKLOG_SCHEMA
+(constrained_json.py): the output always parses and generation stops when
+the root object closes instead of running on to max_new_tokens.
+
+iter_agile_output streams the same generation through json_stream.py: the
+epic, each user story and each feature are yielded (validated and repaired)
+as soon as their closing brace is decoded, and generation ends once
+`num_features` features with `stories_per_feature` stories have arrived.
+"""
+
+import json
+import queue
+import threading
+from functools import lru_cache
+
+import torch
+from transformers import LogitsProcessorList, StoppingCriteriaList
+
+import metrics
+from scored_generation import score_generated_sequences
+from constrained_json import (
+    Array,
+    JsonSchemaGrammar,
+    TokenConstraint,
+    SchemaLogitsProcessor,
+    SchemaStoppingCriteria,
+)
+from json_stream import BacklogStreamParser, BacklogStreamStoppingCriteria
+
+# The object build_inference_prompt asks for, with the non-empty strings
+# and lists the notebook's validate_epic / validate_story checks require
+# and the prompt's counts (at least 5 features, 3-7 stories each)
+_BACKLOG_ITEM = {"id": str, "title": str, "description": str, "acceptance_criteria": str}
+BACKLOG_SCHEMA = {
+    "epic": _BACKLOG_ITEM,
+    "features": Array(
+        {**_BACKLOG_ITEM, "user_stories": Array(_BACKLOG_ITEM, min_items=3, max_items=7)},
+        min_items=5,
+    ),
+}
+
+
+def build_inference_prompt(project_text: str) -> str:
+    return (
+        "You are AgileAI. Convert the given project description into exactly:\n"
+        "- 1 Epic (E1)\n"
+        "- At least 5 Features (F1, F2, ...)\n"
+        "- For each Feature: 3–7 User Stories (US1, US2, ...)\n\n"
+        "Use this strict JSON schema:\n"
+        "{\n"
+        "  \"epic\": {\"id\": \"E1\", \"title\": \"...\", \"description\": \"...\", \"acceptance_criteria\": \"...\"},\n"
+        "  \"features\": [\n"
+        "    {\n"
+        "      \"id\": \"F1\",\n"
+        "      \"title\": \"...\",\n"
+        "      \"description\": \"...\",\n"
+        "      \"acceptance_criteria\": \"...\",\n"
+        "      \"user_stories\": [\n"
+        "        {\"id\": \"US1\", \"title\": \"...\", \"description\": \"...\", \"acceptance_criteria\": \"...\"}\n"
+        "      ]\n"
+        "    }\n"
+        "  ]\n"
+        "}\n\n"
+        "Rules:\n"
+        "- Output **ONLY JSON**.\n"
+        "- No extra text, no explanations.\n"
+        "- No raw newlines inside strings (use \\n).\n\n"
+        "### Project Description:\n"
+        f"{project_text}\n\n"
+        "### JSON Output:\n"
+    )
+
+
+@lru_cache(maxsize=4)
+def _backlog_constraint(tokenizer) -> TokenConstraint:
+    # token masks are cached on this object across documents
+    return TokenConstraint(JsonSchemaGrammar(BACKLOG_SCHEMA), tokenizer)
+
+
+def _generate(model, tokenizer, project_text, max_new_tokens, temperature, top_p, constrained, stream=None, score=False):
+    """
+    Returns (text, generated_tokens, truncated, confidence); `truncated` is
+    set when a constrained run hit max_new_tokens and was closed by the
+    grammar, `confidence` (None unless `score`) is read off the scores of
+    this generate() call, as in scored_generation.py. The scores are the
+    distribution the tokens were sampled from: after the schema mask (when
+    constrained), temperature and top_p, not the raw logits.
+
+    stream: optional (parser, on_event); the parser is fed while decoding
+    and may end the generation early.
+    """
+    prompt = build_inference_prompt(project_text)
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    prompt_len = inputs["input_ids"].shape[1]
+
+    extra = {}
+    stopping = []
+    if constrained:
+        processor = SchemaLogitsProcessor(_backlog_constraint(tokenizer))
+        extra["logits_processor"] = LogitsProcessorList([processor])
+        stopping.append(SchemaStoppingCriteria(processor))
+    if stream is not None:
+        feeder = BacklogStreamStoppingCriteria(tokenizer, prompt_len, *stream)
+        stopping.append(feeder)
+    if stopping:
+        extra["stopping_criteria"] = StoppingCriteriaList(stopping)
+    if score:
+        # scores only (no raw logits), so score_generated_sequences reads
+        # the processed distribution
+        extra.update(return_dict_in_generate=True, output_scores=True)
+
+    with torch.no_grad():
+        output = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            top_p=top_p,
+            temperature=temperature,
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id,
+            **extra,
+        )
+
+    confidence = None
+    if score:
+        confidence = score_generated_sequences(tokenizer, output, prompt_len)[0]["confidence"]
+        output = output.sequences
+
+    # Keep only the model output (generated token ids, not the prompt)
+    gen_ids = output[0, prompt_len:].tolist()
+    if tokenizer.eos_token_id in gen_ids:
+        gen_ids = gen_ids[:gen_ids.index(tokenizer.eos_token_id)]
+    text = tokenizer.decode(gen_ids, skip_special_tokens=True)
+    if stream is not None:
+        feeder.close()
+    truncated = False
+    if constrained and not processor.done(0):
+        text += processor.completion(0)
+        truncated = True
+    return text.strip(), len(gen_ids), truncated, confidence
+
+
+def generate_raw_output(model, tokenizer, project_text, max_new_tokens=800, temperature=0.7, top_p=0.9, constrained=False):
+    text, _, _, _ = _generate(model, tokenizer, project_text, max_new_tokens, temperature, top_p, constrained)
+    return text
+
+
+def parse_json_safely(text: str):
+    with metrics.stage_timer("json_parsing"):
+        text = text.strip()
+        start = text.find('{')
+        end = text.rfind('}')
+
+        if start == -1 or end == -1:
+            print("❌ Could not detect JSON boundaries.")
+            return None
+
+        json_str = text[start:end+1]
+
+        # Replace raw newlines inside strings
+        json_str = json_str.replace("\r", " ").replace("\n", " ")
+
+        try:
+            data = json.loads(json_str)
+            print("✅ JSON parsed successfully!")
+            return data
+        except Exception as e:
+            print("❌ JSON parsing error:", e)
+            print("Offending JSON snippet:\n", json_str[:500])
+            return None
+
+
+def generate_agile_output_with_report(
+    model,
+    tokenizer,
+    project_text,
+    constrained: bool = False,
+    max_attempts: int = 1,
+    max_new_tokens: int = 800,
+    temperature: float = 0.7,
+    top_p: float = 0.9,
+    score: bool = False,
+):
+    """
+    Generate and parse the backlog, sampling again (up to `max_attempts`
+    generations) while the output does not parse.
+
+    score: also report the confidence of the last generation, under the
+           distribution its tokens were sampled from (schema mask when
+           constrained, temperature, top_p); keeps the scores of every
+           step until generate() returns
+
+    Returns:
+      parsed (dict or None),
+      raw (str, the last generation),
+      report: {
+        "constrained": bool,
+        "attempts": int,
+        "generated_tokens": int,    # over all attempts
+        "truncated": bool,          # last attempt closed by the grammar
+        "parsed": bool,
+        "confidence": float or None,  # with score=True
+      }
+    """
+    mode = "constrained" if constrained else "free"
+    report = {
+        "constrained": constrained,
+        "attempts": 0,
+        "generated_tokens": 0,
+        "truncated": False,
+        "parsed": False,
+        "confidence": None,
+    }
+    parsed, raw = None, ""
+    while report["attempts"] < max_attempts and parsed is None:
+        raw, n_tokens, truncated, report["confidence"] = _generate(
+            model, tokenizer, project_text, max_new_tokens, temperature, top_p, constrained, score=score,
+        )
+        parsed = parse_json_safely(raw)
+        report["attempts"] += 1
+        report["generated_tokens"] += n_tokens
+        report["truncated"] = truncated
+        metrics.record_json_attempt(mode, parsed is not None, n_tokens)
+    report["parsed"] = parsed is not None
+    return parsed, raw, report
+
+
+def generate_agile_output(model, tokenizer, project_text, constrained=False, max_attempts=1):
+    parsed, raw, _ = generate_agile_output_with_report(
+        model, tokenizer, project_text, constrained=constrained, max_attempts=max_attempts,
+    )
+    return parsed, raw
+
+
+def iter_agile_output(
+    model,
+    tokenizer,
+    project_text,
+    num_features: int = None,
+    stories_per_feature: int = None,
+    constrained: bool = False,
+    max_new_tokens: int = 800,
+    temperature: float = 0.7,
+    top_p: float = 0.9,
+):
+    """
+    Streaming variant of `generate_agile_output_with_report` (one attempt):
+    generate() runs in a worker thread and every object is yielded the moment
+    its closing brace is decoded, with the validation errors left after
+    repair (json_stream.py).
+
+    Yields, in order of arrival:
+      {"type": "epic",    "epic": {...}, "errors": [...]}
+      {"type": "story",   "feature_index": 0, "story": {...}, "errors": [...]}
+      {"type": "feature", "feature": {..., "user_stories": [...]}, "errors": [...]}
+      {"type": "done",    "agile_output": {...} or None, "raw": str, "report": {
+          "constrained": bool,
+          "generated_tokens": int,
+          "stopped_early": bool,     # ended once everything asked for arrived
+          "features": int,
+          "stories": int,
+          "dropped": [...],          # objects that did not parse
+      }}
+    """
+    parser = BacklogStreamParser(num_features=num_features, stories_per_feature=stories_per_feature)
+    events = queue.Queue()
+    result = {}
+
+    def run():
+        try:
+            result["raw"], result["tokens"], _, _ = _generate(
+                model, tokenizer, project_text, max_new_tokens, temperature, top_p, constrained,
+                stream=(parser, events.put),
+            )
+        except Exception as e:
+            result["error"] = e
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, name="agileai-backlog-json", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            break
+        yield event
+    if "error" in result:
+        raise result["error"]
+
+    agile_output = parser.backlog()
+    metrics.record_json_attempt("constrained" if constrained else "free", agile_output is not None, result["tokens"])
+    yield {
+        "type": "done",
+        "agile_output": agile_output,
+        "raw": result["raw"],
+        "report": {
+            "constrained": constrained,
+            "generated_tokens": result["tokens"],
+            "stopped_early": parser.satisfied() and not parser.done,
+            "features": len(parser.features),
+            "stories": sum(len(f.get("user_stories") or []) for f in parser.features),
+            "dropped": parser.errors,
+        },
+    }
@@ -0,0 +1,360 @@
+# batch_analyze.py
+"""
+Batch runner: analyze a whole corpus of project documents from the command
+line instead of one notebook cell run per file.
+
+    python backend/batch_analyze.py clean_text --out results --workers 2
+    python backend/batch_analyze.py clean_text uploads --mode json --constrained
+
+Inputs are *_clean.txt files (clean_text/) and PDFs (new uploads, cleaned
+with preprocess.extract_project_text), given as files or folders. For every
+document <Name> the runner writes, each atomically:
+
+  results/<Name>.json             the backlog (agile_output / parsed JSON)
+  results/<Name>_raw.txt          titles: the full result with its metrics
+                                  report; json: the raw generation
+  results/<Name>_confidence.txt   mean confidence of the generations
+
+Documents are processed by a pool of worker threads sharing one model
+(torch's intra-op threads are split between them). After each document the
+checkpoint results/.batch_checkpoint.json records the result key
+(result_cache.result_key: cleaned text, model version, templates and
+parameters), so an interrupted run resumes where it stopped and a re-run
+after a model or parameter change redoes exactly the affected documents.
+
+Ends with a throughput summary: documents per minute, generated tokens per
+second and the p50 / p95 seconds per document.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import torch
+
+from preprocess import atomic_write_text, extract_project_text
+from result_cache import model_fingerprint, result_key
+from packing import PromptPacker
+from titles import run_agileai_titles_only_with_report
+from scored_generation import count_generated_tokens
+from backlog_json import generate_agile_output_with_report
+
+CHECKPOINT_NAME = ".batch_checkpoint.json"
+MODES = ("titles", "json")
+
+
+# ----------------- INPUTS ----------------- #
+
+def document_name(path: str) -> str:
+    """
+    "clean_text/AgroVision_clean.txt" -> "AgroVision", "uploads/Foo.pdf" -> "Foo".
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[:-len("_clean")] if stem.endswith("_clean") else stem
+
+
+def collect_documents(inputs) -> dict:
+    """
+    inputs: files and folders (*_clean.txt and *.pdf in a folder).
+
+    Returns {name: path}, sorted by name; a second file with the same name
+    is skipped.
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(glob(os.path.join(item, "*_clean.txt"))))
+            paths.extend(sorted(glob(os.path.join(item, "*.pdf"))))
+        else:
+            paths.append(item)
+
+    docs = {}
+    for path in paths:
+        name = document_name(path)
+        if name in docs:
+            print(f"⚠️ Skipping {path}: same name as {docs[name]}")
+            continue
+        docs[name] = path
+    return dict(sorted(docs.items()))
+
+
+def read_document(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        return extract_project_text(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+# ----------------- ONE DOCUMENT ----------------- #
+
+def _analyze_titles(model, tokenizer, text: str, params: dict, packer=None):
+    # each document runs on one worker thread
+    with count_generated_tokens() as tally:
+        agile_output, metrics_report = run_agileai_titles_only_with_report(
+            model,
+            tokenizer,
+            text,
+            num_features=params["num_features"],
+            stories_per_feature=params["stories_per_feature"],
+            packer=packer,
+            stop_early=True,
+        )
+    confs = [
+        metrics_report["epic_confidence"],
+        metrics_report["features_block_confidence"],
+        metrics_report["stories_avg_block_confidence"],
+    ]
+    raw = json.dumps({"agile_output": agile_output, "metrics_report": metrics_report}, indent=2, ensure_ascii=False)
+    return agile_output, raw, sum(confs) / len(confs), tally["tokens"]
+
+
+def _analyze_json(model, tokenizer, text: str, params: dict, packer=None):
+    parsed, raw, report = generate_agile_output_with_report(
+        model,
+        tokenizer,
+        text,
+        constrained=params["constrained"],
+        max_attempts=params["max_attempts"],
+        score=True,
+    )
+    return parsed, raw, report["confidence"], report["generated_tokens"]
+
+
+def write_artifacts(out_dir: str, name: str, agile_output, raw: str, confidence: float):
+    atomic_write_text(os.path.join(out_dir, f"{name}.json"), json.dumps(agile_output, indent=2, ensure_ascii=False))
+    atomic_write_text(os.path.join(out_dir, f"{name}_raw.txt"), raw)
+    atomic_write_text(os.path.join(out_dir, f"{name}_confidence.txt"), str(confidence))
+
+
+def _artifacts_exist(out_dir: str, name: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(out_dir, f"{name}{suffix}"))
+        for suffix in (".json", "_raw.txt", "_confidence.txt")
+    )
+
+
+def _load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _percentile(values, q: float) -> float:
+    # nearest rank
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+# ----------------- CORPUS ----------------- #
+
+def analyze_corpus(
+    model,
+    tokenizer,
+    inputs,
+    out_dir: str = "results",
+    mode: str = "titles",
+    workers: int = 1,
+    model_version: str = "unknown",
+    num_features: int = 5,
+    stories_per_feature: int = 3,
+    constrained: bool = False,
+    max_attempts: int = 1,
+    packer=None,
+    force: bool = False,
+    limit: int = None,
+):
+    """
+    inputs:        files and folders, see collect_documents
+    mode:          "titles" (run_agileai_titles_only_with_report) or
+                   "json" (generate_agile_output_with_report)
+    workers:       documents analyzed at the same time (threads, one model)
+    model_version: part of the result key, e.g. model_fingerprint(model_dir)
+    force:         ignore the checkpoint and analyze every document
+    limit:         analyze at most this many of the pending documents
+
+    Returns:
+      {"found", "processed", "skipped", "failed", "seconds", "docs_per_min",
+       "tokens_per_sec", "p50_s", "p95_s"}
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint_path = os.path.join(out_dir, CHECKPOINT_NAME)
+    checkpoint = {} if force else _load_checkpoint(checkpoint_path)
+    lock = threading.Lock()
+
+    if mode == "titles":
+        params = {
+            "pipeline": "titles",
+            "num_features": num_features,
+            "stories_per_feature": stories_per_feature,
+            "context": packer.fingerprint if packer else "truncate:800",
+            "stop": "lines",
+        }
+        analyze = _analyze_titles
+    else:
+        params = {
+            "pipeline": "json",
+            "constrained": constrained,
+            "max_attempts": max_attempts,
+            # schema counts and confidence from the sampled distribution
+            "schema": "counts",
+        }
+        analyze = _analyze_json
+
+    docs = collect_documents(inputs)
+    print(f"Found {len(docs)} documents")
+
+    todo = []
+    skipped = 0
+    for name, path in docs.items():
+        entry = checkpoint.get(name)
+        if entry and entry.get("path") == path and _artifacts_exist(out_dir, name):
+            # texts are only read (and PDFs extracted) when the checkpoint
+            # cannot vouch for the document: same file size and mtime
+            st = os.stat(path)
+            if entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns \
+                    and entry.get("model_version") == model_version and entry.get("params") == params:
+                skipped += 1
+                continue
+        todo.append((name, path))
+    if limit is not None:
+        todo = todo[:limit]
+
+    def save_entry(name, entry):
+        # a document enters the checkpoint only once its artifacts are written
+        with lock:
+            checkpoint[name] = entry
+            atomic_write_text(checkpoint_path, json.dumps(checkpoint, indent=2, sort_keys=True))
+
+    def run(name, path):
+        st = os.stat(path)
+        text = read_document(path)
+        key = result_key(text, model_version, params)
+        entry = {
+            "path": path,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "model_version": model_version,
+            "params": params,
+            "key": key,
+        }
+        old = checkpoint.get(name)
+        if old and old.get("key") == key and _artifacts_exist(out_dir, name):
+            save_entry(name, {**old, **entry})
+            return None          # touched, not changed
+
+        doc_start = time.perf_counter()
+        agile_output, raw, confidence, tokens = analyze(model, tokenizer, text, params, packer)
+        seconds = time.perf_counter() - doc_start
+        write_artifacts(out_dir, name, agile_output, raw, confidence)
+        result = {"seconds": seconds, "tokens": tokens, "confidence": confidence}
+        save_entry(name, {**entry, **result})
+        return result
+
+    processed = failed = 0
+    doc_seconds, tokens = [], 0
+    if todo:
+        if workers > 1:
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agileai-corpus")
+        try:
+            futures = {pool.submit(run, name, path): (name, path) for name, path in todo}
+            for fut in as_completed(futures):
+                name, path = futures[fut]
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ Failed: {path} ({e})")
+                    continue
+
+                if result is None:
+                    skipped += 1
+                    continue
+                processed += 1
+                doc_seconds.append(result["seconds"])
+                tokens += result["tokens"]
+                print(f"✅ {name}: {result['seconds']:.1f}s, {result['tokens']} tokens "
+                      f"({processed + failed}/{len(todo)})")
+        except KeyboardInterrupt:
+            print("⚠️ Interrupted: finishing the documents in progress; run again to resume.")
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            pool.shutdown(wait=True)
+
+    seconds = time.perf_counter() - start
+    summary = {
+        "found": len(docs),
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": seconds,
+        "docs_per_min": processed / seconds * 60 if seconds > 0 else 0.0,
+        "tokens_per_sec": tokens / seconds if seconds > 0 else 0.0,
+        "p50_s": _percentile(doc_seconds, 0.50),
+        "p95_s": _percentile(doc_seconds, 0.95),
+    }
+    print(
+        f"Processed {processed}, skipped {skipped} unchanged, {failed} failed in {seconds:.1f}s: "
+        f"{summary['docs_per_min']:.2f} docs/min, {summary['tokens_per_sec']:.1f} tokens/s, "
+        f"p50 {summary['p50_s']:.1f}s, p95 {summary['p95_s']:.1f}s per document"
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from server import load_model
+
+    parser = argparse.ArgumentParser(description="Analyze every document of a corpus into results/.")
+    parser.add_argument("inputs", nargs="*", default=["clean_text"])
+    parser.add_argument("--out", default="results")
+    parser.add_argument("--mode", choices=MODES, default="titles")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--model-dir", default=os.environ.get("AGILEAI_MODEL_DIR", "agileai_tinyllama_qlora_v4"))
+    parser.add_argument("--variant", default=os.environ.get("AGILEAI_MODEL_VARIANT", "fp32"),
+                        help='"fp32", "bf16", "int8" or "source" (see server.py)')
+    parser.add_argument("--features", type=int, default=5)
+    parser.add_argument("--stories", type=int, default=3)
+    parser.add_argument("--context", choices=("packed", "truncate"), default="truncate",
+                        help="packed: token-budgeted contexts (packing.py), not what the adapter was trained on")
+    parser.add_argument("--constrained", action="store_true", help="json mode: schema-constrained decoding")
+    parser.add_argument("--attempts", type=int, default=1, help="json mode: generations while unparsed")
+    parser.add_argument("--limit", type=int, default=None, help="analyze at most this many documents")
+    parser.add_argument("--force", action="store_true", help="ignore the checkpoint")
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir, variant=args.variant)
+    version = model_fingerprint(args.model_dir)
+    if args.variant in ("bf16", "int8"):
+        version += f":{args.variant}"
+    analyze_corpus(
+        model,
+        tokenizer,
+        args.inputs,
+        out_dir=args.out,
+        mode=args.mode,
+        workers=args.workers,
+        model_version=version,
+        num_features=args.features,
+        stories_per_feature=args.stories,
+        constrained=args.constrained,
+        max_attempts=args.attempts,
+        packer=PromptPacker(tokenizer) if args.context == "packed" else None,
+        force=args.force,
+        limit=args.limit,
+    )
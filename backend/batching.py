@@ -0,0 +1,132 @@
+# batching.py
+"""
+Asyncio micro-batcher with a bounded queue.
+
+Requests are put on a bounded asyncio.Queue. A single worker takes the first
+waiting request, keeps collecting for up to `batch_window_s` (or until
+`max_batch_size` requests are in hand) and runs the whole group through
+`process_batch` on a worker thread, so the event loop keeps accepting
+(or rejecting) requests while the model is busy.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class QueueFullError(Exception):
+    """Raised by `MicroBatcher.submit` when the request queue is full."""
+
+
+class MicroBatcher:
+    """
+    process_batch: callable(list_of_items) -> list_of_results (same order).
+                   Runs on a dedicated worker thread; it may raise, in which
+                   case every request of the batch gets the exception.
+    """
+
+    def __init__(
+        self,
+        process_batch,
+        max_queue: int = 64,
+        max_batch_size: int = 4,
+        batch_window_s: float = 0.02,
+    ):
+        self.process_batch = process_batch
+        self.max_queue = max_queue
+        self.max_batch_size = max_batch_size
+        self.batch_window_s = batch_window_s
+
+        self._queue = None
+        self._worker = None
+        # One thread: the model runs one batch at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agileai-batch")
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, fut = self._queue.get_nowait()
+                if not fut.done():
+                    fut.set_exception(RuntimeError("batcher stopped"))
+        self._executor.shutdown(wait=False)
+
+    # ---------- public API ----------
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, item) -> asyncio.Future:
+        """
+        Enqueue `item` and return a future for its result.
+        Raises QueueFullError instead of waiting when the queue is full.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, fut))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"request queue is full ({self.max_queue})")
+        metrics.QUEUE_DEPTH.set(self._queue.qsize())
+        return fut
+
+    def run_exclusive(self, fn, *args) -> asyncio.Future:
+        """
+        Run `fn(*args)` on the batch worker thread, between micro-batches,
+        so work that is not batched (e.g. streaming) never shares the model
+        with a running batch.
+        """
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ---------- worker ----------
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window_s
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        metrics.QUEUE_DEPTH.set(self._queue.qsize())
+        # Callers that already gave up (timeout / disconnect) cancel their future
+        return [(item, fut) for item, fut in batch if not fut.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            metrics.BATCH_SIZE.observe(len(items))
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, items)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
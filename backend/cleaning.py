@@ -0,0 +1,285 @@
+# cleaning.py
+"""
+Text cleaning from playground1.ipynb (cells 3-4), compiled.
+
+Same functions, same names, same output, with the work moved into C:
+glyphs and non-printables are decided once per distinct character instead
+of once per character, every pattern is compiled at import, substitutions
+only touch text that actually changes, and passes that cannot match are
+skipped with a cheap substring check. benchmarks/bench_cleaning.py checks
+the output against the notebook cells and reports MB/s.
+
+Where the notebook applies several regexes one after another, they stay
+sequential here: an earlier substitution can create or destroy a match for
+a later one, so merging them into one alternation would change the output.
+Unlike the notebook, the pipeline does not print the removed TOC ranges.
+"""
+
+import re
+
+# ----------------- GLYPHS / NON-PRINTABLE ----------------- #
+
+GLYPH_REPLACEMENTS = {
+    '\xa0': ' ',   # non-breaking space
+    '\u2018': "'", # left single quote
+    '\u2019': "'", # right single quote
+    '\u201c': '"', # left double quote
+    '\u201d': '"', # right double quote
+    '\u2013': '-', # en dash
+    '\u2014': '-', # em dash
+    '\uf0d8': '-', # bullet-like glyph
+    '\uf0b7': '-', # bullet-like glyph
+    '\u2022': '-', # bullet
+}
+
+
+def remove_nonprintable_and_glyphs(text: str) -> str:
+    """
+    Fix common unicode/glyph issues and drop non-printable chars.
+    """
+    # Decide per distinct character instead of per character
+    chars = set(text)
+    for bad, good in GLYPH_REPLACEMENTS.items():
+        if bad in chars:
+            text = text.replace(bad, good)
+
+    drop = [
+        ch for ch in chars
+        if ch not in GLYPH_REPLACEMENTS and ch != "\n" and not ch.isprintable()
+    ]
+    if drop:
+        text = re.sub("[" + "".join(re.escape(ch) for ch in drop) + "]+", "", text)
+    return text
+
+
+# ----------------- FIGURES / BULLETS / FOOTERS ----------------- #
+
+_FIGURE_FLAGS = re.IGNORECASE | re.DOTALL | re.MULTILINE
+
+# (lower-case literal every match contains, compiled pattern), in notebook order
+_FIGURE_PATTERNS = [
+    ("<figure>", re.compile(r"<figure>.*?</figure>", _FIGURE_FLAGS)),
+    ("<figcaption>", re.compile(r"<figcaption>.*?</figcaption>", _FIGURE_FLAGS)),
+    ("figure", re.compile(r"Figure\s*\d+[:\-]?.*?$", _FIGURE_FLAGS)),
+    # [^\\n] is "neither backslash nor n" in the notebook too; kept as is
+    ("copyright", re.compile(r"Copyright[^\\n]*", _FIGURE_FLAGS)),
+    ("pagenumber=", re.compile(r"PageNumber=\"\d+\"", _FIGURE_FLAGS)),
+    ("<!--", re.compile(r"<!--.*?-->", _FIGURE_FLAGS)),
+]
+
+
+def _fold(text: str) -> str:
+    # lower() plus the IGNORECASE equivalences it misses for these literals
+    # (dotted capital I lowers to two characters, dotless i not at all)
+    return text.replace("\u0130", "i").lower().replace("\u0131", "i")
+
+
+def remove_figure_placeholders(text: str) -> str:
+    """
+    Remove figure tags, captions, and similar noise.
+    """
+    low = _fold(text)
+    for literal, pat in _FIGURE_PATTERNS:
+        if literal not in low:
+            continue
+        new = pat.sub("", text)
+        if new != text:
+            text = new
+            low = _fold(text)
+    return text
+
+
+# Both bullet character classes of the notebook, as one
+_BULLET_RE = re.compile("[\u2022\u2023\u25e6\u2043\u2219\uf0d8\uf0b7*\u00b7]")
+_NUMBERED_ITEM_RE = re.compile(r"^(\d+)\.\s*", re.MULTILINE)
+
+
+def canonicalize_bullets_and_lists(text: str) -> str:
+    """
+    Convert many bullet characters to '-', normalize numbered list format.
+    """
+    text = _BULLET_RE.sub("-", text)
+    return _NUMBERED_ITEM_RE.sub(r"\1. ", text)
+
+
+def remove_repeated_footers(text: str) -> str:
+    """
+    Detect lines that repeat many times (likely headers/footers) and remove them.
+    """
+    counts = {}
+    for ln in text.splitlines():
+        ln_s = ln.strip()
+        if ln_s:
+            counts[ln_s] = counts.get(ln_s, 0) + 1
+
+    # Built exactly like the notebook's set: when one repeated line is a
+    # prefix of another, the alternation order (set order) decides the output
+    repeated = {ln for ln, c in counts.items() if c >= 2}
+    if repeated:
+        pattern = re.compile("|".join(re.escape(r) for r in repeated))
+        text = pattern.sub("", text)
+    return text
+
+
+# ----------------- WHITESPACE ----------------- #
+
+# Same result as [ \t]+ -> " ", without rewriting the single spaces
+_SPACES_RE = re.compile(r" [ \t]+|\t[ \t]*")
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Normalize spaces + newlines:
+      - collapse multiple spaces/tabs
+      - collapse 3+ blank lines into 2
+      - trim leading/trailing blank lines
+    """
+    text = _SPACES_RE.sub(" ", text)
+    text = _BLANK_RUN_RE.sub("\n\n", text)
+
+    lines = [ln.strip() for ln in text.splitlines()]
+    start, end = 0, len(lines)
+    while start < end and not lines[start]:
+        start += 1
+    while end > start and not lines[end - 1]:
+        end -= 1
+    return "\n".join(lines[start:end])
+
+
+# ----------------- BOILERPLATE / TOC ----------------- #
+
+# Leftmost match of the alternation == earliest of the three separate searches
+_START_MARKERS_RE = re.compile(
+    r"\bABSTRACT\b|\b1\.0\s+INTRODUCTION\b|\bDesign and Implementation of E-Commerce Site\b",
+    re.IGNORECASE,
+)
+_START_LINE_RE = re.compile(r"^\s*(1\.0|ABSTRACT|INTRODUCTION)", re.IGNORECASE)
+
+
+def truncate_boilerplate_start(text: str) -> str:
+    """
+    Try to skip front matter and jump to ABSTRACT / INTRODUCTION section.
+    """
+    match = _START_MARKERS_RE.search(text)
+    if match:
+        return text[match.start():]
+
+    # Fallback: scan first ~120 lines for 1.0 / ABSTRACT / INTRODUCTION
+    lines = text.splitlines()
+    for i, ln in enumerate(lines[:120]):
+        if _START_LINE_RE.match(ln):
+            return "\n".join(lines[i:])
+    return text
+
+
+_TOC_DOTS_RE = re.compile(r"\.{3,}\s*\d+\s*$")
+_TOC_HEADING_RE = re.compile(r"^\s*(TABLE OF CONTENTS|CONTENTS|INDEX)\b", re.IGNORECASE)
+_TOC_MENTION_RE = re.compile(r"\b(table of contents|contents|index)\b", re.IGNORECASE)
+_TOC_END_RE = re.compile(r"\b(1\.0|introduction|abstract)\b", re.IGNORECASE)
+
+
+def _is_toc_line(ln: str) -> bool:
+    s = ln.strip()
+    if not s:
+        return False
+    # pattern like "4.1  Intro........ 12"
+    return bool(("..." in s and _TOC_DOTS_RE.search(s)) or _TOC_HEADING_RE.match(s))
+
+
+def remove_toc_blocks(lines, min_block_len: int = 3):
+    """
+    Remove contiguous blocks of TOC-like lines.
+    Returns (filtered_lines, ranges_removed).
+    """
+    flags = [_is_toc_line(ln) for ln in lines]
+    n = len(lines)
+    toc_ranges = []
+    i = 0
+    while i < n:
+        if flags[i]:
+            j = i
+            while j < n and flags[j]:
+                j += 1
+            if j - i >= min_block_len:
+                toc_ranges.append((i, j))
+                i = j
+                continue
+        i += 1
+
+    # Fallback: single TABLE OF CONTENTS mention near top
+    if not toc_ranges:
+        for idx, ln in enumerate(lines[:200]):
+            if _TOC_MENTION_RE.search(ln):
+                end_idx = None
+                for j in range(idx + 1, min(len(lines), idx + 60)):
+                    if _TOC_END_RE.search(lines[j]):
+                        end_idx = j
+                        break
+                if end_idx is None:
+                    end_idx = min(len(lines), idx + 40)
+                if end_idx - idx >= 2:
+                    toc_ranges.append((idx, end_idx))
+                break
+
+    if not toc_ranges:
+        return list(lines), toc_ranges
+
+    keep = [True] * n
+    for start, end in toc_ranges:
+        keep[start:end] = [False] * (end - start)
+    return [ln for ln, k in zip(lines, keep) if k], toc_ranges
+
+
+def drop_residual_toc_fragments(lines):
+    """
+    Drop leftover TOC-like lines (dots + page numbers, etc.).
+    """
+    filtered = []
+    for ln in lines:
+        s = ln.strip()
+        if ("..." in s and _TOC_DOTS_RE.search(s)) or _TOC_HEADING_RE.match(s):
+            continue
+        filtered.append(ln)
+    return filtered
+
+
+# ----------------- FULL PIPELINE ----------------- #
+
+_DASH_RUN_RE = re.compile(r"[-]{4,}")
+_PAGE_HEADER_RE = re.compile(r"PageHeader=.*")
+_PAGE_NUMBER_RE = re.compile(r"PageNumber=.*")
+
+
+def clean_text_pipeline_with_toc_removal(raw_text: str) -> str:
+    """
+    Full cleaning pipeline:
+      1) glyph cleanup
+      2) truncate front boilerplate
+      3) remove figures
+      4) remove repeated footers
+      5) normalize bullets/lists
+      6) whitespace normalization
+      7) remove TOC blocks + leftovers
+      8) final whitespace cleanup
+    """
+    t = remove_nonprintable_and_glyphs(raw_text)
+    t = truncate_boilerplate_start(t)
+    t = remove_figure_placeholders(t)
+    t = remove_repeated_footers(t)
+    t = canonicalize_bullets_and_lists(t)
+    t = normalize_whitespace(t)
+
+    filtered, _ = remove_toc_blocks(t.splitlines())
+    filtered = drop_residual_toc_fragments(filtered)
+    t = "\n".join(filtered)
+
+    # Extra noise cleanup
+    if "----" in t:
+        t = _DASH_RUN_RE.sub("", t)
+    if "PageHeader=" in t:
+        t = _PAGE_HEADER_RE.sub("", t)
+    if "PageNumber=" in t:
+        t = _PAGE_NUMBER_RE.sub("", t)
+    # (the notebook's final "\n(HEADING)\n" -> "\n\1\n" substitution is a no-op)
+    return normalize_whitespace(t)
@@ -0,0 +1,388 @@
+# constrained_json.py
+"""
+Schema-constrained JSON decoding.
+
+A schema is nested dicts (an object whose keys must appear in this order),
+Array(item, min_items, max_items) and `str` (a non-empty JSON string), e.g.
+
+    {"epic": {"title": str}, "features": Array({"title": str}, 1)}
+
+It is compiled into a character-level automaton (JsonSchemaGrammar). At
+every step, SchemaLogitsProcessor masks the logits of all tokens whose text
+would leave the schema, so the output always parses, and
+SchemaStoppingCriteria ends a row the moment its root object closes instead
+of letting it run on to EOS or max_new_tokens. A row cut off by
+max_new_tokens is closed with the shortest valid continuation
+(JsonSchemaGrammar.completion).
+
+Token masks depend only on the automaton state, so they are cached per
+state: after the first document, a step costs one dictionary lookup plus
+the masked_fill.
+
+Usage:
+    constraint = TokenConstraint(JsonSchemaGrammar(schema), tokenizer)
+    processor = SchemaLogitsProcessor(constraint)
+    model.generate(..., logits_processor=LogitsProcessorList([processor]),
+                   stopping_criteria=StoppingCriteriaList([SchemaStoppingCriteria(processor)]))
+    text = tokenizer.decode(new_tokens) + processor.completion(row=0)
+"""
+
+import re
+from collections import deque
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+WHITESPACE = " \t\n\r"
+# Whitespace characters allowed between two structural tokens
+MAX_WHITESPACE = 32
+# Text of byte-fallback tokens >= 0x80 (parts of a UTF-8 character): valid
+# inside a string only
+_HIGH_BYTE = "\x80"
+# Filler for required strings in a completion
+_FILLER = "…"
+
+
+class Array:
+    """
+    A JSON array of `item`s, with min_items .. max_items (None = unbounded).
+    """
+
+    def __init__(self, item, min_items: int = 1, max_items: int | None = None):
+        self.item = item
+        self.min_items = min_items
+        self.max_items = max_items
+
+
+# ----------------- GRAMMAR ----------------- #
+
+class JsonSchemaGrammar:
+    """
+    Character automaton of one schema. A state is a hashable tuple
+    (node, sub, counts, ws):
+      node   index into self.nodes
+      sub    position inside a string node (0 before the opening quote,
+             1 first character, 2 body, 3 after a backslash, 4-7 \\u digits)
+      counts items so far of every enclosing array, by nesting depth
+      ws     whitespace characters since the last structural character
+
+    Nodes:
+      ("lit", char, ws_ok, next)                  one fixed character
+      ("str", next)                               a non-empty string
+      ("arr", item, next, depth, min, max)        just after "["
+      ("sep", arr)                                after an item: "," or "]"
+      ("done",)                                   root closed
+    """
+
+    def __init__(self, schema):
+        self.nodes = [("done",)]
+        # per array depth: counts at or above the cap all allow the same
+        # characters (>= every min_items and max_items at that depth)
+        self.caps = []
+        self._root = self._compile(schema, 0, 0)
+
+    def _add(self, node) -> int:
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def _literal(self, text: str, nxt: int, ws_ok: bool) -> int:
+        # whitespace only before the first character
+        for i in range(len(text) - 1, -1, -1):
+            nxt = self._add(("lit", text[i], ws_ok and i == 0, nxt))
+        return nxt
+
+    def _compile(self, schema, nxt: int, depth: int) -> int:
+        if schema is str:
+            return self._add(("str", nxt))
+        if isinstance(schema, Array):
+            if depth == len(self.caps):
+                self.caps.append(0)
+            self.caps[depth] = max(self.caps[depth], schema.min_items, schema.max_items or 0)
+            arr = self._add(None)
+            sep = self._add(("sep", arr))
+            item = self._compile(schema.item, sep, depth + 1)
+            self.nodes[arr] = ("arr", item, nxt, depth, schema.min_items, schema.max_items)
+            return self._literal("[", arr, ws_ok=True)
+        if isinstance(schema, dict):
+            chain = self._literal("}", nxt, ws_ok=True)
+            keys = list(schema)
+            for i in range(len(keys) - 1, -1, -1):
+                value = self._compile(schema[keys[i]], chain, depth)
+                colon = self._literal(":", value, ws_ok=True)
+                chain = self._literal('"' + keys[i] + '"', colon, ws_ok=True)
+                if i > 0:
+                    chain = self._literal(",", chain, ws_ok=True)
+            return self._literal("{", chain, ws_ok=True)
+        raise TypeError(f"unsupported schema node {schema!r}")
+
+    def start(self):
+        return (self._root, 0, (0,) * len(self.caps), 0)
+
+    @staticmethod
+    def is_done(state) -> bool:
+        return state is not None and state[0] == 0
+
+    def advance(self, state, ch: str):
+        """
+        State after `ch`, or None if `ch` leaves the schema.
+        """
+        node, sub, counts, ws = state
+        spec = self.nodes[node]
+        kind = spec[0]
+
+        if kind == "str" and sub > 0:
+            if sub <= 2:
+                if ch == '"':
+                    return (spec[1], 0, counts, 0) if sub == 2 else None
+                if ch == "\\":
+                    return (node, 3, counts, 0)
+                if ch < " ":
+                    return None
+                return (node, 2, counts, 0)
+            if sub == 3:
+                if ch == "u":
+                    return (node, 4, counts, 0)
+                return (node, 2, counts, 0) if ch in '"\\/bfnrt' else None
+            if ch in "0123456789abcdefABCDEF":
+                return (node, sub + 1 if sub < 7 else 2, counts, 0)
+            return None
+
+        if ch in WHITESPACE:
+            if kind == "done" or (kind == "lit" and not spec[2]) or ws >= MAX_WHITESPACE:
+                return None
+            return (node, sub, counts, ws + 1)
+
+        if kind == "lit":
+            return (spec[3], 0, counts, 0) if ch == spec[1] else None
+        if kind == "str":
+            return (node, 1, counts, 0) if ch == '"' else None
+        if kind == "arr":
+            _, item, nxt, depth, lo, hi = spec
+            if ch == "]":
+                return (nxt, 0, counts, 0) if lo == 0 else None
+            if hi == 0:
+                return None
+            return self.advance((item, 0, _set(counts, depth, 1), 0), ch)
+        if kind == "sep":
+            _, item, nxt, depth, lo, hi = self.nodes[spec[1]]
+            count = counts[depth]
+            if ch == "," and (hi is None or count < hi):
+                return (item, 0, _set(counts, depth, count + 1), 0)
+            if ch == "]" and count >= lo:
+                return (nxt, 0, _set(counts, depth, 0), 0)
+        return None
+
+    def advance_text(self, state, text: str):
+        for i, ch in enumerate(text):
+            state = self.advance(state, ch)
+            if state is None:
+                return None
+            if self.is_done(state):
+                # nothing may follow the root object
+                return state if i == len(text) - 1 else None
+        return state
+
+    def mask_key(self, state):
+        """
+        The part of `state` that decides which tokens are valid in it.
+        """
+        node, sub, counts, ws = state
+        return (node, sub, tuple(min(c, cap) for c, cap in zip(counts, self.caps)), ws)
+
+    def completion(self, state) -> str:
+        """
+        Shortest text that closes the root object from `state` (required
+        strings are filled with "…").
+        """
+        if state is None or self.is_done(state):
+            return ""
+        # the filler first, so that strings are filled with it
+        alphabet = [_FILLER] + sorted({spec[1] for spec in self.nodes if spec[0] == "lit"} | {'"', ",", "]"})
+        seen = {state}
+        queue = deque([(state, "")])
+        while queue:
+            current, text = queue.popleft()
+            for ch in alphabet:
+                nxt = self.advance(current, ch)
+                if nxt is None or nxt in seen:
+                    continue
+                if self.is_done(nxt):
+                    return text + ch
+                seen.add(nxt)
+                queue.append((nxt, text + ch))
+        raise ValueError("no completion closes the root object")
+
+
+def _set(counts, depth: int, value: int):
+    return counts[:depth] + (value,) + counts[depth + 1:]
+
+
+# ----------------- TOKENS ----------------- #
+
+_BYTE_PIECE = re.compile(r"^<0x([0-9A-Fa-f]{2})>$")
+
+
+def _token_texts(tokenizer):
+    """
+    Decoded text of every token id of a SentencePiece vocabulary (None for
+    special tokens), as it appears in the middle of a decoded sequence.
+    """
+    pieces = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+    if not any(p.startswith("▁") for p in pieces if p):
+        raise ValueError("constrained decoding expects a SentencePiece vocabulary")
+    special = set(tokenizer.all_special_ids)
+    texts = []
+    for i, piece in enumerate(pieces):
+        if i in special or piece is None:
+            texts.append(None)
+            continue
+        m = _BYTE_PIECE.match(piece)
+        if m:
+            b = int(m.group(1), 16)
+            texts.append(chr(b) if b < 0x80 else _HIGH_BYTE)
+        else:
+            texts.append(piece.replace("▁", " "))
+    return texts
+
+
+def _first_token_texts(tokenizer, texts):
+    """
+    Text of every token as the first one of a decoded sequence. Llama's
+    decoder strips the leading space there ("▁{" decodes to "{"), which
+    is probed on the tokenizer rather than assumed.
+    """
+    probe = next((i for i, t in enumerate(texts) if t and len(t) > 1 and t[0] == " " and t[1] != " "), None)
+    if probe is None or tokenizer.decode([probe]) != texts[probe][1:]:
+        return texts
+    return [t[1:] if t and t[0] == " " else t for t in texts]
+
+
+class TokenConstraint:
+    """
+    JsonSchemaGrammar lifted to token ids: which tokens are valid in a
+    state (cached per grammar.mask_key) and the state after a token.
+    `first=True` reads tokens as the first generated one, whose text is
+    decoded differently (first_texts).
+    """
+
+    def __init__(self, grammar: JsonSchemaGrammar, tokenizer):
+        self.grammar = grammar
+        self.texts = _token_texts(tokenizer)
+        self.first_texts = _first_token_texts(tokenizer, self.texts)
+        self._masks = {}
+        # Tokens that continue any string body unchanged, and the rest
+        plain = torch.zeros(len(self.texts), dtype=torch.bool)
+        self._string_special = []
+        # Other tokens grouped by their first non-space character
+        self._by_first = {}
+        for i, text in enumerate(self.texts):
+            if not text:
+                continue
+            if all(ch >= " " and ch not in '"\\' for ch in text):
+                plain[i] = True
+            else:
+                self._string_special.append(i)
+            self._by_first.setdefault(text.lstrip(" ")[:1], []).append(i)
+        self._plain = plain
+
+    def allowed(self, state, first: bool = False):
+        """
+        Bool mask over the vocabulary of the tokens valid in `state`.
+        """
+        key = (first, self.grammar.mask_key(state))
+        mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+
+        node, sub = state[0], state[1]
+        if self.grammar.nodes[node][0] == "str" and sub in (1, 2):
+            mask = self._plain.clone()
+            candidates = self._string_special
+        else:
+            mask = torch.zeros(len(self.texts), dtype=torch.bool)
+            after_space = self.grammar.advance(state, " ")
+            candidates = []
+            for first_char, ids in self._by_first.items():
+                probe = first_char or " "
+                if (self.grammar.advance(state, probe) is not None
+                        or (after_space is not None and self.grammar.advance(after_space, probe) is not None)):
+                    candidates.extend(ids)
+        texts = self.first_texts if first else self.texts
+        for i in candidates:
+            if self.grammar.advance_text(state, texts[i]) is not None:
+                mask[i] = True
+        self._masks[key] = mask
+        return mask
+
+    def advance(self, state, token_id: int, first: bool = False):
+        texts = self.first_texts if first else self.texts
+        if token_id >= len(texts) or texts[token_id] is None:
+            return None
+        return self.grammar.advance_text(state, texts[token_id])
+
+
+# ----------------- GENERATE HOOKS ----------------- #
+
+class SchemaLogitsProcessor(LogitsProcessor):
+    """
+    Keeps every row of a generate() call inside the schema. Tracks one
+    automaton state per row from the tokens generate() appends.
+    """
+
+    def __init__(self, constraint: TokenConstraint):
+        self.constraint = constraint
+        self.states = None
+        self._prompt_len = None
+        self._seen = None
+
+    def sync(self, input_ids):
+        if self.states is None:
+            self.states = [self.constraint.grammar.start() for _ in range(input_ids.shape[0])]
+            self._prompt_len = self._seen = input_ids.shape[1]
+        for pos in range(self._seen, input_ids.shape[1]):
+            for row, state in enumerate(self.states):
+                if state is None or self.constraint.grammar.is_done(state):
+                    continue
+                self.states[row] = self.constraint.advance(
+                    state, int(input_ids[row, pos]), first=pos == self._prompt_len,
+                )
+        self._seen = input_ids.shape[1]
+
+    def done(self, row: int) -> bool:
+        return self.constraint.grammar.is_done(self.states[row])
+
+    def __call__(self, input_ids, scores):
+        self.sync(input_ids)
+        vocab = len(self.constraint.texts)
+        first = self._seen == self._prompt_len
+        for row, state in enumerate(self.states):
+            if state is None or self.constraint.grammar.is_done(state):
+                continue
+            mask = self.constraint.allowed(state, first=first).to(scores.device)
+            if scores.shape[-1] > vocab:
+                mask = torch.cat([mask, mask.new_zeros(scores.shape[-1] - vocab)])
+            scores[row] = scores[row].masked_fill(~mask, float("-inf"))
+        return scores
+
+    def completion(self, row: int = 0) -> str:
+        """
+        Text that closes row `row` if max_new_tokens cut it off ("" when the
+        root object closed on its own).
+        """
+        return self.constraint.grammar.completion(self.states[row])
+
+
+class SchemaStoppingCriteria(StoppingCriteria):
+    """
+    Finishes a row as soon as its root object is closed.
+    """
+
+    def __init__(self, processor: SchemaLogitsProcessor):
+        self.processor = processor
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.processor.sync(input_ids)
+        return torch.tensor(
+            [self.processor.done(row) for row in range(input_ids.shape[0])],
+            device=input_ids.device,
+        )
@@ -0,0 +1,271 @@
+# dataset_cache.py
+"""
+Pre-tokenized, memory-mapped training dataset (training.ipynb, evaluation).
+
+Every training run used to re-read clean_text/ and the label JSONs, rebuild
+every prompt and tokenize it example by example. load_or_build_dataset does
+that once per set of inputs and stores the result under
+
+    <cache_dir>/<key>/
+        input_ids.pt     int32, all examples back to back
+        offsets.pt       int64, example i is input_ids[offsets[i]:offsets[i + 1]]
+        prompt_lens.pt   int32, leading tokens of example i with IGNORE_INDEX labels
+        meta.json        key inputs, counts
+
+The key covers the content hash of every matched text / label file, the
+training prompt templates, the tokenizer and max_len, so any change to them
+builds a new entry; unchanged inputs load with torch.load(mmap=True), i.e.
+no copy of the token ids in process memory.
+
+Usage:
+    train_ds = load_or_build_dataset(tokenizer, "clean_text", "training_sample")
+    train_ds[0]   # {"input_ids": [...], "labels": [...]}
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from glob import glob
+
+import torch
+
+from prompts import (
+    EPIC_TITLE_TRAIN_PROMPT,
+    FEATURE_TITLES_TRAIN_PROMPT,
+    STORY_TITLES_TRAIN_PROMPT,
+)
+from training_data import IGNORE_INDEX, build_title_examples, tokenize_examples
+
+DEFAULT_CACHE_DIR = ".dataset_cache"
+
+# Bump when build_title_examples / tokenize_example change what they produce
+DATASET_FORMAT = 1
+
+
+def _sha256(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# ----------------- INPUT FILES ----------------- #
+
+def normalize_stem(name: str) -> str:
+    """
+    Normalize filename stem so txt/json can be matched.
+    Example: 'MovieStream_Project_clean' -> 'moviestream'
+             'movie_stream' -> 'moviestream'
+    """
+    base = name.lower()
+    base = base.replace(".txt", "").replace(".json", "")
+    base = base.replace("_project", "")
+    base = base.replace("_clean", "")
+    base = base.replace(" ", "")
+    base = base.replace("-", "")
+    return base
+
+
+def load_clean_texts(clean_dir: str = "clean_text"):
+    txt_map = {}
+    for path in sorted(glob(os.path.join(clean_dir, "*.txt"))):
+        key = normalize_stem(os.path.basename(path))
+        with open(path, "r", encoding="utf-8") as f:
+            txt = f.read().strip()
+        txt_map[key] = {"path": path, "text": txt}
+    return txt_map
+
+
+def load_json_labels(json_dir: str = "training_sample"):
+    json_map = {}
+    for path in sorted(glob(os.path.join(json_dir, "*.json"))):
+        key = normalize_stem(os.path.basename(path))
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        json_map[key] = {"path": path, "data": data}
+    return json_map
+
+
+def match_training_pairs(clean_map: dict, json_map: dict, verbose: bool = True):
+    """
+    Returns [{"key", "project_text", "label_json"}] for every clean text
+    with a label file of the same normalized name.
+    """
+    training_pairs = []
+    for key, clean_entry in clean_map.items():
+        if key not in json_map:
+            if verbose:
+                print(f"⚠️ No JSON found for: {key} ({clean_entry['path']})")
+            continue
+        training_pairs.append({
+            "key": key,
+            "project_text": clean_entry["text"],
+            "label_json": json_map[key]["data"],
+        })
+    return training_pairs
+
+
+def _matched_files(clean_dir: str, json_dir: str):
+    # [(key, txt_path, json_path)] without reading the files
+    texts = {normalize_stem(os.path.basename(p)): p for p in sorted(glob(os.path.join(clean_dir, "*.txt")))}
+    labels = {normalize_stem(os.path.basename(p)): p for p in sorted(glob(os.path.join(json_dir, "*.json")))}
+    return [(key, path, labels[key]) for key, path in texts.items() if key in labels]
+
+
+# ----------------- KEYS ----------------- #
+
+TRAIN_TEMPLATE_FINGERPRINT = _sha256(
+    EPIC_TITLE_TRAIN_PROMPT,
+    FEATURE_TITLES_TRAIN_PROMPT,
+    STORY_TITLES_TRAIN_PROMPT,
+)[:16]
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """
+    Id of the tokenizer's behaviour: the full fast-tokenizer spec (vocab,
+    merges, normalizer, post-processor) or, for slow tokenizers, the vocab,
+    plus the special tokens.
+    """
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        spec = backend.to_str()
+    else:
+        spec = json.dumps(sorted(tokenizer.get_vocab().items()))
+    return _sha256(
+        type(tokenizer).__name__,
+        spec,
+        json.dumps(tokenizer.special_tokens_map, sort_keys=True, default=str),
+        getattr(tokenizer, "add_bos_token", None),
+        getattr(tokenizer, "add_eos_token", None),
+    )[:16]
+
+
+def dataset_key(tokenizer, clean_dir: str, json_dir: str, max_len: int = 1024) -> str:
+    """
+    Cache key of the tokenized dataset: matched input files (by content),
+    training templates, tokenizer, max_len and DATASET_FORMAT.
+    """
+    files = [
+        f"{key}:{_file_sha256(txt)}:{_file_sha256(js)}"
+        for key, txt, js in _matched_files(clean_dir, json_dir)
+    ]
+    return _sha256(
+        DATASET_FORMAT,
+        TRAIN_TEMPLATE_FINGERPRINT,
+        tokenizer_fingerprint(tokenizer),
+        max_len,
+        *files,
+    )[:24]
+
+
+# ----------------- DATASET ----------------- #
+
+class TokenizedDataset:
+    """
+    Read-only view of one cache entry. Items are built on access from the
+    memory-mapped arrays, in the format of training_data.tokenize_example,
+    so it works with pack_examples, both collators and Trainer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.input_ids = torch.load(os.path.join(path, "input_ids.pt"), mmap=True, weights_only=True)
+        self.offsets = torch.load(os.path.join(path, "offsets.pt"), mmap=True, weights_only=True)
+        self.prompt_lens = torch.load(os.path.join(path, "prompt_lens.pt"), mmap=True, weights_only=True)
+
+    def __len__(self):
+        return len(self.prompt_lens)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        input_ids = self.input_ids[start:end].tolist()
+        n_prompt = int(self.prompt_lens[i])
+        return {"input_ids": input_ids, "labels": [IGNORE_INDEX] * n_prompt + input_ids[n_prompt:]}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def lengths(self):
+        return (self.offsets[1:] - self.offsets[:-1]).tolist()
+
+
+def _write_entry(path: str, tokenized, meta: dict):
+    lengths = [len(t["input_ids"]) for t in tokenized]
+    offsets = torch.zeros(len(tokenized) + 1, dtype=torch.int64)
+    if lengths:
+        offsets[1:] = torch.tensor(lengths, dtype=torch.int64).cumsum(0)
+    input_ids = torch.tensor([i for t in tokenized for i in t["input_ids"]], dtype=torch.int32)
+    prompt_lens = torch.tensor(
+        [sum(1 for l in t["labels"] if l == IGNORE_INDEX) for t in tokenized],
+        dtype=torch.int32,
+    )
+    torch.save(input_ids, os.path.join(path, "input_ids.pt"))
+    torch.save(offsets, os.path.join(path, "offsets.pt"))
+    torch.save(prompt_lens, os.path.join(path, "prompt_lens.pt"))
+    meta = dict(meta, examples=len(tokenized), tokens=int(offsets[-1]))
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+
+
+def load_or_build_dataset(
+    tokenizer,
+    clean_dir: str = "clean_text",
+    json_dir: str = "training_sample",
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    max_len: int = 1024,
+    force: bool = False,
+) -> TokenizedDataset:
+    """
+    The tokenized title-training dataset of `clean_dir` x `json_dir`, built
+    (and written atomically) only when no entry exists for its key.
+
+    force: rebuild even if the entry exists
+    """
+    key = dataset_key(tokenizer, clean_dir, json_dir, max_len)
+    path = os.path.join(cache_dir, key)
+    if force and os.path.isdir(path):
+        shutil.rmtree(path)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return TokenizedDataset(path)
+
+    training_pairs = match_training_pairs(load_clean_texts(clean_dir), load_json_labels(json_dir))
+    tokenized = tokenize_examples(tokenizer, build_title_examples(training_pairs), max_len)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir, suffix=".tmp")
+    try:
+        _write_entry(tmp, tokenized, {
+            "key": key,
+            "format": DATASET_FORMAT,
+            "templates": TRAIN_TEMPLATE_FINGERPRINT,
+            "tokenizer": tokenizer_fingerprint(tokenizer),
+            "tokenizer_name": getattr(tokenizer, "name_or_path", ""),
+            "max_len": max_len,
+            "projects": [p["key"] for p in training_pairs],
+        })
+        os.replace(tmp, path)
+    except OSError:
+        # another job wrote the same entry first
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            raise
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+    return TokenizedDataset(path)
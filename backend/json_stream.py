@@ -0,0 +1,382 @@
+# json_stream.py
+"""
+Incremental parser for the full-backlog JSON (backlog_json.py).
+
+BacklogStreamParser is fed the completion text while it is being decoded
+and returns an event for the epic, every user story and every feature the
+moment the object's closing brace arrives, instead of waiting for the whole
+generation and running parse_json_safely on it. Each object is checked and
+repaired on the spot with the rules of the playground1.ipynb validators,
+adapted to BACKLOG_SCHEMA (id / title / description / acceptance_criteria
+strings, user_stories instead of stories, no webpage).
+
+A generation that is cut off (max_new_tokens, or stopped early) still gives
+a backlog: close() keeps every completed object and closes the feature
+being written after its last complete value.
+
+BacklogStreamStoppingCriteria feeds the parser from inside generate() and
+ends the generation once the requested number of features (and of stories
+in the last one) has been emitted.
+
+Usage:
+    parser = BacklogStreamParser(num_features=5, stories_per_feature=3)
+    for event in parser.feed(chunk):
+        ...                        # {"type": "epic" | "story" | "feature", ...}
+    events = parser.close()
+    backlog = parser.backlog()
+"""
+
+import json
+from typing import Any, Dict, List
+
+import torch
+from transformers import StoppingCriteria
+
+_ITEM_FIELDS = ("id", "title", "description", "acceptance_criteria")
+# Text of an incomplete UTF-8 character at the end of a decode
+_PARTIAL_CHAR = "\ufffd"
+
+
+# ----------------- VALIDATION ----------------- #
+
+def _validate_item(item: Dict[str, Any], prefix: str) -> List[str]:
+    if not isinstance(item, dict):
+        return [f"{prefix} must be an object"]
+    errs = []
+    for field in _ITEM_FIELDS:
+        value = item.get(field)
+        if not isinstance(value, str) or not value.strip():
+            errs.append(f"{prefix}.{field} must be a non-empty string")
+    return errs
+
+
+def validate_epic(epic: Dict[str, Any]) -> List[str]:
+    return _validate_item(epic, "epic")
+
+
+def validate_story(story: Dict[str, Any], feature_index: int, story_index: int) -> List[str]:
+    return _validate_item(story, f"features[{feature_index}].user_stories[{story_index}]")
+
+
+def validate_feature(feature: Dict[str, Any], idx: int) -> List[str]:
+    prefix = f"features[{idx}]"
+    errs = _validate_item(feature, prefix)
+    if not isinstance(feature, dict):
+        return errs
+
+    stories = feature.get("user_stories")
+    if not isinstance(stories, list) or not stories:
+        errs.append(f"{prefix}.user_stories must be a non-empty list")
+    else:
+        for s_idx, story in enumerate(stories):
+            errs.extend(validate_story(story, idx, s_idx))
+    return errs
+
+
+# ----------------- REPAIR ----------------- #
+
+def _repair_item(item: Dict[str, Any], item_id: str) -> Dict[str, Any]:
+    """
+    Conservative repairs, in place:
+      - `id` follows the prompt's numbering (E1, F{i}, US{j} within a feature).
+      - acceptance_criteria given as a list (the playground schema) is joined.
+    """
+    item["id"] = item_id
+    ac = item.get("acceptance_criteria")
+    if isinstance(ac, list):
+        item["acceptance_criteria"] = "; ".join(str(c).strip() for c in ac if str(c).strip())
+    return item
+
+
+def repair_story(story: Dict[str, Any], story_index: int) -> Dict[str, Any]:
+    return _repair_item(story, f"US{story_index + 1}")
+
+
+def repair_feature(feature: Dict[str, Any], idx: int, stories_per_feature: int = None) -> Dict[str, Any]:
+    """
+    Repair the feature and its stories; drops stories that are not objects
+    and keeps at most `stories_per_feature`.
+    """
+    _repair_item(feature, f"F{idx + 1}")
+    stories = feature.get("user_stories")
+    if isinstance(stories, list):
+        stories = [s for s in stories if isinstance(s, dict)][:stories_per_feature]
+        feature["user_stories"] = [repair_story(s, j) for j, s in enumerate(stories)]
+    return feature
+
+
+# ----------------- PARSER ----------------- #
+
+class _Frame:
+    __slots__ = ("kind", "key", "start", "count", "last_key", "expect_key")
+
+    def __init__(self, kind: str, key, start: int):
+        self.kind = kind            # "{" or "["
+        self.key = key              # key (object parent) or index (array parent)
+        self.start = start          # offset of the opening bracket in the text
+        self.count = 0              # children opened so far (arrays)
+        self.last_key = None        # key of the value being read (objects)
+        self.expect_key = kind == "{"
+
+
+class BacklogStreamParser:
+    """
+    num_features:        emit at most this many features (None: all)
+    stories_per_feature: keep at most this many stories per feature (None: all)
+
+    Only strings, objects and arrays are tracked (all BACKLOG_SCHEMA has);
+    text before the root object and after it closes is ignored.
+    """
+
+    def __init__(self, num_features: int = None, stories_per_feature: int = None):
+        self.num_features = num_features
+        self.stories_per_feature = stories_per_feature
+        self.text = ""
+        self.pos = 0                # next character to scan
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.key_start = None       # offset of the key string being read
+        self.done = False           # root object closed
+        self.safe = None            # (offset, closers) after the last complete value
+        self.epic = None
+        self.features = []
+        self.stories = []           # emitted stories of the feature being written
+        self.errors = []            # objects that were dropped, and why
+
+    # ---- scanning ----
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Scan the next piece of the completion; returns the events of the
+        objects it closed, in order.
+        """
+        self.text += chunk
+        events = []
+        text, stack = self.text, self.stack
+        while self.pos < len(text) and not self.done:
+            i = self.pos
+            c = text[i]
+            self.pos += 1
+            if not stack:
+                if c == "{":
+                    stack.append(_Frame("{", None, i))
+                    self._mark_safe(i + 1)
+                continue
+            top = stack[-1]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.key_start is not None:
+                        top.last_key = _decode_key(text[self.key_start:i + 1])
+                        self.key_start = None
+                    else:
+                        self._mark_safe(i + 1)
+            elif c == '"':
+                self.in_string = True
+                if top.kind == "{" and top.expect_key:
+                    self.key_start = i
+            elif c in "{[":
+                if top.kind == "{":
+                    key = top.last_key
+                else:
+                    key = top.count
+                    top.count += 1
+                stack.append(_Frame(c, key, i))
+                if self._is_feature(len(stack) - 1):
+                    self.stories = []
+                self._mark_safe(i + 1)
+            elif c in "}]":
+                event = self._close_frame(i)
+                if event is not None:
+                    events.append(event)
+                if not stack:
+                    self.done = True
+                else:
+                    self._mark_safe(i + 1)
+            elif c == ":":
+                top.expect_key = False
+            elif c == "," and top.kind == "{":
+                top.expect_key = True
+        return events
+
+    def _mark_safe(self, offset: int):
+        closers = "".join("}" if f.kind == "{" else "]" for f in reversed(self.stack))
+        self.safe = (offset, closers)
+
+    def _is_feature(self, depth: int) -> bool:
+        # root{ features[ {feature} ] }
+        stack = self.stack
+        return depth == 2 and len(stack) > 2 and stack[1].key == "features" and stack[2].kind == "{"
+
+    def _is_story(self, depth: int) -> bool:
+        # ... {feature user_stories[ {story} ] }
+        stack = self.stack
+        return (
+            depth == 4 and len(stack) > 4 and self._is_feature(2)
+            and stack[3].key == "user_stories" and stack[4].kind == "{"
+        )
+
+    def _is_epic(self, depth: int) -> bool:
+        stack = self.stack
+        return depth == 1 and len(stack) > 1 and stack[1].key == "epic" and stack[1].kind == "{"
+
+    def _close_frame(self, end: int):
+        depth = len(self.stack) - 1
+        frame = self.stack[-1]
+        kind = None
+        if self._is_epic(depth):
+            kind = "epic"
+        elif self._is_feature(depth):
+            kind = "feature"
+        elif self._is_story(depth):
+            kind = "story"
+        self.stack.pop()
+        if kind is None:
+            return None
+        return self._emit(kind, self.text[frame.start:end + 1], frame.key)
+
+    # ---- events ----
+
+    def _emit(self, kind: str, json_str: str, index, stories=None):
+        obj = _loads(json_str)
+        if obj is None:
+            self.errors.append(f"{kind} {index} is not valid JSON: {json_str[:80]!r}")
+            return None
+        if stories is not None:
+            obj["user_stories"] = stories
+
+        if kind == "epic":
+            if self.epic is not None:
+                return None
+            self.epic = _repair_item(obj, "E1")
+            return {"type": "epic", "epic": self.epic, "errors": validate_epic(self.epic)}
+
+        f_idx = len(self.features)
+        if self.num_features is not None and f_idx >= self.num_features:
+            return None
+
+        if kind == "story":
+            s_idx = len(self.stories)
+            if self.stories_per_feature is not None and s_idx >= self.stories_per_feature:
+                return None
+            story = repair_story(obj, s_idx)
+            self.stories.append(story)
+            return {
+                "type": "story",
+                "feature_index": f_idx,
+                "story": story,
+                "errors": validate_story(story, f_idx, s_idx),
+            }
+
+        feature = repair_feature(obj, f_idx, self.stories_per_feature)
+        self.features.append(feature)
+        self.stories = []
+        return {"type": "feature", "feature": feature, "errors": validate_feature(feature, f_idx)}
+
+    def satisfied(self) -> bool:
+        """
+        Everything asked for has been emitted (or the root object closed).
+        """
+        if self.done:
+            return True
+        if self.num_features is None:
+            return False
+        if len(self.features) >= self.num_features:
+            return True
+        # the last feature has all its stories: the rest of it is not needed
+        return (
+            self.stories_per_feature is not None
+            and len(self.features) == self.num_features - 1
+            and len(self.stories) >= self.stories_per_feature
+        )
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        End of the completion: emits the feature being written, closed after
+        its last complete value, if at least one of its stories was emitted.
+        Its user_stories are the emitted ones, not a story cut mid-way.
+        """
+        if self.done or not self._is_feature(2) or not self.stories:
+            return []
+        if self.num_features is not None and len(self.features) >= self.num_features:
+            return []
+        offset, closers = self.safe
+        feature = self.stack[2]
+        if offset <= feature.start:
+            return []
+        # closers run innermost first; the last two close features[ and the root
+        event = self._emit(
+            "feature", self.text[feature.start:offset] + closers[:-2], len(self.features), list(self.stories),
+        )
+        return [event] if event is not None else []
+
+    def backlog(self):
+        """
+        The emitted objects as a backlog dict (None if nothing was emitted).
+        """
+        if self.epic is None and not self.features:
+            return None
+        return {"epic": self.epic, "features": self.features}
+
+
+def _decode_key(json_str: str) -> str:
+    try:
+        return json.loads(json_str)
+    except ValueError:
+        return json_str[1:-1]
+
+
+def _loads(json_str: str):
+    # Raw newlines inside strings, as parse_json_safely allows
+    try:
+        obj = json.loads(json_str.replace("\r", " ").replace("\n", " "))
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+# ----------------- GENERATE() HOOK ----------------- #
+
+class BacklogStreamStoppingCriteria(StoppingCriteria):
+    """
+    Feeds the newly decoded text of row 0 to `parser` after every step,
+    passes each event to `on_event` and stops once parser.satisfied().
+
+    Tokens are decoded from the start of the current line (as
+    TextIteratorStreamer does), so a step costs one short decode and the
+    text is fed only once complete UTF-8 characters have been decoded.
+    """
+
+    def __init__(self, tokenizer, prompt_len: int, parser: BacklogStreamParser, on_event=None):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.parser = parser
+        self.on_event = on_event
+        self.line_start = prompt_len   # first token of the current line
+        self.fed = 0                   # characters of the line already fed
+        self.events = []
+
+    def __call__(self, input_ids, scores, **kwargs):
+        text = self.tokenizer.decode(input_ids[0, self.line_start:], skip_special_tokens=True)
+        if not text.endswith(_PARTIAL_CHAR):
+            for event in self.parser.feed(text[self.fed:]):
+                self._publish(event)
+            self.fed = len(text)
+            if text.endswith("\n"):
+                self.line_start, self.fed = input_ids.shape[1], 0
+        done = self.parser.satisfied()
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+    def close(self):
+        for event in self.parser.close():
+            self._publish(event)
+
+    def _publish(self, event):
+        self.events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
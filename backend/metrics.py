@@ -0,0 +1,232 @@
+# metrics.py
+"""
+Prometheus metrics for the inference pipeline (scraped from /metrics).
+
+Every labelled child is resolved once, so the hot path is a plain
+attribute call on a pre-built object (one uncontended lock inside
+prometheus_client) with no label lookups: fixed label sets at import time,
+HTTP status codes the first time each one is seen. If prometheus_client is
+not installed (e.g. inside the notebooks) every metric is a no-op.
+"""
+
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import (
+        Counter,
+        Gauge,
+        Histogram,
+        CONTENT_TYPE_LATEST,
+        generate_latest,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+    class _NoOpMetric:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self, amount=1):
+            pass
+
+        def dec(self, amount=1):
+            pass
+
+        def set(self, value):
+            pass
+
+        def observe(self, value):
+            pass
+
+    Counter = Gauge = Histogram = _NoOpMetric
+
+    def generate_latest():
+        return b""
+
+
+STAGES = (
+    "pdf_extraction",
+    "cleaning",
+    "epic",
+    "features",
+    "stories",
+    "json_parsing",
+)
+CACHES = ("prefix", "result")
+JSON_MODES = ("free", "constrained")
+ENDPOINTS = ("/analyze", "/analyze/stream")
+
+# Seconds; CPU decoding of a full document can take minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKENS_PER_SEC_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+BATCH_SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+
+# ----------------- DEFINITIONS ----------------- #
+
+_stage_latency = Histogram(
+    "agileai_stage_latency_seconds",
+    "Wall time of one pipeline stage call",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+_prompt_tokens = Counter(
+    "agileai_prompt_tokens_total",
+    "Prompt tokens fed to the model",
+    ["stage"],
+)
+_generated_tokens = Counter(
+    "agileai_generated_tokens_total",
+    "Tokens generated by the model",
+    ["stage"],
+)
+_tokens_per_sec = Histogram(
+    "agileai_generation_tokens_per_second",
+    "Generated tokens per second of one generate() call",
+    ["stage"],
+    buckets=TOKENS_PER_SEC_BUCKETS,
+)
+_draft_tokens = Counter(
+    "agileai_draft_tokens_total",
+    "Prompt-lookup draft tokens by result (acceptance rate = accepted / proposed)",
+    ["stage", "result"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "agileai_queue_depth",
+    "Requests waiting in the /analyze queue",
+)
+BATCH_SIZE = Histogram(
+    "agileai_batch_size",
+    "Documents per micro-batch",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+_cache_requests = Counter(
+    "agileai_cache_requests_total",
+    "Cache lookups by cache and result (hit rate = hit / (hit + miss))",
+    ["cache", "result"],
+)
+
+_json_attempts = Counter(
+    "agileai_backlog_json_attempts_total",
+    "Full-backlog JSON generations by decoding mode and whether they parsed",
+    ["mode", "result"],
+)
+_json_tokens = Counter(
+    "agileai_backlog_json_tokens_total",
+    "Tokens generated for full-backlog JSON, by decoding mode",
+    ["mode"],
+)
+
+_requests = Counter(
+    "agileai_requests_total",
+    "HTTP requests by endpoint and status code",
+    ["endpoint", "status"],
+)
+_request_latency = Histogram(
+    "agileai_request_latency_seconds",
+    "End-to-end request latency, including queue wait",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+
+_feedback = Counter(
+    "agileai_feedback_total",
+    "Thumbs-up/down votes from the results page",
+    ["item_type", "direction"],
+)
+
+# Pre-resolved children for the hot path
+STAGE_LATENCY = {s: _stage_latency.labels(s) for s in STAGES}
+PROMPT_TOKENS = {s: _prompt_tokens.labels(s) for s in STAGES}
+GENERATED_TOKENS = {s: _generated_tokens.labels(s) for s in STAGES}
+TOKENS_PER_SEC = {s: _tokens_per_sec.labels(s) for s in STAGES}
+DRAFT_TOKENS = {
+    (s, r): _draft_tokens.labels(s, r)
+    for s in STAGES
+    for r in ("proposed", "accepted")
+}
+FEEDBACK = {
+    (t, d): _feedback.labels(t, d)
+    for t in ("epic", "feature", "story")
+    for d in ("up", "down")
+}
+CACHE_REQUESTS = {
+    (c, hit): _cache_requests.labels(c, "hit" if hit else "miss")
+    for c in CACHES
+    for hit in (True, False)
+}
+JSON_ATTEMPTS = {
+    (m, parsed): _json_attempts.labels(m, "parsed" if parsed else "failed")
+    for m in JSON_MODES
+    for parsed in (True, False)
+}
+JSON_TOKENS = {m: _json_tokens.labels(m) for m in JSON_MODES}
+REQUEST_LATENCY = {e: _request_latency.labels(e) for e in ENDPOINTS}
+# (endpoint, status) -> child, filled on first use of each status code
+_REQUESTS = {}
+
+
+# ----------------- HELPERS ----------------- #
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_LATENCY[stage].observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY[stage].observe(time.perf_counter() - start)
+
+
+def observe_generation(stage: str, prompt_tokens: int, generated_tokens: int, seconds: float):
+    PROMPT_TOKENS[stage].inc(prompt_tokens)
+    GENERATED_TOKENS[stage].inc(generated_tokens)
+    if seconds > 0:
+        TOKENS_PER_SEC[stage].observe(generated_tokens / seconds)
+
+
+def observe_drafts(stage: str, proposed: int, accepted: int):
+    DRAFT_TOKENS[(stage, "proposed")].inc(proposed)
+    DRAFT_TOKENS[(stage, "accepted")].inc(accepted)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS[(cache, hit)].inc()
+
+
+def record_json_attempt(mode: str, parsed: bool, generated_tokens: int):
+    JSON_ATTEMPTS[(mode, parsed)].inc()
+    JSON_TOKENS[mode].inc(generated_tokens)
+
+
+def record_request(endpoint: str, status: int, seconds: float):
+    key = (endpoint, status)
+    child = _REQUESTS.get(key)
+    if child is None:
+        child = _REQUESTS[key] = _requests.labels(endpoint, str(status))
+    child.inc()
+    REQUEST_LATENCY[endpoint].observe(seconds)
+
+
+def record_feedback(item_type: str, direction: str):
+    child = FEEDBACK.get((item_type, direction))
+    if child is not None:
+        child.inc()
+
+
+def render_latest():
+    """
+    (body, content_type) for a /metrics response.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
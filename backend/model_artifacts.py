@@ -0,0 +1,135 @@
+# model_artifacts.py
+"""
+Merged, versioned model artifacts for fast service start.
+
+Loading the LoRA adapter folder with AutoPeftModelForCausalLM fetches the
+base TinyLlama and applies the adapter on every start, and the float32
+merged checkpoint is ~4.4 GB resident. Instead the adapter is merged once
+into
+
+    <root>/<source name>-<version>/
+        artifact.json        source, version
+        fp32/                merged weights (safetensors) + tokenizer
+        bf16/                same, cast to bfloat16
+
+where version is result_cache.model_fingerprint(source), so a retrained
+adapter gets a new artifact. from_pretrained memory-maps safetensors, so
+loading a folder in its stored dtype only maps the file.
+
+Serving variants (load_artifact):
+  "fp32"  float32 numerics, as the adapter folder
+  "bf16"  half the memory of fp32
+  "int8"  fp32 with every nn.Linear dynamically quantized to int8
+          (CPU only; activations are quantized per batch at run time)
+
+Usage:
+    path = ensure_artifact("agileai_tinyllama_qlora_v4")
+    model, tokenizer = load_artifact(path, variant="bf16")
+"""
+
+import os
+import json
+import time
+import shutil
+import tempfile
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from result_cache import model_fingerprint
+
+ARTIFACT_INFO = "artifact.json"
+VARIANTS = ("fp32", "bf16", "int8")
+# stored weights of each variant: (folder, dtype)
+STORAGE = {
+    "fp32": ("fp32", torch.float32),
+    "bf16": ("bf16", torch.bfloat16),
+    "int8": ("fp32", torch.float32),
+}
+
+
+def is_artifact(model_dir: str) -> bool:
+    return os.path.exists(os.path.join(model_dir, ARTIFACT_INFO))
+
+
+def artifact_path(source_dir: str, root: str = "models") -> str:
+    name = os.path.basename(os.path.normpath(source_dir))
+    return os.path.join(root, f"{name}-{model_fingerprint(source_dir)}")
+
+
+def _load_source(source_dir: str):
+    if os.path.exists(os.path.join(source_dir, "adapter_config.json")):
+        from peft import AutoPeftModelForCausalLM
+        model = AutoPeftModelForCausalLM.from_pretrained(source_dir, dtype=torch.float32)
+        return model.merge_and_unload()
+    return AutoModelForCausalLM.from_pretrained(source_dir, dtype=torch.float32)
+
+
+# ----------------- BUILD ----------------- #
+
+def ensure_artifact(source_dir: str, root: str = "models", force: bool = False) -> str:
+    """
+    Path of the merged artifact of `source_dir` (adapter or full checkpoint),
+    built first if it does not exist yet. The merge runs in float32; the
+    folder is written under a temp name and renamed, so a crashed build
+    never looks finished.
+    """
+    if is_artifact(source_dir):
+        return source_dir
+    path = artifact_path(source_dir, root)
+    if force and os.path.isdir(path):
+        shutil.rmtree(path)
+    if is_artifact(path):
+        return path
+
+    start = time.perf_counter()
+    model = _load_source(source_dir)
+    tokenizer = AutoTokenizer.from_pretrained(source_dir)
+
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=root, suffix=".tmp")
+    try:
+        # widest dtype first, so every cast starts from the float32 merge
+        for folder, dtype in sorted(set(STORAGE.values()), key=lambda s: -s[1].itemsize):
+            model.to(dtype)
+            model.save_pretrained(os.path.join(tmp, folder), safe_serialization=True)
+            tokenizer.save_pretrained(os.path.join(tmp, folder))
+        with open(os.path.join(tmp, ARTIFACT_INFO), "w", encoding="utf-8") as f:
+            json.dump({
+                "source": os.path.normpath(source_dir),
+                "version": model_fingerprint(source_dir),
+            }, f, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        # another process finished the same artifact first
+        if not is_artifact(path):
+            raise
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+    print(f"Merged {source_dir} -> {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+# ----------------- LOAD ----------------- #
+
+def load_artifact(path: str, variant: str = "bf16", device: str = "cpu"):
+    """
+    Load a merged artifact as one of VARIANTS. Returns (model, tokenizer).
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"unknown model variant {variant!r}, expected one of {VARIANTS}")
+    if variant == "int8" and device != "cpu":
+        raise ValueError("the int8 variant uses CPU dynamic quantization")
+
+    folder, dtype = STORAGE[variant]
+    model = AutoModelForCausalLM.from_pretrained(os.path.join(path, folder), dtype=dtype)
+    if variant == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.to(device)
+    model.eval()
+
+    tokenizer = AutoTokenizer.from_pretrained(os.path.join(path, folder))
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return model, tokenizer
@@ -0,0 +1,253 @@
+# packing.py
+"""
+Token-budgeted project context for the title prompts.
+
+prompts.truncate keeps the first 800 characters of the document, which is
+mostly the introduction, and 800 characters are a different number of
+TinyLlama tokens for every document. PromptPacker instead fills a fixed
+budget of real tokenizer tokens per stage:
+
+  - the document is split into chunks (numbered section headings / blank
+    lines, long sections cut at sentence ends),
+  - the opening chunks are always kept (up to `lead_tokens`), so every
+    stage's context starts with the same text and the shared-prefix KV
+    cache still applies,
+  - the rest of the budget goes to the chunks with the best BM25 score
+    against the stage query (the feature title for story prompts, the
+    document's own most frequent terms for epic / feature prompts),
+  - chosen chunks are emitted in document order.
+
+The adapter was trained on the truncated contexts (prompts.py), so packed
+contexts are off its training distribution: packing is opt-in
+(AGILEAI_CONTEXT=packed, batch_analyze.py --context packed) until an
+adapter is trained on them.
+
+Usage:
+    packer = PromptPacker(tokenizer)
+    proj = packer.pack(project_text, "stories", query=feature_title)
+"""
+
+import re
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+# Context tokens per stage (truncate(800) is ~180-220 tokens)
+STAGE_TOKEN_BUDGETS = {
+    "epic": 192,
+    "features": 256,
+    "stories": 160,
+}
+
+_HEADING_RE = re.compile(r"^\s*\d+(\.\d+)*\.?\s+[A-Z][A-Z0-9 ,&/\-]+$")
+_REFERENCES_RE = re.compile(r"^\s*\d+(\.\d+)*\.?\s+(REFERENCES|BIBLIOGRAPHY)\b")
+# ". " after a word (not "3. " of a numbered heading) followed by a capital
+_SENTENCE_END_RE = re.compile(r"(?<=[a-z\)%][.!?])\s+(?=[A-Z])")
+_TERM_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can for from has have in into is it its of on or
+that the their this to was were will with which using used use such
+than these those also may not all any each other our we they system
+""".split())
+
+
+def _terms(text: str):
+    return [t for t in _TERM_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+# ----------------- CHUNKING ----------------- #
+
+def split_sections(text: str):
+    """
+    Split cleaned project text at numbered headings ("3. DATASET ...") and
+    blank lines. A heading stays with the text that follows it; heading-only
+    and reference-list sections are left out. Returns a list of section
+    strings (original lines kept).
+    """
+    sections = []
+    current = []
+
+    def flush():
+        body = [ln for ln in current if not _HEADING_RE.match(ln)]
+        if body and not (current and _REFERENCES_RE.match(current[0])):
+            sections.append("\n".join(current))
+        current.clear()
+
+    for ln in text.strip().splitlines():
+        if _HEADING_RE.match(ln):
+            flush()
+        elif not ln.strip():
+            # a blank line right after a heading does not end its section
+            if current and not all(_HEADING_RE.match(c) for c in current):
+                flush()
+            continue
+        current.append(ln)
+    flush()
+    return sections
+
+
+class _Document:
+    """
+    Chunks of one project text with their token counts and BM25 statistics.
+    """
+
+    def __init__(self, tokenizer, text: str, max_chunk_tokens: int):
+        self.chunks = []
+        for section in split_sections(text):
+            self.chunks.extend(self._split_long(tokenizer, section, max_chunk_tokens))
+
+        self.n_tokens = [_count_tokens(tokenizer, c) for c in self.chunks]
+        self.term_freqs = [Counter(_terms(c)) for c in self.chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        df = Counter()
+        for tf in self.term_freqs:
+            df.update(tf.keys())
+        n = len(self.chunks)
+        self.idf = {t: math.log((n - d + 0.5) / (d + 0.5) + 1.0) for t, d in df.items()}
+
+        totals = Counter()
+        for tf in self.term_freqs:
+            totals.update(tf)
+        self.top_terms = [t for t, _ in totals.most_common(20)]
+
+    @staticmethod
+    def _split_long(tokenizer, section: str, max_chunk_tokens: int):
+        if _count_tokens(tokenizer, section) <= max_chunk_tokens:
+            return [section]
+        chunks = []
+        current = ""
+        for sentence in _SENTENCE_END_RE.split(section):
+            candidate = f"{current} {sentence}" if current else sentence
+            if current and _count_tokens(tokenizer, candidate) > max_chunk_tokens:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = candidate
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def bm25(self, query_terms, k1: float = 1.5, b: float = 0.75):
+        scores = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            norm = k1 * (1.0 - b + b * length / self.avg_len) if self.avg_len else k1
+            score = 0.0
+            for t in query_terms:
+                f = tf.get(t)
+                if f:
+                    score += self.idf[t] * f * (k1 + 1.0) / (f + norm)
+            scores.append(score)
+        return scores
+
+
+def _count_tokens(tokenizer, text: str) -> int:
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+# ----------------- PACKER ----------------- #
+
+class PromptPacker:
+    """
+    tokenizer:        the generation tokenizer (budgets are in its tokens)
+    budgets:          {stage: context tokens}, default STAGE_TOKEN_BUDGETS
+    lead_tokens:      opening text always kept in every stage's context
+    max_chunk_tokens: sections longer than this are cut at sentence ends
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        budgets: dict = None,
+        lead_tokens: int = 64,
+        max_chunk_tokens: int = 64,
+        max_documents: int = 16,
+    ):
+        self.tokenizer = tokenizer
+        self.budgets = dict(STAGE_TOKEN_BUDGETS if budgets is None else budgets)
+        self.lead_tokens = lead_tokens
+        self.max_chunk_tokens = max_chunk_tokens
+        self.max_documents = max_documents
+        self._documents = OrderedDict()   # sha256(text) -> _Document
+        self._lock = threading.Lock()
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Short id of the packing settings (part of the result-cache key).
+        """
+        budgets = ",".join(f"{k}={v}" for k, v in sorted(self.budgets.items()))
+        return f"packed:{budgets}:lead={self.lead_tokens}:chunk={self.max_chunk_tokens}"
+
+    def _document(self, text: str) -> _Document:
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            doc = self._documents.get(key)
+            if doc is not None:
+                self._documents.move_to_end(key)
+                return doc
+        doc = _Document(self.tokenizer, text, self.max_chunk_tokens)
+        with self._lock:
+            self._documents[key] = doc
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return doc
+
+    def pack(self, project_text: str, stage: str, query: str = "") -> str:
+        """
+        Context for one prompt of `stage`, at most `budgets[stage]` tokens.
+        """
+        if not isinstance(project_text, str) or not project_text.strip():
+            return ""
+        budget = self.budgets[stage]
+        doc = self._document(project_text)
+
+        # 1) lead chunks
+        chosen = set()
+        used = 0
+        for i, n in enumerate(doc.n_tokens):
+            if used + n > min(self.lead_tokens, budget):
+                break
+            chosen.add(i)
+            used += n
+        lead = set(chosen)
+
+        # 2) best-scoring chunks that still fit (+1 token for the joining newline)
+        query_terms = _terms(query) or doc.top_terms
+        scores = doc.bm25(query_terms)
+        ranked = sorted(
+            (i for i in range(len(doc.chunks)) if i not in chosen),
+            key=lambda i: (-scores[i], i),
+        )
+        for i in ranked:
+            if used + doc.n_tokens[i] + 1 <= budget:
+                chosen.add(i)
+                used += doc.n_tokens[i] + 1
+
+        # 3) exact count of the joined text; drop the weakest chunks if over
+        while True:
+            text = "\n".join(doc.chunks[i] for i in sorted(chosen))
+            if _count_tokens(self.tokenizer, text) <= budget:
+                break
+            droppable = [i for i in chosen if i not in lead] or list(chosen)
+            if len(chosen) == 1:
+                return self._cut(text, budget)
+            chosen.remove(min(droppable, key=lambda i: (scores[i], -i)))
+        if not chosen:
+            return self._cut(doc.chunks[0], budget) if doc.chunks else ""
+        return text
+
+    def _cut(self, text: str, budget: int) -> str:
+        # Longest word prefix of `text` within `budget` tokens
+        words = text.split(" ")
+        lo, hi = 0, len(words)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if _count_tokens(self.tokenizer, " ".join(words[:mid])) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        return " ".join(words[:lo])
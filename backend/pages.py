@@ -0,0 +1,283 @@
+# pages.py
+"""
+Heading normalization and UI-page detection from playground1.ipynb
+(Cells 5 and 7), compiled.
+
+The notebook checks every line against each irrelevant-line pattern and
+every candidate heading against each CANONICAL_MAP regex in turn. Here:
+  - one regex scan of the document finds the lines containing the word
+    'page'; only those lines are looked at,
+  - the irrelevant-line patterns are one alternation,
+  - a canonical map is compiled into one alternation; the label is the one
+    of the FIRST pattern (in map order) that matches, as in the notebook.
+
+CANONICAL_MAP is the notebook's map (written for the e-commerce fashion
+site). Other domains can ship their own, ordered, as JSON next to their
+prompt template:
+    templates/<Domain>_template.txt
+    templates/<Domain>_pages.json      {"\\bhome\\s*page\\b": "Home Page", ...}
+and use get_detector("<Domain>"). Patterns must not use numbered
+backreferences (they are combined into one regex).
+"""
+
+import os
+import re
+import json
+from functools import lru_cache
+from typing import Dict, List
+
+TEMPLATES_DIR = os.environ.get(
+    "AGILEAI_TEMPLATES_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates"),
+)
+
+CANONICAL_MAP = {
+    r"\bhome\s*page\b": "Home Page",
+    r"\bclothing\s*page\b": "Clothing Page",
+    r"\border\s*us\s*page\b": "Order Us Page",
+    r"\border\s*us\b": "Order Us Page",
+    r"\bcontact\s*us\s*page\b": "Contact Us Page",
+    r"\babout\s*us\s*page\b": "About Us Page",
+    r"\btrack\s*for\s*admin\s*page\b": "Track For Admin Page",
+    r"\btrack\b": "Track",
+    r"\bregister\s*page\b": "Register Page",
+    r"\blogin\s*page\b": "Login Page",
+    r"\badmin\s*page\b": "Admin Page",
+    r"\border\s*view\s*for\s*user\b": "Order View for User",
+    r"\bpaypal\s*for\s*payment\b": "PayPal For Payment",
+    r"\bsuccess\s*page\b": "Success Page",
+    r"\bfailed\s*page\b": "Failed Page",
+}
+
+STOP_HEADINGS = {
+    "ABSTRACT",
+    "ACKNOWLEDGEMENTS",
+    "ACKNOWLEDGEMENT",
+    "TABLE OF CONTENTS",
+    "CONTENTS",
+    "INDEX",
+    "LIST OF FIGURES",
+    "REFERENCES",
+}
+
+IRRELEVANT_PATTERNS = [
+    r"https?://\S+",
+    r"opus@govst.edu",
+    r"^page \d+$",
+    r"^\d+\s*$",
+]
+
+
+# ----------------- IRRELEVANT LINES ----------------- #
+
+_IRRELEVANT_RE = re.compile("|".join(IRRELEVANT_PATTERNS), re.IGNORECASE)
+_PUNCT_RE = re.compile(r"[^A-Za-z0-9\s]+")
+_BARE_NUMBER_RE = re.compile(r"^\d{1,3}\.?$")
+
+
+def is_irrelevant_line(line: str) -> bool:
+    """
+    Return True if a line is clearly not useful as content/heading.
+    """
+    s = line.strip()
+    if not s:
+        return True  # empty lines irrelevant for our purposes
+
+    # URL / email / trivial numeric lines
+    if _IRRELEVANT_RE.search(s.lower()):
+        return True
+
+    # Very punctuation-heavy → probably junk or TOC artifact
+    punct = sum(len(run) for run in _PUNCT_RE.findall(s))
+    if punct / max(1, len(s)) > 0.25:
+        return True
+
+    # Bare page numbers like "12."
+    if _BARE_NUMBER_RE.match(s):
+        return True
+
+    # Known boilerplate headings
+    return s.upper() in STOP_HEADINGS
+
+
+# ----------------- HEADINGS ----------------- #
+
+_LEADING_NUMBER_RE = re.compile(r"^\s*\d+(\.\d+)*\s*[:\-\)]*\s*")
+_TRAILING_NUMBER_RE = re.compile(r"\s+\d{1,3}\s*$")
+_LEADING_BULLET_RE = re.compile(r"^[\-\u2022\uf0d8\uf0b7\*]+\s*")
+_NON_ALNUM_RE = re.compile(r"[^A-Za-z0-9 ]+")
+_DIGITS_RE = re.compile(r"^\d+$")
+
+_PAGE_WORD_RE = re.compile(r"\bpage\b", re.IGNORECASE)
+# Line boundaries of str.splitlines() other than "\n"
+_OTHER_LINE_BREAKS_RE = re.compile(r"[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
+
+
+def _title_case(key: str) -> str:
+    return " ".join(w.capitalize() for w in key.split())
+
+
+class PageDetector:
+    """
+    Usage:
+        detector = PageDetector()                 # notebook CANONICAL_MAP
+        detector = get_detector("Webapp")         # templates/Webapp_pages.json
+        detector.detect_ui_pages_from_text(text)  # ["Home Page", ...]
+    """
+
+    def __init__(self, canonical_map: Dict[str, str] = None):
+        self.canonical_map = dict(CANONICAL_MAP if canonical_map is None else canonical_map)
+        self._labels = list(self.canonical_map.values())
+        self._combined = None
+        if self.canonical_map:
+            self._combined = re.compile(
+                "|".join(f"(?P<_c{i}>{pat})" for i, pat in enumerate(self.canonical_map)),
+                re.IGNORECASE,
+            )
+
+    def canonical_label(self, key: str):
+        """
+        Label of the first map pattern (in map order) found in `key`, or None.
+        """
+        if self._combined is None:
+            return None
+        # At each position the alternation picks the lowest-index pattern that
+        # matches there; the lowest over all match positions is the first
+        # pattern in map order that matches anywhere.
+        best = None
+        m = self._combined.search(key)
+        while m is not None:
+            idx = int(m.lastgroup[2:])
+            if best is None or idx < best:
+                best = idx
+                if best == 0:
+                    break
+            m = self._combined.search(key, m.start() + 1)
+        return None if best is None else self._labels[best]
+
+    def normalize_heading_variant(self, ln: str) -> str:
+        """
+        Normalize a heading/page-like line into a clean, title-cased label
+        using the canonical map when possible.
+        """
+        ln0 = ln.strip()
+        ln0 = _LEADING_NUMBER_RE.sub("", ln0)    # "4.1 HOME PAGE"
+        ln0 = _TRAILING_NUMBER_RE.sub("", ln0)   # trailing page numbers
+        ln0 = _LEADING_BULLET_RE.sub("", ln0)
+
+        key = _NON_ALNUM_RE.sub(" ", ln0).strip().lower()
+
+        canon = self.canonical_label(key)
+        if canon is not None:
+            return canon
+
+        if key.endswith(" page"):
+            return _title_case(key)
+
+        # Drop super short / pure numeric stuff
+        if len(key) < 3 or _DIGITS_RE.search(key):
+            return ""
+
+        return _title_case(key)
+
+    def detect_ui_pages_from_text(self, text: str) -> List[str]:
+        """
+        Detect 'UI pages': short, relevant lines containing the word 'page'
+        (<= 100 chars, <= 10 words), normalized with normalize_heading_variant.
+        Ordered, deduplicated.
+        """
+        seen = set()
+        ordered = []
+        for ln in _page_lines(text):
+            s = ln.strip()
+            if len(s) > 100 or len(s.split()) > 10 or is_irrelevant_line(s):
+                continue
+            norm = self.normalize_heading_variant(s)
+            if norm and norm not in seen:
+                seen.add(norm)
+                ordered.append(norm)
+        return ordered
+
+
+def _page_lines(text: str):
+    """
+    Lines of `text` (as str.splitlines() splits them) containing the word 'page'.
+    """
+    if _OTHER_LINE_BREAKS_RE.search(text):
+        for ln in text.splitlines():
+            if _PAGE_WORD_RE.search(ln):
+                yield ln
+        return
+
+    m = _PAGE_WORD_RE.search(text)
+    while m is not None:
+        start = text.rfind("\n", 0, m.start()) + 1
+        end = text.find("\n", m.end())
+        if end == -1:
+            end = len(text)
+        yield text[start:end]
+        m = _PAGE_WORD_RE.search(text, end)
+
+
+# ----------------- DOMAIN MAPS ----------------- #
+
+def load_canonical_map(domain: str, templates_dir: str = TEMPLATES_DIR) -> Dict[str, str]:
+    """
+    Ordered {pattern: label} from templates/<domain>_pages.json, or {} when
+    the domain has none (headings are then only cleaned and title-cased).
+    """
+    path = os.path.join(templates_dir, f"{domain}_pages.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def get_detector(domain: str = None) -> PageDetector:
+    """
+    Compiled detector for a template domain ("Webapp", "iot", ...);
+    None gives the notebook's CANONICAL_MAP.
+    """
+    if domain is None:
+        return PageDetector()
+    return PageDetector(load_canonical_map(domain))
+
+
+def normalize_heading_variant(ln: str) -> str:
+    return get_detector().normalize_heading_variant(ln)
+
+
+def detect_ui_pages_from_text(text: str) -> List[str]:
+    return get_detector().detect_ui_pages_from_text(text)
+
+
+# ----------------- FINAL REFINEMENT ----------------- #
+
+_REFINE_START_RE = re.compile(r"\babstract\b|\b1\.0\b", re.IGNORECASE)
+
+
+def refine_cleaned_text_and_pages(cleaned_text: str, domain: str = None) -> Dict[str, object]:
+    """
+    Final step:
+      - Skip preface lines until 'ABSTRACT' or '1.0'
+      - Drop irrelevant lines
+      - Detect UI pages on the trimmed text
+      - Wrap trimmed text in <<<PROJECT>>> block
+    """
+    lines = cleaned_text.splitlines()
+
+    start_idx = 0
+    for i, ln in enumerate(lines[:200]):
+        if _REFINE_START_RE.search(ln):
+            start_idx = i
+            break
+
+    trimmed_lines = [ln for ln in lines[start_idx:] if not is_irrelevant_line(ln)]
+    trimmed_text = "\n".join(trimmed_lines).strip()
+
+    return {
+        "block": "<<<PROJECT>>>\n" + trimmed_text + "\n<<<ENDPROJECT>>>",
+        "pages": get_detector(domain).detect_ui_pages_from_text(trimmed_text),
+        "trimmed_text": trimmed_text,
+    }
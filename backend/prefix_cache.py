@@ -0,0 +1,155 @@
+# prefix_cache.py
+"""
+Shared project-prefix KV cache.
+
+The epic, feature and story prompts all open with the same
+"Project description:\\n{project_text}" block. This module prefills that
+block once per document, keeps the resulting KV cache in a bounded LRU and
+hands out cropped copies ("forks") so each stage only prefills its own suffix.
+
+Forks are cropped to the longest common token prefix between the cached
+prefix and the full prompt, so the model sees exactly the token ids it would
+have seen without the cache.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+
+import torch
+
+import metrics
+
+
+def _cache_tensors(cache):
+    # transformers >= 4.56 keeps per-layer objects, older releases flat lists
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        return [t for layer in layers for t in (layer.keys, layer.values) if t is not None]
+    return list(cache.key_cache) + list(cache.value_cache)
+
+
+def cache_nbytes(cache) -> int:
+    return sum(t.numel() * t.element_size() for t in _cache_tensors(cache))
+
+
+def common_prefix_len(a, b) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class PrefixKVCache:
+    """
+    LRU of prefilled prefix caches, bounded by entry count and by bytes.
+
+    Usage:
+        cache = PrefixKVCache(max_entries=8, max_bytes=256 * 2**20)
+        kv, n_cached = cache.fork(model, tokenizer, prefix_text, prompt_ids)
+    """
+
+    def __init__(self, max_entries: int = 8, max_bytes: int = 256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (prefix_ids, kv_cache, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_reused = 0
+        self.tokens_prefilled = 0
+
+    # ---------- internals ----------
+
+    def _prefill(self, model, prefix_ids):
+        input_ids = torch.tensor([prefix_ids], device=model.device)
+        with torch.no_grad():
+            outputs = model(input_ids=input_ids, use_cache=True)
+        return outputs.past_key_values
+
+    def _insert(self, key, prefix_ids, kv):
+        nbytes = cache_nbytes(kv)
+        if nbytes > self.max_bytes:
+            return
+        self._entries[key] = (prefix_ids, kv, nbytes)
+        self._bytes += nbytes
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+            self._bytes -= evicted_bytes
+            self.evictions += 1
+
+    def lookup(self, model, prefix_ids):
+        """
+        Return the (shared, read-only) prefilled cache for `prefix_ids`,
+        computing and inserting it on a miss.
+        """
+        key = (getattr(model, "cache_key", None) or id(model), tuple(prefix_ids))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.record_cache("prefix", hit=True)
+                return entry[1]
+            self.misses += 1
+            metrics.record_cache("prefix", hit=False)
+            self.tokens_prefilled += len(prefix_ids)
+
+        # Prefill outside the lock so other documents are not blocked
+        kv = self._prefill(model, prefix_ids)
+        with self._lock:
+            if key not in self._entries:
+                self._insert(key, list(prefix_ids), kv)
+        return kv
+
+    # ---------- public API ----------
+
+    def fork(self, model, tokenizer, prefix_text: str, prompt_ids_rows):
+        """
+        Fork the cached prefix for one or more tokenized prompts.
+
+        prompt_ids_rows: list of token-id lists (one per prompt, unpadded)
+
+        Returns:
+          kv_cache: private copy cropped to `n_cached` tokens, or None
+          n_cached: number of leading tokens shared by every row and the cache
+        """
+        prefix_ids = tokenizer(prefix_text)["input_ids"]
+
+        # Leave at least one token per row for generate() to prefill
+        n_cached = len(prefix_ids)
+        for ids in prompt_ids_rows:
+            n_cached = min(n_cached, common_prefix_len(prefix_ids, ids), len(ids) - 1)
+        if n_cached <= 0:
+            return None, 0
+
+        kv = copy.deepcopy(self.lookup(model, prefix_ids))
+        drop = kv.get_seq_length() - n_cached
+        if drop:
+            kv.crop(-drop)
+        with self._lock:
+            self.tokens_reused += n_cached * len(prompt_ids_rows)
+        return kv, n_cached
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "tokens_reused": self.tokens_reused,
+                "tokens_prefilled": self.tokens_prefilled,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
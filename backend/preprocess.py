@@ -0,0 +1,329 @@
+# preprocess.py
+"""
+PDF -> cleaned project text (same rules as the training.ipynb preprocessing,
+so uploaded documents look like the clean_text/ corpus the model saw).
+
+preprocess_pdf_folder turns folders of PDFs into clean_text/*_clean.txt.
+Documents are extracted and cleaned in a process pool; a manifest of
+content hashes and mtimes lets re-runs skip unchanged PDFs, and every
+output is written atomically.
+
+    python backend/preprocess.py dataset data --out clean_text
+
+extract_project_text reads pages lazily and stops as soon as the rest of
+the document cannot change the cleaned text (references reached) or the
+requested amount of text is available, so large uploads do not pay for
+extracting every page.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pypdf import PdfReader
+
+import metrics
+
+try:
+    from pdfminer.high_level import extract_text as pdfminer_extract_text
+    PDFMINER_AVAILABLE = True
+except ImportError:
+    PDFMINER_AVAILABLE = False
+
+MANIFEST_NAME = ".manifest.json"
+
+# Body start and end markers used by clean_project_text
+START_MARKER = "1. INTRODUCTION"
+REFERENCES_PATTERN = re.compile(
+    r"(?im)^\s*(REFERENCES|REFERENCE|RELATED WORKS?|BIBLIOGRAPHY)\b.*$",
+    re.MULTILINE,
+)
+
+
+# ----------------- EXTRACTION ----------------- #
+
+def _pdfminer_page(path, page_index: int) -> str:
+    if hasattr(path, "seek"):
+        path.seek(0)
+    return pdfminer_extract_text(path, page_numbers=[page_index])
+
+
+def iter_pdf_pages(path):
+    """
+    Yield the text of each page in order, extracting a page only when it is
+    requested. PyPDF first; a page that fails or comes back empty is retried
+    with pdfminer (if installed) on its own, not the whole document.
+
+    `path` may be a filename or a seekable binary file object.
+    """
+    reader = PdfReader(path)
+    for i, page in enumerate(reader.pages):
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        if not text.strip() and PDFMINER_AVAILABLE:
+            try:
+                text = _pdfminer_page(path, i)
+            except Exception:
+                text = ""
+        yield text
+
+
+def extract_text_from_pdf(path) -> str:
+    """
+    `path` may be a filename or a binary file object.
+    """
+    with metrics.stage_timer("pdf_extraction"):
+        return "\n".join(iter_pdf_pages(path))
+
+
+def clean_project_text(raw_text: str) -> str:
+    with metrics.stage_timer("cleaning"):
+        # Normalize newlines
+        text = raw_text.replace("\r\n", "\n").replace("\r", "\n")
+
+        # Remove pure page numbers
+        lines = []
+        for line in text.splitlines():
+            if re.fullmatch(r"\s*\d+\s*", line):  # line is just a number
+                continue
+            lines.append(line.rstrip())
+        text = "\n".join(lines)
+
+        # 1️⃣ Try to start from the REAL "1. INTRODUCTION"
+        # We look for the exact string "1. INTRODUCTION" (case-sensitive) because
+        # TOC usually uses "1. Introduction" and body uses full caps.
+        idx = text.find(START_MARKER)
+        if idx != -1:
+            text = text[idx:]
+        else:
+            # Fallback: if not found, keep whole text (e.g., FarmAuto style docs)
+            text = text.lstrip()
+
+        # 2️⃣ Drop REFERENCES / RELATED WORK / BIBLIOGRAPHY and everything after
+        match = REFERENCES_PATTERN.search(text)
+        if match:
+            text = text[:match.start()]
+
+        # 3️⃣ Collapse multiple blank lines
+        text = re.sub(r"\n{3,}", "\n\n", text)
+
+        # 4️⃣ Strip leading/trailing whitespace
+        text = text.strip()
+
+        return text
+
+
+def _kept_chars(text: str) -> int:
+    # Lower bound on what clean_project_text keeps of these complete lines:
+    # it only drops page-number and blank lines, trailing spaces and newlines
+    return sum(
+        len(line.rstrip()) for line in text.split("\n")
+        if line.strip() and not re.fullmatch(r"\s*\d+\s*", line)
+    )
+
+
+def extract_project_text(path, max_chars=None) -> str:
+    """
+    Lazy extract + clean. Same result as
+    clean_project_text(extract_text_from_pdf(path)), but pages are read
+    one at a time and reading stops early once START_MARKER has been seen
+    and either
+      - a references heading follows it (nothing after it is kept), or
+      - the complete lines after it already keep more than `max_chars`
+        characters through cleaning (the result is then a prefix of the
+        full cleaned text, at least `max_chars` + 1 long, so
+        truncate(result, max_chars) is unchanged).
+    Documents without START_MARKER keep everything from the first page,
+    so they are always read to the end.
+
+    Each page is scanned once: the marker and the references heading are
+    searched in the new page plus the unfinished line before it (so a
+    marker or heading at a page join is still found), and the text is
+    cleaned once at the end.
+    """
+    pages = []
+    found = False   # START_MARKER seen
+    carry = ""      # text before the new page that is searched again with it
+    kept = 0        # characters cleaning keeps after START_MARKER (lower bound)
+
+    with metrics.stage_timer("pdf_extraction"):
+        for page_text in iter_pdf_pages(path):
+            page_text = page_text.replace("\r\n", "\n").replace("\r", "\n")
+            window = carry + ("\n" if pages else "") + page_text
+            pages.append(page_text)
+
+            pos = 0
+            if not found:
+                pos = window.find(START_MARKER)
+                if pos == -1:
+                    # The marker may straddle the page join
+                    carry = window[-(len(START_MARKER) - 1):]
+                    continue
+                found = True
+
+            # `window` starts at a line start or at START_MARKER, so ^ in the
+            # pattern anchors as it would in the joined text
+            if REFERENCES_PATTERN.search(window, pos):
+                break
+            line_end = window.rfind("\n") + 1
+            if line_end > pos:
+                kept += _kept_chars(window[pos:line_end - 1])
+            carry = window[max(line_end, pos):]
+            if max_chars is not None and kept > max_chars:
+                break
+
+    return clean_project_text("\n".join(pages))
+
+
+# ----------------- FOLDER INGESTION ----------------- #
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def atomic_write_text(path: str, text: str):
+    """
+    Write to a temp file in the same folder, then rename over `path`, so
+    readers never see a half-written file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def clean_output_path(pdf_path: str, output_dir: str) -> str:
+    base = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(output_dir, f"{base}_clean.txt")
+
+
+def _process_pdf(pdf_path: str, out_path: str) -> int:
+    """
+    Worker: extract + clean one PDF and write its text. Returns the number
+    of characters written.
+    """
+    cleaned = extract_project_text(pdf_path)
+    atomic_write_text(out_path, cleaned)
+    return len(cleaned)
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def preprocess_pdf_folder(input_dirs, output_dir: str = "clean_text", workers=None, force: bool = False):
+    """
+    input_dirs: one folder or a list of folders of *.pdf
+    output_dir: where <name>_clean.txt files (and the manifest) go
+    workers:    process-pool size (default: os.cpu_count())
+    force:      ignore the manifest and rebuild every document
+
+    A PDF is skipped when its size and mtime match the manifest, or when
+    they changed but its content hash did not, and its output still exists.
+
+    Returns:
+      {"found", "processed", "skipped", "failed", "seconds"}
+    """
+    start = time.perf_counter()
+    if isinstance(input_dirs, str):
+        input_dirs = [input_dirs]
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = {} if force else _load_manifest(manifest_path)
+
+    pdf_paths = sorted(p for d in input_dirs for p in glob(os.path.join(d, "*.pdf")))
+    print(f"Found {len(pdf_paths)} PDFs in {', '.join(input_dirs)}")
+
+    todo = []       # (pdf_path, out_path, manifest entry)
+    outputs = {}
+    skipped = 0
+    for pdf_path in pdf_paths:
+        out_path = clean_output_path(pdf_path, output_dir)
+        if out_path in outputs:
+            print(f"⚠️ Skipping {pdf_path}: same output name as {outputs[out_path]}")
+            continue
+        outputs[out_path] = pdf_path
+
+        st = os.stat(pdf_path)
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "output": out_path}
+        old = manifest.get(pdf_path)
+        if old and os.path.exists(out_path) and old.get("output") == out_path:
+            if old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+                skipped += 1
+                continue
+            entry["sha256"] = file_sha256(pdf_path)
+            if old.get("sha256") == entry["sha256"]:
+                manifest[pdf_path] = entry   # touched, not changed
+                skipped += 1
+                continue
+        todo.append((pdf_path, out_path, entry))
+
+    processed = failed = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_process_pdf, pdf, out): (pdf, out, entry) for pdf, out, entry in todo}
+            for fut in as_completed(futures):
+                pdf_path, out_path, entry = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    failed += 1
+                    manifest.pop(pdf_path, None)
+                    print(f"❌ Failed: {pdf_path} ({e})")
+                    continue
+                entry.setdefault("sha256", file_sha256(pdf_path))
+                manifest[pdf_path] = entry
+                processed += 1
+                print(f"✅ Saved cleaned: {out_path}")
+
+    # Forget PDFs that were removed from the input folders
+    for pdf_path in [p for p in manifest if p not in outputs.values()]:
+        manifest.pop(pdf_path)
+    atomic_write_text(manifest_path, json.dumps(manifest, indent=2, sort_keys=True))
+
+    summary = {
+        "found": len(pdf_paths),
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": time.perf_counter() - start,
+    }
+    print(
+        f"Processed {processed}, skipped {skipped} unchanged, {failed} failed "
+        f"in {summary['seconds']:.2f}s"
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract and clean PDFs into <name>_clean.txt files.")
+    parser.add_argument("input_dirs", nargs="*", default=["dataset", "data"])
+    parser.add_argument("--out", default="clean_text")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="rebuild every document")
+    args = parser.parse_args()
+
+    preprocess_pdf_folder(args.input_dirs, args.out, workers=args.workers, force=args.force)
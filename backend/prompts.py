@@ -0,0 +1,99 @@
+# prompts.py
+"""
+Title-only prompt templates shared by training and inference.
+
+The fine-tuned adapter was trained on exactly these strings, so inference
+must format the same templates (and the same truncation) to stay in-distribution.
+"""
+
+
+def truncate(text: str, max_chars: int = 800) -> str:
+    """
+    Safe truncation for project text.
+    """
+    if not isinstance(text, str):
+        return ""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return text
+    truncated = text[:max_chars]
+    last_space = truncated.rfind(" ")
+    if last_space != -1:
+        truncated = truncated[:last_space]
+    return truncated
+
+
+# ---- EPIC TITLE TRAIN PROMPT ----
+EPIC_TITLE_TRAIN_PROMPT = """
+Project description:
+{project_text}
+
+Task:
+- Write ONE short epic title that captures the main goal of the project.
+
+Rules:
+- Output ONLY the epic title on a single line.
+- No labels, no quotes, no bullets, no numbering.
+
+Epic title:
+"""
+
+# ---- FEATURE TITLES TRAIN PROMPT ----
+FEATURE_TITLES_TRAIN_PROMPT = """
+Project description:
+{project_text}
+
+Task:
+- Propose exactly {num_features} high-level feature titles that break the project
+  into major functional chunks.
+
+Rules:
+- Output EXACTLY {num_features} lines.
+- Each line must be ONE feature title.
+- No bullets, no numbering, no quotes.
+
+Feature titles (one per line):
+"""
+
+# ---- STORY TITLES TRAIN PROMPT ----
+STORY_TITLES_TRAIN_PROMPT = """
+Project description:
+{project_text}
+
+Epic title:
+{epic_title}
+
+Feature title:
+{feature_title}
+
+Task:
+- Propose exactly {num_stories} user story titles for this feature.
+
+Rules:
+- Output EXACTLY {num_stories} lines.
+- Each line is a user story title.
+- Prefer concise titles (they may start with "As a <role>, I want ..." but are OPTIONAL).
+- No bullets, no numbering, no quotes.
+
+User story titles (one per line):
+"""
+
+# Inference reuses the training templates verbatim
+EPIC_TITLE_PROMPT_TEXT     = EPIC_TITLE_TRAIN_PROMPT
+FEATURE_TITLES_PROMPT_TEXT = FEATURE_TITLES_TRAIN_PROMPT
+STORY_TITLES_PROMPT_TEXT   = STORY_TITLES_TRAIN_PROMPT
+
+# Every template above starts with this block; it is what PrefixKVCache shares
+PROJECT_PREFIX_TEXT = """
+Project description:
+{project_text}
+
+"""
+
+
+def project_prefix(proj: str) -> str:
+    """
+    Shared leading text of the epic/feature/story prompts for an already
+    truncated project description.
+    """
+    return PROJECT_PREFIX_TEXT.format(project_text=proj)
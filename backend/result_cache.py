@@ -0,0 +1,225 @@
+# result_cache.py
+"""
+Content-addressed cache of finished /analyze results.
+
+Two tiers: an in-memory LRU and JSON files under results/cache/ (one per
+key, written atomically), so the same document is generated once per
+model + templates + parameters, across requests and restarts.
+
+Concurrent requests for the same key are collapsed into one computation
+(single-flight): the first caller starts it as a task, every caller awaits
+that task, so one caller going away does not fail the others.
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import metrics
+from prompts import (
+    EPIC_TITLE_PROMPT_TEXT,
+    FEATURE_TITLES_PROMPT_TEXT,
+    STORY_TITLES_PROMPT_TEXT,
+)
+
+
+# ----------------- KEYS ----------------- #
+
+def _sha256(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def model_fingerprint(model_dir: str) -> str:
+    """
+    Cheap version id of a model / adapter folder: name, size and mtime of
+    every file in it (weights are not read).
+    """
+    entries = []
+    if os.path.isdir(model_dir):
+        for name in sorted(os.listdir(model_dir)):
+            path = os.path.join(model_dir, name)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                entries.append(f"{name}:{st.st_size}:{st.st_mtime_ns}")
+    return _sha256(os.path.basename(os.path.normpath(model_dir)), *entries)[:16]
+
+
+TEMPLATE_FINGERPRINT = _sha256(
+    EPIC_TITLE_PROMPT_TEXT,
+    FEATURE_TITLES_PROMPT_TEXT,
+    STORY_TITLES_PROMPT_TEXT,
+)[:16]
+
+
+def result_key(project_text: str, model_version: str, params: dict, templates: str = TEMPLATE_FINGERPRINT) -> str:
+    """
+    Key of one result: cleaned project text + model version + prompt
+    templates + generation parameters.
+    """
+    return _sha256(
+        project_text.strip(),
+        model_version,
+        templates,
+        json.dumps(params, sort_keys=True),
+    )
+
+
+# ----------------- CACHE ----------------- #
+
+class ResultCache:
+    """
+    Usage (inside the event loop):
+        cache = ResultCache("results/cache", max_entries=256)
+        result = await cache.get_or_compute(key, lambda: run_pipeline(payload))
+    """
+
+    def __init__(self, cache_dir: str = "results/cache", max_entries: int = 256):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}   # key -> asyncio.Future, event-loop thread only
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.inflight_joins = 0
+
+    # ---------- tiers ----------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _get_memory(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            return value
+
+    def _put_memory(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_disk(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _put_disk(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    # ---------- public API ----------
+
+    def get(self, key):
+        """
+        Memory, then disk (promoting to memory). Blocking; returns None on a miss.
+        """
+        value = self._get_memory(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            metrics.record_cache("result", hit=True)
+            return value
+
+        value = self._get_disk(key)
+        if value is not None:
+            self._put_memory(key, value)
+            with self._lock:
+                self.disk_hits += 1
+            metrics.record_cache("result", hit=True)
+            return value
+
+        with self._lock:
+            self.misses += 1
+        metrics.record_cache("result", hit=False)
+        return None
+
+    def put(self, key, value):
+        self._put_memory(key, value)
+        self._put_disk(key, value)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return the cached result for `key`, or await `compute()` (a coroutine
+        function) exactly once for all concurrent callers of the same key.
+        Exceptions are shared with the waiting callers and never cached.
+
+        The computation runs in its own task: a caller that is cancelled
+        (e.g. its client disconnected) only stops waiting; the other callers
+        still get the result, and it is still cached.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            with self._lock:
+                self.inflight_joins += 1
+            metrics.record_cache("result", hit=True)
+            return await asyncio.shield(task)
+
+        value = self._get_memory(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            metrics.record_cache("result", hit=True)
+            return value
+
+        task = asyncio.get_running_loop().create_task(self._fill(key, compute))
+        task.add_done_callback(_retrieve_exception)
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, key, compute):
+        try:
+            value = await asyncio.to_thread(self.get, key)
+            if value is None:
+                value = await compute()
+                await asyncio.to_thread(self.put, key, value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits + self.inflight_joins
+            lookups = hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "inflight_joins": self.inflight_joins,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "inflight": len(self._inflight),
+            }
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+def _retrieve_exception(task):
+    # Mark the exception retrieved when every caller stopped waiting
+    if not task.cancelled():
+        task.exception()
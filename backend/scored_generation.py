@@ -0,0 +1,312 @@
+# scored_generation.py
+"""
+Single-pass scored generation.
+
+`model.generate` already computes the logits of every token it emits, so the
+confidence of a completion can be read off those logits instead of
+re-tokenizing `prompt + completion` and running a second forward pass.
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+import torch
+from transformers import StoppingCriteriaList
+
+import metrics
+from speculative import prompt_lookup_generate
+from stopping import LineStoppingCriteria
+
+# Mean log-prob reported when the model emits nothing (same fallback as before)
+EMPTY_MEAN_LOG_PROB = -5.0
+
+_tally = threading.local()
+
+
+def _sigmoid(x: float) -> float:
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+def _step_logits(outputs):
+    """
+    Raw per-step logits from a `generate(..., return_dict_in_generate=True)` result,
+    or the processed `scores` when only those were requested (output_scores)
+    or on older transformers releases, which only expose `scores`.
+    """
+    logits = getattr(outputs, "logits", None)
+    if logits is None:
+        logits = outputs.scores
+    return logits
+
+
+def score_generated_sequences(tokenizer, outputs, prompt_len: int, lengths=None):
+    """
+    Turn a `generate` result into one scored record per row.
+
+    Only tokens up to (not including) the first EOS are scored, which matches
+    what `decode(..., skip_special_tokens=True)` keeps as the completion.
+    lengths: optional generated-token count per row (None = whole row) for
+    rows a stopping criterion ended early; the padding after them is not
+    part of the completion.
+
+    Returns a list of:
+      {
+        "completion": str,
+        "token_ids": list[int],
+        "token_log_probs": list[float],
+        "mean_log_prob": float,
+        "confidence": float,
+      }
+    """
+    sequences = outputs.sequences
+    gen_ids = sequences[:, prompt_len:]
+    step_logits = _step_logits(outputs)
+
+    # log p(token_t) for every row at every decoding step
+    step_log_probs = []
+    for t, logits in enumerate(step_logits):
+        log_probs = torch.log_softmax(logits.float(), dim=-1)
+        step_log_probs.append(log_probs.gather(1, gen_ids[:, t:t + 1]).squeeze(1))
+    if step_log_probs:
+        token_log_probs = torch.stack(step_log_probs, dim=1).cpu()
+    else:
+        token_log_probs = torch.empty(gen_ids.shape[0], 0)
+
+    eos_token_id = tokenizer.eos_token_id
+    records = []
+    for row in range(gen_ids.shape[0]):
+        ids = gen_ids[row].tolist()
+        n = len(ids)
+        if lengths is not None and lengths[row] is not None:
+            n = min(n, lengths[row])
+        if eos_token_id is not None and eos_token_id in ids[:n]:
+            n = ids.index(eos_token_id)
+        ids = ids[:n]
+        lps = token_log_probs[row, :n].tolist()
+
+        mean_log_prob = sum(lps) / len(lps) if lps else EMPTY_MEAN_LOG_PROB
+        records.append({
+            "completion": tokenizer.decode(ids, skip_special_tokens=True).strip(),
+            "token_ids": ids,
+            "token_log_probs": lps,
+            "mean_log_prob": float(mean_log_prob),
+            "confidence": float(_sigmoid(mean_log_prob)),
+        })
+    return records
+
+
+def _build_inputs(model, tokenizer, prompts, prefix_cache=None, prefix_text=None):
+    """
+    Tokenize `prompts` for a batched generate().
+
+    Without a prefix cache the prompts are left-padded. With one, the rows
+    share their first `n_cached` tokens (served from the forked KV cache) and
+    the padding goes between that shared prefix and each row's suffix; the
+    attention mask hides it and position ids come from the mask, so every
+    real token keeps the position it has in the unpadded prompt.
+
+    Returns (inputs, extra_generate_kwargs).
+    """
+    kv = None
+    if prefix_cache is not None and prefix_text:
+        rows = [tokenizer(p)["input_ids"] for p in prompts]
+        kv, n_cached = prefix_cache.fork(model, tokenizer, prefix_text, rows)
+
+    if kv is None:
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left"
+        try:
+            inputs = tokenizer(prompts, return_tensors="pt", padding=True)
+        finally:
+            tokenizer.padding_side = padding_side
+        return {k: v.to(model.device) for k, v in inputs.items()}, {}
+
+    shared = rows[0][:n_cached]
+    width = max(len(ids) for ids in rows) - n_cached
+    input_ids, attention_mask = [], []
+    for ids in rows:
+        suffix = ids[n_cached:]
+        pad = width - len(suffix)
+        input_ids.append(shared + [tokenizer.pad_token_id] * pad + suffix)
+        attention_mask.append([1] * n_cached + [0] * pad + [1] * len(suffix))
+
+    if len(rows) > 1:
+        kv.batch_repeat_interleave(len(rows))
+    inputs = {
+        "input_ids": torch.tensor(input_ids, device=model.device),
+        "attention_mask": torch.tensor(attention_mask, device=model.device),
+    }
+    return inputs, {"past_key_values": kv}
+
+
+def generate_scored_batch(
+    model,
+    tokenizer,
+    prompts,
+    max_new_tokens: int = 80,
+    do_sample: bool = False,
+    prefix_cache=None,
+    prefix_text: str | None = None,
+    stage: str | None = None,
+    prompt_lookup: int = 0,
+    stop_after_lines=None,
+    line_filter=None,
+    **generate_kwargs,
+):
+    """
+    Batched `generate_scored`: decode all `prompts` together.
+
+    Prompts are left-padded so every row's last prompt token sits at the same
+    position; rows that emit EOS are finished individually (padded from then
+    on) while the rest keep decoding. Returns one record per prompt, in order.
+
+    prefix_cache / prefix_text: a `PrefixKVCache` and the text every prompt
+    starts with; the shared prefix is then served from the cache instead of
+    being prefilled again.
+
+    stage: pipeline stage name ("epic", "features", "stories") used to
+    label the token-count and tokens/sec metrics.
+
+    prompt_lookup: draft up to this many tokens per step from n-gram matches
+    in the prompt (speculative.prompt_lookup_generate; 0 = off). Same greedy
+    output; used for single-prompt greedy calls without extra generate
+    kwargs, larger batches decode as usual.
+
+    stop_after_lines: end each row once this many complete lines passing
+    `line_filter` (default: non-empty) are decoded (stopping.py); an int
+    or one count per prompt. None decodes to EOS / max_new_tokens.
+    """
+    prompts = list(prompts)
+    if not prompts:
+        return []
+
+    start = time.perf_counter()
+    inputs, extra = _build_inputs(model, tokenizer, prompts, prefix_cache, prefix_text)
+    prompt_len = inputs["input_ids"].shape[1]
+    stop = None
+    if stop_after_lines:
+        stop = LineStoppingCriteria(tokenizer, prompt_len, stop_after_lines, keep=line_filter or str.strip)
+
+    if prompt_lookup and not do_sample and len(prompts) == 1 and not generate_kwargs:
+        outputs, drafts = prompt_lookup_generate(
+            model,
+            inputs["input_ids"],
+            eos_token_id=tokenizer.eos_token_id,
+            max_new_tokens=max_new_tokens,
+            past_key_values=extra.get("past_key_values"),
+            max_draft=prompt_lookup,
+            stopping_criteria=stop,
+        )
+        if stage is not None:
+            metrics.observe_drafts(stage, drafts["proposed"], drafts["accepted"])
+    else:
+        if stop is not None:
+            extra["stopping_criteria"] = StoppingCriteriaList([stop])
+        with torch.no_grad():
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=do_sample,
+                num_return_sequences=1,
+                eos_token_id=tokenizer.eos_token_id,
+                pad_token_id=tokenizer.pad_token_id,
+                return_dict_in_generate=True,
+                output_logits=True,
+                **extra,
+                **generate_kwargs,
+            )
+
+    lengths = stop.lengths(len(prompts)) if stop is not None else None
+    records = score_generated_sequences(tokenizer, outputs, prompt_len, lengths)
+    generated_tokens = sum(len(r["token_ids"]) for r in records)
+    counts = getattr(_tally, "counts", None)
+    if counts is not None:
+        counts["tokens"] += generated_tokens
+    if stage is not None:
+        metrics.observe_generation(
+            stage,
+            prompt_tokens=int(inputs["attention_mask"].sum()),
+            generated_tokens=generated_tokens,
+            seconds=time.perf_counter() - start,
+        )
+    return records
+
+
+@contextmanager
+def count_generated_tokens():
+    """
+    Add up the completion tokens of every generate_scored(_batch) call this
+    thread makes inside the block: the token_ids of the scored records, so
+    the padding after a row that stopped or hit EOS is not counted.
+
+        with count_generated_tokens() as tally:
+            run_agileai_titles_only_with_report(model, tokenizer, text)
+        tally["tokens"]
+    """
+    outer = getattr(_tally, "counts", None)
+    _tally.counts = {"tokens": 0}
+    try:
+        yield _tally.counts
+    finally:
+        _tally.counts = outer
+
+
+def generate_scored(
+    model,
+    tokenizer,
+    prompt: str,
+    max_new_tokens: int = 80,
+    do_sample: bool = False,
+    prefix_cache=None,
+    prefix_text: str | None = None,
+    stage: str | None = None,
+    prompt_lookup: int = 0,
+    stop_after_lines: int | None = None,
+    line_filter=None,
+    **generate_kwargs,
+) -> dict:
+    """
+    Generate a completion for `prompt` and score it in the same pass.
+
+    Extra keyword arguments are forwarded to `model.generate`.
+    Returns the record described in `score_generated_sequences`.
+    """
+    return generate_scored_batch(
+        model,
+        tokenizer,
+        [prompt],
+        max_new_tokens=max_new_tokens,
+        do_sample=do_sample,
+        prefix_cache=prefix_cache,
+        prefix_text=prefix_text,
+        stage=stage,
+        prompt_lookup=prompt_lookup,
+        stop_after_lines=stop_after_lines,
+        line_filter=line_filter,
+        **generate_kwargs,
+    )[0]
+
+
+def generate_text_and_confidence(
+    model,
+    tokenizer,
+    prompt: str,
+    max_new_tokens: int = 80,
+    do_sample: bool = False,
+):
+    """
+    Returns:
+      completion (str),
+      confidence (float in [0,1]),
+      mean_log_prob (float)
+    """
+    rec = generate_scored(
+        model,
+        tokenizer,
+        prompt,
+        max_new_tokens=max_new_tokens,
+        do_sample=do_sample,
+    )
+    return rec["completion"], rec["confidence"], rec["mean_log_prob"]
@@ -0,0 +1,527 @@
+# server.py
+"""
+agileai-backend: HTTP inference service for the frontend.
+
+    python backend/server.py            # serves on 0.0.0.0:8000
+
+POST /analyze runs the epic -> features -> stories titles pipeline on either
+`project_text` or an uploaded PDF (`pdf_base64`, extracted and cleaned here).
+Requests wait on a bounded queue and are grouped into micro-batches; when
+the queue is full the service answers 429 straight away instead of letting
+latency grow, and 503 while the model is loading or when a request took
+longer than AGILEAI_REQUEST_TIMEOUT_S (queue wait and compute). If loading the model failed, GET
+/health reports "status": "error" and /analyze answers 500.
+
+POST /analyze/stream takes the same body and answers with NDJSON events
+(epic, then each feature, then each feature's stories, then "done"; see
+titles.iter_agileai_titles) as soon as each stage finishes.
+
+Configuration (environment variables):
+  AGILEAI_MODEL_DIR          adapter or merged model folder (agileai_tinyllama_qlora_v4)
+  AGILEAI_MODEL_VARIANT      "fp32", "bf16" or "int8" (CPU) copy of the merged
+                             artifact (model_artifacts.py); "source" loads
+                             AGILEAI_MODEL_DIR as is                       (fp32)
+  AGILEAI_ARTIFACT_DIR       where merged artifacts are built          (models)
+  AGILEAI_ADAPTERS           "name=folder,name=folder": serve these LoRA adapters
+                             on one shared base model instead (adapters.py);
+                             requests pick one with "adapter", the first is
+                             the default, "base" is the bare base model  (unset)
+  AGILEAI_BASE_MODEL_DIR     base model of AGILEAI_ADAPTERS (the first adapter's
+                             base_model_name_or_path)
+  AGILEAI_MAX_QUEUE          queued requests before 429                     (64)
+  AGILEAI_MAX_BATCH          documents per micro-batch                      (4)
+  AGILEAI_BATCH_WINDOW_MS    how long the first request waits for company   (20)
+  AGILEAI_REQUEST_TIMEOUT_S  max time a request may take, queue included    (300)
+  AGILEAI_CONTEXT            "truncate": first 800 characters, as in training;
+                             "packed": token-budgeted prompt context (packing.py),
+                             which the adapter was not trained on    (truncate)
+  AGILEAI_PROMPT_LOOKUP      draft tokens per step of prompt-lookup decoding
+                             for single-prompt stages (speculative.py), 0 = off (0)
+  AGILEAI_PDF_MAX_CHARS      cleaned characters to read from an upload,
+                             0 = whole document            (800 with truncate, else 0)
+  AGILEAI_RESULT_CACHE_DIR   on-disk result cache                 (results/cache)
+  AGILEAI_RESULT_CACHE_SIZE  results kept in memory                         (256)
+  PORT                       listen port                                    (8000)
+
+Finished results are cached by content (result_cache.py): the same cleaned
+text with the same model, templates and parameters is answered from memory
+or results/cache/, and identical concurrent requests share one run.
+
+With AGILEAI_ADAPTERS, requests for different adapters share micro-batches,
+GET /adapters lists them and POST /adapters/{name}/reload loads the
+adapter's folder again in the background and swaps the new version in
+between batches.
+
+GET /metrics exposes the Prometheus metrics defined in metrics.py and
+POST /feedback counts the thumbs-up/down votes sent by the results page.
+"""
+
+import io
+import os
+import json
+import time
+import threading
+import base64
+import asyncio
+import traceback
+from collections import defaultdict
+from contextlib import asynccontextmanager, nullcontext
+
+import torch
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+import metrics
+from batching import MicroBatcher, QueueFullError
+from prefix_cache import PrefixKVCache
+from packing import PromptPacker
+from result_cache import ResultCache, model_fingerprint, result_key
+from preprocess import extract_project_text
+from model_artifacts import ensure_artifact, load_artifact
+from adapters import AdapterRegistry, BASE_ADAPTER
+from titles import run_agileai_titles_batch, iter_agileai_titles
+
+MODEL_DIR = os.environ.get("AGILEAI_MODEL_DIR", "agileai_tinyllama_qlora_v4")
+MODEL_VARIANT = os.environ.get("AGILEAI_MODEL_VARIANT", "fp32")
+ARTIFACT_DIR = os.environ.get("AGILEAI_ARTIFACT_DIR", "models")
+ADAPTERS = dict(
+    item.split("=", 1) for item in os.environ.get("AGILEAI_ADAPTERS", "").split(",") if "=" in item
+)
+BASE_MODEL_DIR = os.environ.get("AGILEAI_BASE_MODEL_DIR") or None
+MAX_QUEUE = int(os.environ.get("AGILEAI_MAX_QUEUE", "64"))
+MAX_BATCH = int(os.environ.get("AGILEAI_MAX_BATCH", "4"))
+BATCH_WINDOW_MS = float(os.environ.get("AGILEAI_BATCH_WINDOW_MS", "20"))
+REQUEST_TIMEOUT_S = float(os.environ.get("AGILEAI_REQUEST_TIMEOUT_S", "300"))
+CONTEXT_MODE = os.environ.get("AGILEAI_CONTEXT", "truncate")
+PROMPT_LOOKUP = int(os.environ.get("AGILEAI_PROMPT_LOOKUP", "0"))
+# With "truncate" the prompts only keep the first 800 characters, so
+# extraction of an upload can stop once that much cleaned text exists
+PDF_MAX_CHARS = int(os.environ.get(
+    "AGILEAI_PDF_MAX_CHARS", "800" if CONTEXT_MODE == "truncate" else "0"
+))
+RESULT_CACHE_DIR = os.environ.get("AGILEAI_RESULT_CACHE_DIR", os.path.join("results", "cache"))
+RESULT_CACHE_SIZE = int(os.environ.get("AGILEAI_RESULT_CACHE_SIZE", "256"))
+PORT = int(os.environ.get("PORT", "8000"))
+
+
+# ----------------- MODEL ----------------- #
+
+def load_model(model_dir: str = MODEL_DIR, variant: str = MODEL_VARIANT):
+    """
+    Load `model_dir` as a merged artifact variant (merging it first when no
+    artifact of this version exists yet), or with variant="source" the
+    folder itself: a LoRA adapter (AutoPeftModelForCausalLM, as in the
+    notebooks) or a plain / merged checkpoint. Returns (model, tokenizer).
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if variant != "source":
+        return load_artifact(ensure_artifact(model_dir, root=ARTIFACT_DIR), variant=variant, device=device)
+
+    if os.path.exists(os.path.join(model_dir, "adapter_config.json")):
+        from peft import AutoPeftModelForCausalLM
+        model = AutoPeftModelForCausalLM.from_pretrained(model_dir)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(model_dir)
+
+    model.to(device)
+    model.eval()
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return model, tokenizer
+
+
+def load_adapter_registry(adapters: dict = ADAPTERS, variant: str = MODEL_VARIANT):
+    """
+    One base model with every adapter of `adapters` attached. Returns
+    (registry, tokenizer); the tokenizer is the first adapter's.
+    """
+    if variant == "int8":
+        raise ValueError("AGILEAI_ADAPTERS needs an fp32 or bf16 base model")
+    registry = AdapterRegistry.from_adapters(
+        adapters,
+        base_model_dir=BASE_MODEL_DIR,
+        dtype=torch.bfloat16 if variant == "bf16" else torch.float32,
+        device="cuda" if torch.cuda.is_available() else "cpu",
+    )
+    tokenizer = AutoTokenizer.from_pretrained(next(iter(adapters.values())))
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return registry, tokenizer
+
+
+class AnalyzeService:
+    """
+    Owns the model and turns a micro-batch of /analyze payloads into results.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.tokenizer = None
+        self.registry = None
+        self.default_adapter = None
+        self.prefix_cache = PrefixKVCache(max_entries=8)
+        self._adapter_prefix_caches = {}   # adapter slot -> PrefixKVCache
+        self.packer = None
+        self.result_cache = ResultCache(RESULT_CACHE_DIR, max_entries=RESULT_CACHE_SIZE)
+        self.model_version = None
+        self.active_streams = 0
+        self.load_error = None
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def load(self, model_dir: str = MODEL_DIR):
+        if ADAPTERS:
+            self.registry, self.tokenizer = load_adapter_registry()
+            self.default_adapter = next(iter(ADAPTERS))
+            self.model = self.registry.model
+            if CONTEXT_MODE == "packed":
+                self.packer = PromptPacker(self.tokenizer)
+            return
+
+        self.model_version = model_fingerprint(model_dir)
+        if MODEL_VARIANT in ("bf16", "int8"):
+            # can decode differently from the float32 weights
+            self.model_version += f":{MODEL_VARIANT}"
+        self.model, self.tokenizer = load_model(model_dir)
+        if CONTEXT_MODE == "packed":
+            self.packer = PromptPacker(self.tokenizer)
+
+    def cache_key(self, payload) -> str:
+        """
+        Result-cache key of a payload. With adapters it takes the registry
+        lock (held by running batches), so call it off the event loop.
+        """
+        params = {
+            "pipeline": "titles",
+            "num_features": payload["num_features"],
+            "stories_per_feature": payload["stories_per_feature"],
+            "context": self.packer.fingerprint if self.packer else "truncate:800",
+            # confidences cover the tokens up to the last kept line
+            "stop": "lines",
+        }
+        model_version = self.model_version
+        if self.registry is not None:
+            name = payload["adapter"]
+            # not in the middle of a hot swap
+            with self.registry.lock:
+                model_version = f"adapter:{name}:{self.registry.version(name)}"
+        return result_key(payload["project_text"], model_version, params)
+
+    def _adapter_lock(self):
+        # held while a batch uses adapter slots, so a swap waits for it
+        return self.registry.lock if self.registry is not None else nullcontext()
+
+    def _model_for(self, adapter):
+        """
+        (model, prefix cache) for one document; KV caches are per adapter
+        version because the adapters change the attention projections.
+        """
+        if self.registry is None:
+            return self.model, self.prefix_cache
+        slot = self.registry.slot(adapter)
+        live = {self.registry.slot(n) for n in self.registry.names}
+        for stale in [s for s in self._adapter_prefix_caches if s not in live and s != slot]:
+            del self._adapter_prefix_caches[stale]
+        cache = self._adapter_prefix_caches.setdefault(slot, PrefixKVCache(max_entries=8))
+        return self.registry.view(adapter), cache
+
+    def process_batch(self, payloads):
+        """
+        Runs on the batcher thread. Requests with the same shape
+        (num_features, stories_per_feature) are decoded together, whatever
+        adapter they asked for.
+        """
+        results = [None] * len(payloads)
+        groups = defaultdict(list)
+        for i, p in enumerate(payloads):
+            groups[(p["num_features"], p["stories_per_feature"])].append(i)
+
+        for (num_features, stories_per_feature), idxs in groups.items():
+            with self._adapter_lock():
+                adapter_names = None
+                prefix_cache = self.prefix_cache
+                if self.registry is not None:
+                    adapter_names = self.registry.slots([payloads[i]["adapter"] for i in idxs])
+                    _, prefix_cache = self._model_for(payloads[idxs[0]]["adapter"])
+                outputs = run_agileai_titles_batch(
+                    self.model,
+                    self.tokenizer,
+                    [payloads[i]["project_text"] for i in idxs],
+                    num_features=num_features,
+                    stories_per_feature=stories_per_feature,
+                    prefix_cache=prefix_cache,
+                    packer=self.packer,
+                    prompt_lookup=PROMPT_LOOKUP,
+                    stop_early=True,
+                    adapter_names=adapter_names,
+                )
+            for i, (agile_output, metrics_report) in zip(idxs, outputs):
+                results[i] = {
+                    "agile_output": agile_output,
+                    "metrics_report": metrics_report,
+                }
+        return results
+
+    def stream(self, payload, emit, cancelled: threading.Event):
+        """
+        Runs on the batcher thread. Calls `emit(event)` for every pipeline
+        event and `emit(None)` at the end; stops early once `cancelled` is set
+        (client went away). A completed run is stored in the result cache.
+        """
+        try:
+            if cancelled.is_set():
+                return
+            with self._adapter_lock():
+                for event in self._stream_events(payload):
+                    if cancelled.is_set():
+                        break
+                    emit(event)
+        except Exception as e:
+            emit({"type": "error", "error": str(e)})
+        finally:
+            emit(None)
+
+    def _stream_events(self, payload):
+        model, prefix_cache = self._model_for(payload.get("adapter"))
+        for event in iter_agileai_titles(
+            model,
+            self.tokenizer,
+            payload["project_text"],
+            num_features=payload["num_features"],
+            stories_per_feature=payload["stories_per_feature"],
+            prefix_cache=prefix_cache,
+            packer=self.packer,
+            prompt_lookup=PROMPT_LOOKUP,
+            stop_early=True,
+        ):
+            if event["type"] == "done":
+                self.result_cache.put(self.cache_key(payload), {
+                    "agile_output": event["agile_output"],
+                    "metrics_report": event["metrics_report"],
+                })
+            yield event
+
+
+def _result_events(result):
+    """
+    The /analyze/stream events of an already finished result.
+    """
+    agile_output = result["agile_output"]
+    yield {"type": "epic", "epic": agile_output["epic"]}
+    for feat in agile_output["features"]:
+        yield {"type": "feature", "feature": {"id": feat["id"], "title": feat["title"]}}
+    for feat in agile_output["features"]:
+        yield {"type": "stories", "feature_id": feat["id"], "user_stories": feat["user_stories"]}
+    yield {"type": "done", **result}
+
+
+# ----------------- APP ----------------- #
+
+service = AnalyzeService()
+batcher = MicroBatcher(
+    service.process_batch,
+    max_queue=MAX_QUEUE,
+    max_batch_size=MAX_BATCH,
+    batch_window_s=BATCH_WINDOW_MS / 1000.0,
+)
+
+
+def _on_model_loaded(task: asyncio.Task):
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        service.load_error = f"{type(error).__name__}: {error}"
+        print(f"❌ Loading the model failed: {service.load_error}")
+        traceback.print_exception(error)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    batcher.start()
+    # Load in the background so /health answers while weights come in
+    loading = asyncio.create_task(asyncio.to_thread(service.load))
+    loading.add_done_callback(_on_model_loaded)
+    yield
+    loading.cancel()
+    await batcher.stop()
+
+
+app = FastAPI(title="agileai-backend", lifespan=lifespan)
+
+
+class AnalyzeRequest(BaseModel):
+    project_text: str | None = None
+    pdf_base64: str | None = None
+    num_features: int = Field(5, ge=1, le=10)
+    stories_per_feature: int = Field(3, ge=1, le=10)
+    adapter: str | None = None
+
+
+class FeedbackRequest(BaseModel):
+    item_type: str = Field(..., pattern="^(epic|feature|story)$")
+    item_id: str
+    direction: str = Field(..., pattern="^(up|down)$")
+
+
+def _error(status: int, message: str, retry_after: int | None = None):
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+    return JSONResponse(status_code=status, content={"error": message}, headers=headers)
+
+
+def _pdf_to_project_text(pdf_base64: str) -> str:
+    return extract_project_text(io.BytesIO(base64.b64decode(pdf_base64)), max_chars=PDF_MAX_CHARS or None)
+
+
+@app.get("/health")
+async def health():
+    if service.load_error is not None:
+        status = "error"
+    else:
+        status = "ready" if service.ready else "loading"
+    return {
+        "status": status,
+        "ready": service.ready,
+        "error": service.load_error,
+        "queue_depth": batcher.qsize(),
+        "max_queue": MAX_QUEUE,
+        "prefix_cache": service.prefix_cache.stats(),
+        "result_cache": service.result_cache.stats(),
+    }
+
+
+@app.get("/adapters")
+async def list_adapters():
+    if service.registry is None:
+        return _error(404, "this service has no adapters (AGILEAI_ADAPTERS is not set)")
+    return {"default": service.default_adapter, **service.registry.stats()}
+
+
+@app.post("/adapters/{name}/reload")
+async def reload_adapter(name: str):
+    if service.registry is None or name not in service.registry.names:
+        return _error(404, f"unknown adapter {name!r}")
+    service.registry.reload_async(name)
+    return JSONResponse(status_code=202, content={"reloading": name})
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
+
+
+@app.post("/feedback")
+async def feedback(req: FeedbackRequest):
+    metrics.record_feedback(req.item_type, req.direction)
+    return {"recorded": True}
+
+
+async def _prepare_payload(req: AnalyzeRequest):
+    """
+    Returns (payload, None) or (None, error_response).
+    """
+    if service.load_error is not None:
+        return None, _error(500, f"model failed to load: {service.load_error}")
+    if not service.ready:
+        return None, _error(503, "model is still loading", retry_after=10)
+
+    payload = req.model_dump(exclude={"pdf_base64"})
+    if service.registry is not None:
+        payload["adapter"] = req.adapter or service.default_adapter
+        if payload["adapter"] not in service.registry.names + [BASE_ADAPTER]:
+            return None, _error(400, f"unknown adapter {payload['adapter']!r}")
+    elif req.adapter:
+        return None, _error(400, "this service has no adapters (AGILEAI_ADAPTERS is not set)")
+    if req.pdf_base64:
+        try:
+            payload["project_text"] = await asyncio.to_thread(_pdf_to_project_text, req.pdf_base64)
+        except Exception as e:
+            return None, _error(400, f"could not read PDF: {e}")
+    if not (payload["project_text"] or "").strip():
+        return None, _error(400, "project_text or pdf_base64 is required")
+    return payload, None
+
+
+async def _run_pipeline(payload):
+    fut = batcher.submit(payload)
+    return await asyncio.wait_for(fut, timeout=REQUEST_TIMEOUT_S)
+
+
+async def _analyze(req: AnalyzeRequest):
+    payload, error = await _prepare_payload(req)
+    if error is not None:
+        return error
+
+    key = await asyncio.to_thread(service.cache_key, payload)
+    try:
+        return await service.result_cache.get_or_compute(key, lambda: _run_pipeline(payload))
+    except QueueFullError as e:
+        return _error(429, str(e), retry_after=1)
+    except asyncio.TimeoutError:
+        return _error(503, f"request timed out after {REQUEST_TIMEOUT_S:.0f}s")
+
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest):
+    start = time.perf_counter()
+    response = await _analyze(req)
+    status = response.status_code if isinstance(response, Response) else 200
+    metrics.record_request("/analyze", status, time.perf_counter() - start)
+    return response
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(req: AnalyzeRequest):
+    start = time.perf_counter()
+    payload, error = await _prepare_payload(req)
+    if error is None:
+        cached = await asyncio.to_thread(lambda: service.result_cache.get(service.cache_key(payload)))
+        if cached is not None:
+            metrics.record_request("/analyze/stream", 200, time.perf_counter() - start)
+            return StreamingResponse(
+                (json.dumps(event) + "\n" for event in _result_events(cached)),
+                media_type="application/x-ndjson",
+            )
+    if error is None and batcher.qsize() + service.active_streams >= MAX_QUEUE:
+        error = _error(429, f"request queue is full ({MAX_QUEUE})", retry_after=1)
+    if error is not None:
+        metrics.record_request("/analyze/stream", error.status_code, time.perf_counter() - start)
+        return error
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def emit(event):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def body():
+        # The job starts with the first read of the body, so a client that
+        # is gone before Starlette iterates it never holds a slot
+        service.active_streams += 1
+        batcher.run_exclusive(service.stream, payload, emit, cancelled)
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield json.dumps(event) + "\n"
+        finally:
+            cancelled.set()
+            service.active_streams -= 1
+            metrics.record_request("/analyze/stream", 200, time.perf_counter() - start)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=PORT)
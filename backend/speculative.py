@@ -0,0 +1,128 @@
+# speculative.py
+"""
+Prompt-lookup speculative decoding (greedy, one prompt at a time).
+
+Title completions copy long spans of their prompt: feature titles into
+story titles, page names, phrases of the project description. Instead of a
+draft model, the draft is whatever followed the most recent earlier
+occurrence of the last n tokens (in the prompt or the text generated so
+far). One forward pass over [next token] + draft then checks every draft
+position at once; the longest prefix that greedy decoding would have
+produced anyway is kept and the KV cache is cropped back to it.
+
+The emitted tokens are exactly the greedy ones, so the output, and the
+logits the confidence scores are computed from, are those of
+model.generate(do_sample=False) (up to float rounding of the batched
+verification matmuls).
+
+Usage:
+    outputs, stats = prompt_lookup_generate(model, input_ids, eos_token_id=2)
+    score_generated_sequences(tokenizer, outputs, input_ids.shape[1])
+"""
+
+import torch
+from transformers import DynamicCache
+from transformers.generation.utils import GenerateDecoderOnlyOutput
+
+
+def find_draft(tokens, max_ngram: int = 3, max_draft: int = 10, min_ngram: int = 1):
+    """
+    Tokens that followed the most recent earlier occurrence of the longest
+    (max_ngram .. min_ngram) suffix n-gram of `tokens`; [] if none.
+    """
+    n_tokens = len(tokens)
+    for n in range(min(max_ngram, n_tokens - 1), min_ngram - 1, -1):
+        suffix = tokens[n_tokens - n:]
+        first = suffix[0]
+        # latest start first; the match must end before the suffix itself
+        for start in range(n_tokens - n - 1, -1, -1):
+            if tokens[start] == first and tokens[start:start + n] == suffix:
+                return tokens[start + n:start + n + max_draft]
+    return []
+
+
+def prompt_lookup_generate(
+    model,
+    input_ids,
+    eos_token_id: int,
+    max_new_tokens: int = 80,
+    past_key_values=None,
+    max_ngram: int = 3,
+    max_draft: int = 10,
+    stopping_criteria=None,
+):
+    """
+    Greedy decoding of one prompt (`input_ids` of shape [1, n], no padding)
+    with prompt-lookup drafts.
+
+    past_key_values:   optional cache holding a prefix of `input_ids` (e.g. a
+                       PrefixKVCache fork); it is extended in place
+    stopping_criteria: optional stopping.LineStoppingCriteria, checked after
+                       every emitted token
+
+    Returns:
+      (outputs, stats): outputs has .sequences and .logits like
+      generate(return_dict_in_generate=True, output_logits=True);
+      stats = {"forward_passes", "proposed", "accepted"}
+    """
+    if input_ids.shape[0] != 1:
+        raise ValueError("prompt lookup decodes one prompt at a time")
+
+    def _stops(gen_ids):
+        return stopping_criteria is not None and stopping_criteria.row_done(0, gen_ids)
+
+    cache = past_key_values if past_key_values is not None else DynamicCache()
+    n_cached = cache.get_seq_length()
+    tokens = input_ids[0].tolist()
+    n_prompt = len(tokens)
+    stats = {"forward_passes": 1, "proposed": 0, "accepted": 0}
+    step_logits = []
+
+    with torch.no_grad():
+        out = model(input_ids=input_ids[:, n_cached:], past_key_values=cache, use_cache=True)
+        next_logits = out.logits[:, -1, :]
+
+        while True:
+            next_token = int(next_logits.argmax(-1))
+            step_logits.append(next_logits)
+            tokens.append(next_token)
+            n_new = len(tokens) - n_prompt
+            if next_token == eos_token_id or n_new >= max_new_tokens or _stops(tokens[n_prompt:]):
+                break
+
+            draft = find_draft(tokens, max_ngram, min(max_draft, max_new_tokens - n_new))
+            out = model(
+                input_ids=torch.tensor([[next_token] + draft], device=input_ids.device),
+                past_key_values=cache,
+                use_cache=True,
+            )
+            stats["forward_passes"] += 1
+            stats["proposed"] += len(draft)
+
+            # out.logits[0, j] is the prediction after ([next_token] + draft)[j]
+            predicted = out.logits[0].argmax(-1).tolist()
+            accepted = 0
+            while accepted < len(draft) and predicted[accepted] == draft[accepted]:
+                accepted += 1
+            done = False
+            for j in range(accepted):
+                step_logits.append(out.logits[:, j, :])
+                tokens.append(draft[j])
+                if (draft[j] == eos_token_id or len(tokens) - n_prompt >= max_new_tokens
+                        or _stops(tokens[n_prompt:])):
+                    accepted, done = j + 1, True
+                    break
+            stats["accepted"] += accepted
+            if done:
+                break
+
+            drop = cache.get_seq_length() - len(tokens)
+            if drop:
+                cache.crop(-drop)
+            next_logits = out.logits[:, accepted, :]
+
+    outputs = GenerateDecoderOnlyOutput(
+        sequences=torch.tensor([tokens], device=input_ids.device),
+        logits=tuple(step_logits),
+    )
+    return outputs, stats
@@ -0,0 +1,102 @@
+# stopping.py
+"""
+Stopping criteria for the line-based title generators.
+
+The title stages keep only the first few non-empty lines of a completion
+(the epic its first line, features / stories the first N lines that
+survive _clean_title_line), so every token decoded after the last of those
+lines is thrown away. LineStoppingCriteria ends each row of a generate()
+call as soon as that many complete lines have been decoded; a line is
+complete once the line break after it is generated, so the kept lines, and
+therefore the titles, are exactly those of a full-length decode.
+
+Rows are checked only on steps whose token contains a line break, so the
+criterion costs one tensor lookup per row per step.
+
+Usage:
+    stop = LineStoppingCriteria(tokenizer, prompt_len, num_lines=5, keep=_clean_title_line)
+    outputs = model.generate(..., stopping_criteria=StoppingCriteriaList([stop]))
+    stop.lengths(n_rows)   # generated tokens per row that count
+"""
+
+from functools import lru_cache
+
+import torch
+from transformers import StoppingCriteria
+
+
+def _has_line_break(text: str) -> bool:
+    return len(("x" + text + "x").splitlines()) > 1
+
+
+@lru_cache(maxsize=4)
+def line_break_tokens(tokenizer) -> torch.Tensor:
+    """
+    Bool tensor over the vocabulary: does the token's text contain a line
+    break (anything str.splitlines splits on).
+    """
+    mask = torch.zeros(len(tokenizer), dtype=torch.bool)
+    for token_id in range(len(tokenizer)):
+        if _has_line_break(tokenizer.decode([token_id])):
+            mask[token_id] = True
+    return mask
+
+
+def count_complete_lines(text: str, keep=str.strip) -> int:
+    """
+    Lines of `text` that are followed by a line break and pass `keep`.
+    """
+    lines = text.splitlines()
+    if lines and not _has_line_break(text[-1]):
+        lines = lines[:-1]      # still being decoded
+    return sum(1 for line in lines if keep(line))
+
+
+class LineStoppingCriteria(StoppingCriteria):
+    """
+    tokenizer:  decodes the generated tokens
+    prompt_len: width of the (padded) prompt in input_ids
+    num_lines:  lines to wait for, one int for every row or a list per row
+    keep:       which lines count (default: non-empty ones)
+    """
+
+    def __init__(self, tokenizer, prompt_len: int, num_lines, keep=str.strip):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.num_lines = num_lines
+        self.keep = keep
+        self.breaks = line_break_tokens(tokenizer)
+        self.stopped_at = {}       # row -> generated tokens when it stopped
+
+    def _needed(self, row: int) -> int:
+        return self.num_lines[row] if isinstance(self.num_lines, (list, tuple)) else self.num_lines
+
+    def row_done(self, row: int, gen_ids) -> bool:
+        """
+        Check one row after a new token; records where it stopped.
+        """
+        if row in self.stopped_at:
+            return True
+        if not gen_ids or not self.breaks[gen_ids[-1]]:
+            return False
+        text = self.tokenizer.decode(gen_ids, skip_special_tokens=True)
+        if count_complete_lines(text, self.keep) >= self._needed(row):
+            self.stopped_at[row] = len(gen_ids)
+            return True
+        return False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for row in range(input_ids.shape[0]):
+            last = int(input_ids[row, -1])
+            if row not in self.stopped_at and not self.breaks[last]:
+                done.append(False)
+                continue
+            done.append(self.row_done(row, input_ids[row, self.prompt_len:].tolist()))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def lengths(self, n_rows: int):
+        """
+        Generated tokens that count for every row (None: decoded to the end).
+        """
+        return [self.stopped_at.get(row) for row in range(n_rows)]
@@ -0,0 +1,803 @@
+# titles.py
+"""
+Title-only AgileAI pipeline: epic -> features -> story titles, plus the
+metrics report that goes with it.
+
+Every stage scores its completion from the logits produced while decoding
+(see scored_generation.py), so each call costs a single generate().
+"""
+
+import re
+import math
+from collections import Counter
+
+import torch
+
+import metrics
+from prompts import (
+    truncate,
+    project_prefix,
+    EPIC_TITLE_PROMPT_TEXT,
+    FEATURE_TITLES_PROMPT_TEXT,
+    STORY_TITLES_PROMPT_TEXT,
+)
+from scored_generation import generate_scored, generate_scored_batch
+from adapters import AdapterView
+
+
+# ----------------- TITLE CLEANING ----------------- #
+
+def _clean_title_line(line: str) -> str:
+    line = line.strip()
+    # remove bullets / numbering
+    line = re.sub(r'^[\-\*\d\.\)\s]+', '', line)
+    # remove "Feature X:" / "Story X:" prefixes
+    line = re.sub(r'^Feature\s*\d+\s*:\s*', '', line, flags=re.IGNORECASE)
+    line = re.sub(r'^Story\s*\d+\s*:\s*',   '', line, flags=re.IGNORECASE)
+    # strip quotes
+    line = line.strip('"“” ').strip()
+    return line
+
+
+def limit_words(text: str, max_words: int) -> str:
+    words = text.strip().split()
+    if len(words) <= max_words:
+        return text.strip()
+    return " ".join(words[:max_words])
+
+
+def _stop_kwargs(stop_early: bool, num_lines: int, line_filter=_clean_title_line) -> dict:
+    """
+    generate_scored(_batch) kwargs that end a completion once the lines its
+    parser keeps are complete (stopping.py); the titles stay the same.
+    """
+    if not stop_early:
+        return {}
+    return {"stop_after_lines": num_lines, "line_filter": line_filter}
+
+
+# ----------------- EPIC / FEATURES / STORIES ----------------- #
+
+def _project_context(project_text: str, packer=None, stage: str = "epic", query: str = "") -> str:
+    """
+    Project description as it goes into a prompt: the first 800 characters
+    (as in training) or, with a PromptPacker, a token-budgeted selection.
+    """
+    if packer is None:
+        return truncate(project_text, max_chars=800)
+    return packer.pack(project_text, stage, query=query)
+
+
+def _prefix_text(project_text: str, packer=None, stage: str = "epic") -> str:
+    # Story contexts are per feature; they share the lead of the feature context
+    if stage == "stories":
+        stage = "features"
+    return project_prefix(_project_context(project_text, packer, stage))
+
+
+def _epic_title_prompt(project_text: str, packer=None) -> str:
+    proj = _project_context(project_text, packer, "epic")
+    return EPIC_TITLE_PROMPT_TEXT.format(project_text=proj)
+
+
+def _parse_epic_title(rec: dict) -> dict:
+    raw, conf, mean_lp = rec["completion"], rec["confidence"], rec["mean_log_prob"]
+
+    lines = [l for l in raw.splitlines() if l.strip()]
+    if not lines:
+        epic_title = "Project Epic"
+    else:
+        epic_title = _clean_title_line(lines[0])
+
+    epic_title = limit_words(epic_title, max_words=10) or "Project Epic"
+
+    return {
+        "id": "E1",
+        "title": epic_title,
+        "confidence": conf,
+        "mean_log_prob": mean_lp,
+    }
+
+
+def generate_epic_title(
+    model,
+    tokenizer,
+    project_text: str,
+    prefix_cache=None,
+    packer=None,
+    prompt_lookup: int = 0,
+    stop_early: bool = False,
+) -> dict:
+    """
+    prefix_cache:  optional PrefixKVCache shared by all stages of a document
+    packer:        optional PromptPacker (default: first 800 characters)
+    prompt_lookup: draft tokens per step of prompt-lookup decoding
+                   (speculative.py; 0 = plain greedy, same output)
+    stop_early:    stop decoding once the kept line is complete (stopping.py);
+                   same title, but the confidence then covers only the
+                   tokens up to it, so it is off by default
+
+    Returns:
+      {
+        "id": "E1",
+        "title": "...",
+        "confidence": float,
+        "mean_log_prob": float
+      }
+    """
+    with metrics.stage_timer("epic"):
+        rec = generate_scored(
+            model,
+            tokenizer,
+            _epic_title_prompt(project_text, packer),
+            max_new_tokens=40,
+            do_sample=False,
+            prefix_cache=prefix_cache,
+            prefix_text=_prefix_text(project_text, packer, "epic"),
+            stage="epic",
+            prompt_lookup=prompt_lookup,
+            **_stop_kwargs(stop_early, 1, line_filter=str.strip),
+        )
+    return _parse_epic_title(rec)
+
+
+def _feature_titles_prompt(project_text: str, num_features: int, packer=None) -> str:
+    proj = _project_context(project_text, packer, "features")
+    return FEATURE_TITLES_PROMPT_TEXT.format(
+        project_text=proj,
+        num_features=num_features,
+    )
+
+
+def _parse_feature_titles(rec: dict, num_features: int):
+    raw, conf, mean_lp = rec["completion"], rec["confidence"], rec["mean_log_prob"]
+
+    lines = [l for l in raw.splitlines() if l.strip()]
+    titles = []
+
+    for l in lines:
+        t = _clean_title_line(l)
+        if t:
+            t = limit_words(t, max_words=10)
+            titles.append(t)
+
+    # enforce exactly num_features
+    if len(titles) < num_features:
+        for i in range(len(titles) + 1, num_features + 1):
+            titles.append(f"Feature {i}")
+    else:
+        titles = titles[:num_features]
+
+    feature_dicts = []
+    for i, t in enumerate(titles, start=1):
+        feature_dicts.append({
+            "id": f"F{i}",
+            "title": t,
+            "confidence": conf,
+            "mean_log_prob": mean_lp,
+            "user_stories": [],
+        })
+
+    return feature_dicts, conf, mean_lp
+
+
+def generate_feature_titles(
+    model,
+    tokenizer,
+    project_text: str,
+    epic_obj: dict,
+    num_features: int = 5,
+    prefix_cache=None,
+    packer=None,
+    prompt_lookup: int = 0,
+    stop_early: bool = False,
+):
+    """
+    Returns:
+      feature_dicts: list of {
+         "id","title","confidence","mean_log_prob","user_stories":[]
+      }
+      feat_conf: float
+      feat_mean_lp: float
+    """
+    with metrics.stage_timer("features"):
+        rec = generate_scored(
+            model,
+            tokenizer,
+            _feature_titles_prompt(project_text, num_features, packer),
+            max_new_tokens=120,
+            do_sample=False,
+            prefix_cache=prefix_cache,
+            prefix_text=_prefix_text(project_text, packer, "features"),
+            stage="features",
+            prompt_lookup=prompt_lookup,
+            **_stop_kwargs(stop_early, num_features),
+        )
+    return _parse_feature_titles(rec, num_features)
+
+
+def _story_titles_prompt(project_text: str, epic_obj: dict, feature_obj: dict, num_stories: int, packer=None) -> str:
+    epic_title = epic_obj.get("title", "Project Epic")
+    feature_title = feature_obj.get("title", "Feature")
+    proj = _project_context(project_text, packer, "stories", query=feature_title)
+
+    return STORY_TITLES_PROMPT_TEXT.format(
+        project_text=proj,
+        epic_title=epic_title,
+        feature_title=feature_title,
+        num_stories=num_stories,
+    )
+
+
+def _parse_story_titles(rec: dict, feature_obj: dict, num_stories: int):
+    """
+    Turn one scored story completion into (stories, s_conf, s_mean_lp).
+    """
+    raw, conf, mean_lp = rec["completion"], rec["confidence"], rec["mean_log_prob"]
+    feature_title = feature_obj.get("title", "Feature")
+
+    lines = [l for l in raw.splitlines() if l.strip()]
+    titles = []
+
+    for l in lines:
+        t = _clean_title_line(l)
+        if not t:
+            continue
+        t = limit_words(t, max_words=15)
+        titles.append(t)
+
+    if len(titles) < num_stories:
+        for i in range(len(titles) + 1, num_stories + 1):
+            titles.append(f"Story {i}: basic capability for {feature_title.lower()}")
+    else:
+        titles = titles[:num_stories]
+
+    stories = []
+    # e.g. F3 -> "3" for user story ID
+    feature_index = feature_obj["id"][1:] if len(feature_obj["id"]) > 1 else "1"
+
+    for j, st in enumerate(titles, start=1):
+        stories.append({
+            "id": f"US{feature_index}_{j}",
+            "title": st,
+            "confidence": conf,
+            "mean_log_prob": mean_lp,
+        })
+
+    return stories, conf, mean_lp
+
+
+def generate_story_titles_for_feature(
+    model,
+    tokenizer,
+    project_text: str,
+    epic_obj: dict,
+    feature_obj: dict,
+    num_stories: int = 3,
+    prefix_cache=None,
+    packer=None,
+    prompt_lookup: int = 0,
+    stop_early: bool = False,
+):
+    """
+    Returns:
+      stories: list of {
+        "id","title","confidence","mean_log_prob"
+      }
+      s_conf: float
+      s_mean_lp: float
+    """
+    prompt = _story_titles_prompt(project_text, epic_obj, feature_obj, num_stories, packer)
+
+    with metrics.stage_timer("stories"):
+        rec = generate_scored(
+            model,
+            tokenizer,
+            prompt,
+            max_new_tokens=120,
+            do_sample=False,
+            prefix_cache=prefix_cache,
+            prefix_text=_prefix_text(project_text, packer, "stories"),
+            stage="stories",
+            prompt_lookup=prompt_lookup,
+            **_stop_kwargs(stop_early, num_stories),
+        )
+    return _parse_story_titles(rec, feature_obj, num_stories)
+
+
+def generate_story_titles_batched(
+    model,
+    tokenizer,
+    project_text: str,
+    epic_obj: dict,
+    feature_dicts: list,
+    num_stories: int = 3,
+    prefix_cache=None,
+    packer=None,
+    prompt_lookup: int = 0,
+    stop_early: bool = False,
+):
+    """
+    Story stage for every feature of a document in one batched generate().
+
+    Same prompts and post-processing as `generate_story_titles_for_feature`,
+    so greedy decoding gives the same titles and confidences as calling it
+    once per feature.
+
+    Returns:
+      list of (stories, s_conf, s_mean_lp), one per feature, in order
+    """
+    prompts = [
+        _story_titles_prompt(project_text, epic_obj, feat, num_stories, packer)
+        for feat in feature_dicts
+    ]
+
+    with metrics.stage_timer("stories"):
+        recs = generate_scored_batch(
+            model,
+            tokenizer,
+            prompts,
+            max_new_tokens=120,
+            do_sample=False,
+            prefix_cache=prefix_cache,
+            prefix_text=_prefix_text(project_text, packer, "stories"),
+            stage="stories",
+            prompt_lookup=prompt_lookup,
+            **_stop_kwargs(stop_early, num_stories),
+        )
+    return [
+        _parse_story_titles(rec, feat, num_stories)
+        for rec, feat in zip(recs, feature_dicts)
+    ]
+
+
+# ----------------- METRICS HELPERS ----------------- #
+
+def compute_pseudo_perplexity_over_titles(model, tokenizer, titles_text: str):
+    """
+    Pseudo-perplexity over concatenated titles.
+    """
+    titles_text = (titles_text or "").strip()
+    if not titles_text:
+        return {
+            "mean_log_prob_titles": float("nan"),
+            "pseudo_perplexity_titles": float("nan"),
+        }
+
+    inputs = tokenizer(titles_text, return_tensors="pt").to(model.device)
+    with torch.no_grad():
+        outputs = model(**inputs, labels=inputs["input_ids"])
+        neg_log_likelihood = outputs.loss.item()
+
+    ppl = math.exp(neg_log_likelihood)
+    return {
+        "mean_log_prob_titles": -neg_log_likelihood,
+        "pseudo_perplexity_titles": ppl,
+    }
+
+
+def compute_structure_ratios(features, expected_features=5, expected_stories=3):
+    num_features = len(features)
+    feature_ratio = num_features / expected_features if expected_features > 0 else 0.0
+
+    story_ratios = []
+    for f in features:
+        stories = f.get("user_stories", [])
+        story_ratios.append(
+            len(stories) / expected_stories if expected_stories > 0 else 0.0
+        )
+
+    story_count_ratio = (
+        sum(story_ratios) / len(story_ratios) if story_ratios else 0.0
+    )
+
+    return {
+        "feature_count_ratio": feature_ratio,
+        "story_count_ratio": story_count_ratio,
+    }
+
+
+def compute_repetition_rates_for_titles(titles_text: str):
+    tokens = titles_text.split()
+    if len(tokens) < 2:
+        return {
+            "bigram_repetition_rate": 0.0,
+            "trigram_repetition_rate": 0.0,
+        }
+
+    bigrams = [" ".join(tokens[i:i+2]) for i in range(len(tokens) - 1)]
+    trigrams = [" ".join(tokens[i:i+3]) for i in range(len(tokens) - 2)] if len(tokens) >= 3 else []
+
+    bigram_counts = Counter(bigrams)
+    trigram_counts = Counter(trigrams)
+
+    repeated_bigrams = sum(1 for _, v in bigram_counts.items() if v > 1)
+    repeated_trigrams = sum(1 for _, v in trigram_counts.items() if v > 1)
+
+    bigram_rep_rate = repeated_bigrams / max(1, len(bigram_counts))
+    trigram_rep_rate = (
+        repeated_trigrams / max(1, len(trigram_counts)) if trigram_counts else 0.0
+    )
+
+    return {
+        "bigram_repetition_rate": bigram_rep_rate,
+        "trigram_repetition_rate": trigram_rep_rate,
+    }
+
+
+# ----------------- MAIN RUNNER ----------------- #
+
+def _build_output_and_report(
+    model,
+    tokenizer,
+    epic: dict,
+    feature_dicts: list,
+    feat_conf: float,
+    feat_mean_lp: float,
+    story_results: list,
+    num_features: int,
+    stories_per_feature: int,
+):
+    """
+    Attach the story results to their features and build
+    (agile_output, metrics_report) for one document.
+    """
+    story_block_confs = []
+    story_block_lps = []
+
+    for feat, (stories, s_conf, s_lp) in zip(feature_dicts, story_results):
+        feat["user_stories"] = stories
+        story_block_confs.append(s_conf)
+        story_block_lps.append(s_lp)
+
+    # ---------- Clean Agile output (titles only) ----------
+    clean_epic = {
+        "id": epic["id"],
+        "title": epic["title"],
+    }
+
+    clean_features = []
+    for f in feature_dicts:
+        clean_stories = [
+            {"id": us["id"], "title": us["title"]}
+            for us in f.get("user_stories", [])
+        ]
+        clean_features.append({
+            "id": f["id"],
+            "title": f["title"],
+            "user_stories": clean_stories,
+        })
+
+    agile_output = {
+        "epic": clean_epic,
+        "features": clean_features,
+    }
+
+    # ---------- Metrics report ----------
+    def _safe_avg(vals):
+        return float(sum(vals) / len(vals)) if vals else 0.0
+
+    confidence_metrics = {
+        "epic_confidence": epic.get("confidence", 0.0),
+        "epic_mean_log_prob": epic.get("mean_log_prob", 0.0),
+        "features_block_confidence": feat_conf,
+        "features_block_mean_log_prob": feat_mean_lp,
+        "stories_avg_block_confidence": _safe_avg(story_block_confs),
+        "stories_avg_block_mean_log_prob": _safe_avg(story_block_lps),
+    }
+
+    # Flat titles text
+    all_titles = [clean_epic["title"]]
+    for f in clean_features:
+        all_titles.append(f["title"])
+        for us in f["user_stories"]:
+            all_titles.append(us["title"])
+    titles_text = " ".join(all_titles)
+
+    ppl_metrics = compute_pseudo_perplexity_over_titles(
+        model, tokenizer, titles_text
+    )
+    struct_metrics = compute_structure_ratios(
+        clean_features,
+        expected_features=num_features,
+        expected_stories=stories_per_feature,
+    )
+    rep_metrics = compute_repetition_rates_for_titles(titles_text)
+
+    metrics_report = {
+        **confidence_metrics,
+        **ppl_metrics,
+        **struct_metrics,
+        **rep_metrics,
+    }
+
+    return agile_output, metrics_report
+
+
+def run_agileai_titles_only_with_report(
+    model,
+    tokenizer,
+    project_text: str,
+    num_features: int = 5,
+    stories_per_feature: int = 3,
+    batch_stories: bool = True,
+    prefix_cache=None,
+    packer=None,
+    prompt_lookup: int = 0,
+    stop_early: bool = False,
+):
+    """
+    batch_stories: decode the story titles of all features in one batch
+                   instead of one generate() per feature.
+    prefix_cache:  optional PrefixKVCache; the project-description prefix is
+                   then prefilled once and reused by every stage.
+    packer:        optional PromptPacker; each stage then gets a token-budgeted
+                   context instead of the first 800 characters.
+    prompt_lookup: draft tokens per step of prompt-lookup decoding for the
+                   single-prompt stages (epic, features, unbatched stories);
+                   0 = off. Same titles either way.
+    stop_early:    end every stage once the lines it keeps are complete
+                   instead of decoding to EOS / max_new_tokens; same titles,
+                   but the confidences cover only the tokens up to those
+                   lines and do not compare with full-length ones, so it is
+                   off by default (the server and batch_analyze.py turn it
+                   on and key their cached results with "stop": "lines").
+    """
+    # 1. Epic
+    epic = generate_epic_title(
+        model, tokenizer, project_text,
+        prefix_cache=prefix_cache, packer=packer, prompt_lookup=prompt_lookup,
+        stop_early=stop_early,
+    )
+
+    # 2. Features
+    feature_dicts, feat_conf, feat_mean_lp = generate_feature_titles(
+        model,
+        tokenizer,
+        project_text,
+        epic,
+        num_features=num_features,
+        prefix_cache=prefix_cache,
+        packer=packer,
+        prompt_lookup=prompt_lookup,
+        stop_early=stop_early,
+    )
+
+    # 3. Stories
+    if batch_stories:
+        story_results = generate_story_titles_batched(
+            model,
+            tokenizer,
+            project_text,
+            epic,
+            feature_dicts,
+            num_stories=stories_per_feature,
+            prefix_cache=prefix_cache,
+            packer=packer,
+            prompt_lookup=prompt_lookup,
+            stop_early=stop_early,
+        )
+    else:
+        story_results = [
+            generate_story_titles_for_feature(
+                model,
+                tokenizer,
+                project_text,
+                epic,
+                feat,
+                num_stories=stories_per_feature,
+                prefix_cache=prefix_cache,
+                packer=packer,
+                prompt_lookup=prompt_lookup,
+                stop_early=stop_early,
+            )
+            for feat in feature_dicts
+        ]
+
+    return _build_output_and_report(
+        model,
+        tokenizer,
+        epic,
+        feature_dicts,
+        feat_conf,
+        feat_mean_lp,
+        story_results,
+        num_features,
+        stories_per_feature,
+    )
+
+
+def iter_agileai_titles(
+    model,
+    tokenizer,
+    project_text: str,
+    num_features: int = 5,
+    stories_per_feature: int = 3,
+    prefix_cache=None,
+    packer=None,
+    prompt_lookup: int = 0,
+    stop_early: bool = False,
+):
+    """
+    Streaming variant of `run_agileai_titles_only_with_report`: yields each
+    piece of the backlog as soon as its stage has finished, so a client can
+    show the epic after the first generate() instead of after the last one.
+
+    Stories are decoded one feature at a time (same prompts and greedy
+    decoding as the batched path, so the titles are identical).
+
+    Yields, in order:
+      {"type": "epic",    "epic": {"id", "title"}}
+      {"type": "feature", "feature": {"id", "title"}}                 x num_features
+      {"type": "stories", "feature_id": "F1", "user_stories": [...]}  x num_features
+      {"type": "done",    "agile_output": {...}, "metrics_report": {...}}
+    """
+    epic = generate_epic_title(
+        model, tokenizer, project_text,
+        prefix_cache=prefix_cache, packer=packer, prompt_lookup=prompt_lookup,
+        stop_early=stop_early,
+    )
+    yield {"type": "epic", "epic": {"id": epic["id"], "title": epic["title"]}}
+
+    feature_dicts, feat_conf, feat_mean_lp = generate_feature_titles(
+        model,
+        tokenizer,
+        project_text,
+        epic,
+        num_features=num_features,
+        prefix_cache=prefix_cache,
+        packer=packer,
+        prompt_lookup=prompt_lookup,
+        stop_early=stop_early,
+    )
+    for feat in feature_dicts:
+        yield {"type": "feature", "feature": {"id": feat["id"], "title": feat["title"]}}
+
+    story_results = []
+    for feat in feature_dicts:
+        stories, s_conf, s_lp = generate_story_titles_for_feature(
+            model,
+            tokenizer,
+            project_text,
+            epic,
+            feat,
+            num_stories=stories_per_feature,
+            prefix_cache=prefix_cache,
+            packer=packer,
+            prompt_lookup=prompt_lookup,
+            stop_early=stop_early,
+        )
+        story_results.append((stories, s_conf, s_lp))
+        yield {
+            "type": "stories",
+            "feature_id": feat["id"],
+            "user_stories": [{"id": us["id"], "title": us["title"]} for us in stories],
+        }
+
+    agile_output, metrics_report = _build_output_and_report(
+        model,
+        tokenizer,
+        epic,
+        feature_dicts,
+        feat_conf,
+        feat_mean_lp,
+        story_results,
+        num_features,
+        stories_per_feature,
+    )
+    yield {"type": "done", "agile_output": agile_output, "metrics_report": metrics_report}
+
+
+def run_agileai_titles_batch(
+    model,
+    tokenizer,
+    project_texts: list,
+    num_features: int = 5,
+    stories_per_feature: int = 3,
+    prefix_cache=None,
+    packer=None,
+    prompt_lookup: int = 0,
+    stop_early: bool = False,
+    adapter_names=None,
+):
+    """
+    Run the titles pipeline for several documents at once: one batched
+    generate() for all epics, one for all feature lists and one for the
+    story titles of every feature of every document.
+
+    A single document goes through `run_agileai_titles_only_with_report`
+    so it can use `prefix_cache` (rows of a multi-document batch do not
+    share a prefix).
+
+    adapter_names: with a multi-adapter PeftModel (adapters.py), the adapter
+                   slot of every document; each row of every stage then
+                   runs with its own document's adapter
+
+    Returns:
+      list of (agile_output, metrics_report), one per document, in order
+    """
+    def doc_model(i):
+        return model if adapter_names is None else AdapterView(model, adapter_names[i])
+
+    def row_kwargs(doc_idxs):
+        return {} if adapter_names is None else {"adapter_names": [adapter_names[i] for i in doc_idxs]}
+
+    if len(project_texts) == 1:
+        return [run_agileai_titles_only_with_report(
+            doc_model(0),
+            tokenizer,
+            project_texts[0],
+            num_features=num_features,
+            stories_per_feature=stories_per_feature,
+            prefix_cache=prefix_cache,
+            packer=packer,
+            prompt_lookup=prompt_lookup,
+            stop_early=stop_early,
+        )]
+
+    # 1. Epics
+    with metrics.stage_timer("epic"):
+        epic_recs = generate_scored_batch(
+            model,
+            tokenizer,
+            [_epic_title_prompt(text, packer) for text in project_texts],
+            max_new_tokens=40,
+            do_sample=False,
+            stage="epic",
+            **_stop_kwargs(stop_early, 1, line_filter=str.strip),
+            **row_kwargs(range(len(project_texts))),
+        )
+    epics = [_parse_epic_title(rec) for rec in epic_recs]
+
+    # 2. Features
+    with metrics.stage_timer("features"):
+        feature_recs = generate_scored_batch(
+            model,
+            tokenizer,
+            [_feature_titles_prompt(text, num_features, packer) for text in project_texts],
+            max_new_tokens=120,
+            do_sample=False,
+            stage="features",
+            **_stop_kwargs(stop_early, num_features),
+            **row_kwargs(range(len(project_texts))),
+        )
+    feature_blocks = [_parse_feature_titles(rec, num_features) for rec in feature_recs]
+
+    # 3. Stories, for every (document, feature) pair
+    pairs = [
+        (doc_idx, feat)
+        for doc_idx, (feature_dicts, _, _) in enumerate(feature_blocks)
+        for feat in feature_dicts
+    ]
+    with metrics.stage_timer("stories"):
+        story_recs = generate_scored_batch(
+            model,
+            tokenizer,
+            [
+                _story_titles_prompt(project_texts[doc_idx], epics[doc_idx], feat, stories_per_feature, packer)
+                for doc_idx, feat in pairs
+            ],
+            max_new_tokens=120,
+            do_sample=False,
+            stage="stories",
+            **_stop_kwargs(stop_early, stories_per_feature),
+            **row_kwargs(doc_idx for doc_idx, _ in pairs),
+        )
+    story_results = [[] for _ in project_texts]
+    for (doc_idx, feat), rec in zip(pairs, story_recs):
+        story_results[doc_idx].append(_parse_story_titles(rec, feat, stories_per_feature))
+
+    return [
+        _build_output_and_report(
+            doc_model(i),
+            tokenizer,
+            epics[i],
+            feature_dicts,
+            feat_conf,
+            feat_mean_lp,
+            story_results[i],
+            num_features,
+            stories_per_feature,
+        )
+        for i, (feature_dicts, feat_conf, feat_mean_lp) in enumerate(feature_blocks)
+    ]
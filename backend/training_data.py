@@ -0,0 +1,264 @@
+# training_data.py
+"""
+Training data path for the title-only QLoRA fine-tune (training.ipynb).
+
+The notebook used to pad every example to MAX_LEN = 1024 and train on
+labels = input_ids, i.e. on the prompt and on the padding. Here:
+  - labels cover the completion only (prompt tokens are IGNORE_INDEX) plus
+    one EOS, which is what taught the model to stop when the pad (= EOS)
+    tokens were still in the loss,
+  - DynamicPaddingCollator pads a batch to its longest example only,
+  - pack_examples + PackedCollator put several examples into one sequence
+    with restarting position ids and a block-diagonal causal mask, so
+    examples never attend to each other.
+
+Custom 4D masks changed meaning between transformers releases; run
+check_packed_attention(model, ...) once and fall back to dynamic padding
+when it returns False.
+"""
+
+from copy import deepcopy
+
+import torch
+
+from prompts import (
+    truncate,
+    EPIC_TITLE_TRAIN_PROMPT,
+    FEATURE_TITLES_TRAIN_PROMPT,
+    STORY_TITLES_TRAIN_PROMPT,
+)
+from prefix_cache import common_prefix_len
+
+IGNORE_INDEX = -100
+
+
+# ----------------- EXAMPLES ----------------- #
+
+def build_title_examples(training_pairs):
+    """
+    Epic / feature / story title examples of every (project_text, label_json)
+    pair, as in the notebook's prompt-building cell.
+
+    Returns a list of {"prompt": str, "completion": str}
+    """
+    examples = []
+    for pair in training_pairs:
+        label = deepcopy(pair["label_json"])
+        proj = truncate(pair["project_text"], max_chars=800)
+        epic_obj = label.get("epic", {}) or {}
+        features = label.get("features", []) or []
+
+        # ---------- EPIC TITLE EXAMPLE ----------
+        epic_title = str(epic_obj.get("title", "")).strip()
+        if epic_title:
+            examples.append({
+                "prompt": EPIC_TITLE_TRAIN_PROMPT.format(project_text=proj),
+                "completion": epic_title,
+            })
+
+        # ---------- FEATURE TITLES EXAMPLE ----------
+        feature_titles = [str(f.get("title", "")).strip() for f in features]
+        feature_titles = [t for t in feature_titles if t]
+        if feature_titles:
+            examples.append({
+                "prompt": FEATURE_TITLES_TRAIN_PROMPT.format(
+                    project_text=proj,
+                    num_features=len(feature_titles),
+                ),
+                "completion": "\n".join(feature_titles),
+            })
+
+        # ---------- STORY TITLES EXAMPLES (ONE PER FEATURE) ----------
+        for f in features:
+            f_title = str(f.get("title", "")).strip() or "Feature"
+            story_titles = [str(s.get("title", "")).strip() for s in (f.get("user_stories", []) or [])]
+            story_titles = [t for t in story_titles if t]
+            if not story_titles:
+                continue
+            examples.append({
+                "prompt": STORY_TITLES_TRAIN_PROMPT.format(
+                    project_text=proj,
+                    epic_title=epic_title if epic_title else "Project Epic",
+                    feature_title=f_title,
+                    num_stories=len(story_titles),
+                ),
+                "completion": "\n".join(story_titles),
+            })
+    return examples
+
+
+def tokenize_example(tokenizer, example: dict, max_len: int = 1024) -> dict:
+    """
+    Tokenize prompt + completion (+ EOS) without padding; labels are
+    IGNORE_INDEX over the prompt.
+
+    The prompt/completion boundary is the common token prefix of the prompt
+    alone and the full text, so a token that straddles it is trained on.
+    """
+    prompt_ids = tokenizer(example["prompt"])["input_ids"]
+    input_ids = tokenizer(example["prompt"] + example["completion"])["input_ids"]
+    return _with_labels(tokenizer, prompt_ids, input_ids, max_len)
+
+
+def tokenize_examples(tokenizer, examples, max_len: int = 1024):
+    """
+    tokenize_example over a list, with the prompts and full texts each
+    encoded in one batched tokenizer call.
+    """
+    if not examples:
+        return []
+    prompts = [ex["prompt"] for ex in examples]
+    prompt_ids = tokenizer(prompts)["input_ids"]
+    full_ids = tokenizer([ex["prompt"] + ex["completion"] for ex in examples])["input_ids"]
+    return [_with_labels(tokenizer, p, f, max_len) for p, f in zip(prompt_ids, full_ids)]
+
+
+def _with_labels(tokenizer, prompt_ids, input_ids, max_len: int) -> dict:
+    input_ids = (list(input_ids) + [tokenizer.eos_token_id])[:max_len]
+    n_prompt = min(common_prefix_len(prompt_ids, input_ids), len(input_ids))
+    labels = [IGNORE_INDEX] * n_prompt + input_ids[n_prompt:]
+    return {"input_ids": input_ids, "labels": labels}
+
+
+def pack_examples(tokenized, max_len: int = 1024):
+    """
+    First-fit-decreasing packing of tokenized examples into rows of at most
+    `max_len` tokens. Within a row examples keep their dataset order.
+
+    Returns a list of {"input_ids", "labels", "position_ids", "seq_lens"}
+    """
+    order = sorted(range(len(tokenized)), key=lambda i: -len(tokenized[i]["input_ids"]))
+    bins = []   # [tokens used, [example index, ...]]
+    for i in order:
+        n = len(tokenized[i]["input_ids"])
+        for b in bins:
+            if b[0] + n <= max_len:
+                b[0] += n
+                b[1].append(i)
+                break
+        else:
+            bins.append([n, [i]])
+
+    rows = []
+    for _, idxs in bins:
+        row = {"input_ids": [], "labels": [], "position_ids": [], "seq_lens": []}
+        for i in sorted(idxs):
+            ex = tokenized[i]
+            n = len(ex["input_ids"])
+            row["input_ids"] += ex["input_ids"]
+            row["labels"] += ex["labels"]
+            row["position_ids"] += list(range(n))
+            row["seq_lens"].append(n)
+        rows.append(row)
+    return rows
+
+
+# ----------------- COLLATORS ----------------- #
+
+def _padded_len(n: int, multiple: int) -> int:
+    return -(-n // multiple) * multiple if multiple else n
+
+
+class DynamicPaddingCollator:
+    """
+    Right-pads a batch to its longest example (rounded up to a multiple of
+    `pad_to_multiple_of`); padding is masked out and never trained on.
+    """
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: int = 8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        length = _padded_len(max(len(f["input_ids"]) for f in features), self.pad_to_multiple_of)
+        input_ids, attention_mask, labels = [], [], []
+        for f in features:
+            pad = length - len(f["input_ids"])
+            input_ids.append(f["input_ids"] + [self.pad_token_id] * pad)
+            attention_mask.append([1] * len(f["input_ids"]) + [0] * pad)
+            labels.append(f["labels"] + [IGNORE_INDEX] * pad)
+        return {
+            "input_ids": torch.tensor(input_ids),
+            "attention_mask": torch.tensor(attention_mask),
+            "labels": torch.tensor(labels),
+        }
+
+
+class PackedCollator:
+    """
+    Batches rows of `pack_examples`. Each row gets a 4D additive attention
+    mask (0 = attend, dtype min = blocked) that is causal inside every packed
+    example and blocks everything across them; padding is its own block.
+
+    mask_dtype: dtype of the attention scores (the model's compute dtype)
+    """
+
+    def __init__(self, pad_token_id: int, mask_dtype=torch.float32, pad_to_multiple_of: int = 8):
+        self.pad_token_id = pad_token_id
+        self.mask_dtype = mask_dtype
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        length = _padded_len(max(len(f["input_ids"]) for f in features), self.pad_to_multiple_of)
+        causal = torch.ones(length, length, dtype=torch.bool).tril()
+        blocked = torch.finfo(self.mask_dtype).min
+
+        input_ids, labels, position_ids, masks = [], [], [], []
+        for f in features:
+            pad = length - len(f["input_ids"])
+            input_ids.append(f["input_ids"] + [self.pad_token_id] * pad)
+            labels.append(f["labels"] + [IGNORE_INDEX] * pad)
+            position_ids.append(f["position_ids"] + list(range(pad)))
+
+            seg_lens = list(f["seq_lens"]) + ([pad] if pad else [])
+            segment = torch.repeat_interleave(
+                torch.arange(len(seg_lens)), torch.tensor(seg_lens)
+            )
+            allowed = (segment[:, None] == segment[None, :]) & causal
+            mask = torch.zeros(length, length, dtype=self.mask_dtype)
+            masks.append(mask.masked_fill(~allowed, blocked))
+
+        return {
+            "input_ids": torch.tensor(input_ids),
+            "labels": torch.tensor(labels),
+            "position_ids": torch.tensor(position_ids),
+            "attention_mask": torch.stack(masks)[:, None],
+        }
+
+
+def check_packed_attention(
+    model,
+    tokenizer,
+    collator: PackedCollator = None,
+    autocast_dtype=None,
+    rtol: float = 1e-2,
+    atol: float = 1e-2,
+) -> bool:
+    """
+    True when this model / transformers version keeps packed examples apart:
+    logits of two examples packed in one row must match running them alone.
+
+    autocast_dtype: run the probe under torch.autocast like the training run
+                    (e.g. torch.float16 for fp16=True)
+    """
+    collator = collator or PackedCollator(tokenizer.pad_token_id)
+    texts = ["Project description:\nA shop.\n\nEpic title:\nWeb Shop", "Feature titles:\nCart\nCheckout"]
+    tokenized = [tokenize_example(tokenizer, {"prompt": t, "completion": ""}) for t in texts]
+    row = pack_examples(tokenized, max_len=sum(len(t["input_ids"]) for t in tokenized))
+    if len(row) != 1:
+        return False
+    batch = {k: v.to(model.device) for k, v in collator(row).items() if k != "labels"}
+    autocast = torch.autocast(model.device.type, dtype=autocast_dtype, enabled=autocast_dtype is not None)
+    try:
+        with torch.no_grad(), autocast:
+            packed = model(**batch).logits[0].float()
+            start = 0
+            for t in tokenized:
+                n = len(t["input_ids"])
+                alone = model(input_ids=torch.tensor([t["input_ids"]], device=model.device)).logits[0].float()
+                if not torch.allclose(packed[start:start + n], alone, rtol=rtol, atol=atol):
+                    return False
+                start += n
+    except (RuntimeError, ValueError):
+        return False
+    return True
@@ -0,0 +1,150 @@
+# bench_adapters.py
+"""
+Multi-adapter serving (backend/adapters.py): memory per adapter, mixed-
+adapter batches and hot-swap.
+
+    python benchmarks/bench_adapters.py [--adapters 3] [--docs 6]
+
+On the tiny random Llama, attaches --adapters LoRA adapters (r=16 on
+q/v_proj, like agileai_tinyllama_qlora_v4, with random non-zero weights)
+to one base model, then:
+  - reports base and per-adapter memory,
+  - runs the titles pipeline for --docs documents whose adapters alternate,
+    once as one mixed-adapter batch and once as one batch per adapter, and
+    checks every document gets the same output as running it alone with
+    its adapter's own PeftModel (greedy),
+  - reloads one adapter from a new version while batches keep running and
+    reports the swap time and the batches served during the reload.
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+import torch
+
+from common import build_tiny_llama, load_tokenizer, load_clean_texts
+
+from adapters import AdapterRegistry
+from titles import run_agileai_titles_batch
+
+
+def write_adapter(base_dir: str, out_dir: str, seed: int):
+    from peft import LoraConfig, get_peft_model
+
+    model = get_peft_model(build_tiny_llama(), LoraConfig(
+        r=16, lora_alpha=32, target_modules=["q_proj", "v_proj"], task_type="CAUSAL_LM",
+    ))
+    torch.manual_seed(seed)
+    with torch.no_grad():
+        for name, p in model.named_parameters():
+            if "lora_B" in name:
+                p.normal_(std=0.05)
+    model.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "adapter_config.json"), "r") as f:
+        cfg = json.load(f)
+    cfg["base_model_name_or_path"] = base_dir
+    with open(os.path.join(out_dir, "adapter_config.json"), "w") as f:
+        json.dump(cfg, f)
+
+
+def own_peft_model(adapter_dir: str):
+    from peft import PeftModel
+
+    model = PeftModel.from_pretrained(build_tiny_llama(), adapter_dir)
+    model.eval()
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--adapters", type=int, default=3)
+    parser.add_argument("--docs", type=int, default=6)
+    parser.add_argument("--features", type=int, default=3)
+    parser.add_argument("--stories", type=int, default=2)
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer()
+    texts = [text for _, text in load_clean_texts(limit=args.docs)]
+    work = tempfile.mkdtemp()
+    try:
+        base_dir = os.path.join(work, "base")
+        build_tiny_llama().save_pretrained(base_dir)
+        paths = {}
+        for k in range(args.adapters):
+            paths[f"a{k}"] = os.path.join(work, f"a{k}")
+            write_adapter(base_dir, paths[f"a{k}"], seed=k + 1)
+
+        registry = AdapterRegistry.from_adapters(paths)
+        stats = registry.stats()
+        print(f"base model {stats['base_mb']:.1f} MB, adapters: "
+              + ", ".join(f"{n} {a['mb']:.2f} MB" for n, a in stats["adapters"].items()))
+
+        names = [f"a{i % args.adapters}" for i in range(len(texts))]
+        run = dict(num_features=args.features, stories_per_feature=args.stories)
+
+        start = time.perf_counter()
+        with registry.lock:
+            mixed = run_agileai_titles_batch(
+                registry.model, tokenizer, texts, adapter_names=registry.slots(names), **run,
+            )
+        mixed_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        per_adapter = [None] * len(texts)
+        for name in paths:
+            idxs = [i for i, n in enumerate(names) if n == name]
+            with registry.lock:
+                outs = run_agileai_titles_batch(
+                    registry.model, tokenizer, [texts[i] for i in idxs],
+                    adapter_names=registry.slots([name] * len(idxs)), **run,
+                )
+            for i, out in zip(idxs, outs):
+                per_adapter[i] = out
+        per_adapter_s = time.perf_counter() - start
+
+        same = 0
+        for name, path in paths.items():
+            own = own_peft_model(path)
+            for i, n in enumerate(names):
+                if n != name:
+                    continue
+                alone = run_agileai_titles_batch(own, tokenizer, [texts[i]], **run)[0]
+                same += mixed[i][0] == alone[0] == per_adapter[i][0]
+        print(f"{len(texts)} documents over {args.adapters} adapters: mixed batch {mixed_s:.1f}s, "
+              f"one batch per adapter {per_adapter_s:.1f}s, "
+              f"same titles as each adapter alone: {same}/{len(texts)}")
+
+        # hot swap while serving
+        write_adapter(base_dir, os.path.join(work, "a0_v2"), seed=100)
+        shutil.rmtree(paths["a0"])
+        shutil.copytree(os.path.join(work, "a0_v2"), paths["a0"])
+        old_version = registry.version("a0")
+        served = 0
+        start = time.perf_counter()
+        reload = registry.reload_async("a0")
+        while reload.is_alive() or served == 0:
+            with registry.lock:
+                run_agileai_titles_batch(
+                    registry.model, tokenizer, texts[:2], adapter_names=registry.slots(names[:2]), **run,
+                )
+            served += 1
+        swap_s = time.perf_counter() - start
+        swapped = registry.version("a0") != old_version
+        own = own_peft_model(paths["a0"])
+        with registry.lock:
+            after = run_agileai_titles_batch(registry.model, tokenizer, texts[:1], adapter_names=registry.slots(["a0"]), **run)
+        alone = run_agileai_titles_batch(own, tokenizer, texts[:1], **run)
+        print(f"hot swap a0: {old_version} -> {registry.version('a0')} in {swap_s:.2f}s, "
+              f"{served} batches served meanwhile, new version in use: "
+              f"{swapped and after[0][0] == alone[0][0]}, errors: {registry.errors or 'none'}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
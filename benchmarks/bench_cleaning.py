@@ -0,0 +1,111 @@
+# bench_cleaning.py
+"""
+Compiled cleaning (backend/cleaning.py) against the playground1.ipynb cells.
+
+    python benchmarks/bench_cleaning.py [--pdf-dir data] [--repeats 5]
+
+The reference functions are executed straight from the notebook (Cells 3
+and 4), so the check follows the notebook if it changes. Every function is
+run on every document of clean_text/ (plus the raw text of the PDFs in
+--pdf-dir, if given); outputs must be identical. Reports MB/s per function.
+"""
+
+import io
+import os
+import re
+import json
+import argparse
+import contextlib
+from typing import Dict, List, Tuple
+
+from common import REPO_ROOT, load_clean_texts, time_call, summarize
+
+import cleaning
+
+NOTEBOOK = os.path.join(REPO_ROOT, "playground1.ipynb")
+NOTEBOOK_CELLS = ("# Cell 3 ", "# Cell 4 ")
+
+STRING_FUNCS = [
+    "remove_nonprintable_and_glyphs",
+    "remove_figure_placeholders",
+    "canonicalize_bullets_and_lists",
+    "remove_repeated_footers",
+    "normalize_whitespace",
+    "truncate_boilerplate_start",
+    "clean_text_pipeline_with_toc_removal",
+]
+LINE_FUNCS = [
+    "remove_toc_blocks",
+    "drop_residual_toc_fragments",
+]
+
+
+def load_notebook_functions(path: str = NOTEBOOK) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        nb = json.load(f)
+    namespace = {"re": re, "Dict": Dict, "List": List, "Tuple": Tuple}
+    for cell in nb["cells"]:
+        source = "".join(cell["source"])
+        if cell["cell_type"] == "code" and any(tag in source for tag in NOTEBOOK_CELLS):
+            exec(compile(source, path, "exec"), namespace)
+    return namespace
+
+
+def load_pdf_texts(pdf_dir: str):
+    from preprocess import extract_text_from_pdf
+
+    docs = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.lower().endswith(".pdf"):
+            docs.append((name, extract_text_from_pdf(os.path.join(pdf_dir, name))))
+    return docs
+
+
+def run_all(fn, inputs):
+    # The notebook pipeline prints removed TOC ranges; keep the timing quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [fn(x) for x in inputs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf-dir", action="append", default=[], help="also clean the raw text of these PDFs")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = load_clean_texts()
+    for pdf_dir in args.pdf_dir:
+        docs += load_pdf_texts(pdf_dir)
+    texts = [text for _, text in docs]
+    line_inputs = [text.splitlines() for text in texts]
+    megabytes = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+
+    reference = load_notebook_functions()
+    print(f"{len(docs)} documents, {megabytes:.2f} MB")
+    print(f"{'function':<40} {'notebook_MB/s':>13} {'compiled_MB/s':>13} {'speedup':>8}  same")
+
+    all_same = True
+    for name in STRING_FUNCS + LINE_FUNCS:
+        inputs = line_inputs if name in LINE_FUNCS else texts
+        ref_out, ref_s = time_call(lambda: run_all(reference[name], inputs), repeats=args.repeats)
+        new_out, new_s = time_call(lambda: run_all(getattr(cleaning, name), inputs), repeats=args.repeats)
+
+        same = ref_out == new_out
+        all_same &= same
+        ref_t = summarize(ref_s)["median_s"]
+        new_t = summarize(new_s)["median_s"]
+        print(
+            f"{name:<40} {megabytes / ref_t:>13.1f} {megabytes / new_t:>13.1f} "
+            f"{ref_t / new_t:>7.1f}x  {same}"
+        )
+        if not same:
+            for (doc, _), a, b in zip(docs, ref_out, new_out):
+                if a != b:
+                    print(f"    differs on {doc}")
+
+    if not all_same:
+        raise SystemExit("compiled cleaning output differs from the notebook")
+
+
+if __name__ == "__main__":
+    main()
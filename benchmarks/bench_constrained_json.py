@@ -0,0 +1,123 @@
+# bench_constrained_json.py
+"""
+Full-backlog JSON (backend/backlog_json.py): free sampling vs
+schema-constrained decoding (backend/constrained_json.py).
+
+    python benchmarks/bench_constrained_json.py [--model-dir DIR] [--docs 3] [--new-tokens 200] [--attempts 3]
+
+1. Replay: every training_eg/ backlog, mapped to the prompt's schema and
+   pretty-printed as json.dumps would, followed by a sentence of chatter, is
+   fed token by token through the constraint. Checks that the mask allows
+   every token of the JSON, reports where decoding stops (the tokens after
+   the root object are the ones saved) and the cold / cached mask time.
+2. Generation: for --docs clean_text/ documents, generate_agile_output_with_report
+   in both modes, retrying up to --attempts times while the output does not
+   parse. Reports documents parsed, attempts, generated tokens, outputs
+   closed by the grammar at max_new_tokens and seconds. A random model never
+   closes its strings, so its constrained outputs end by hitting
+   max_new_tokens; pass --model-dir for the trained model.
+"""
+
+import os
+import json
+import time
+import argparse
+from glob import glob
+
+from common import REPO_ROOT, load_model, load_clean_texts, load_tokenizer
+
+from backlog_json import _backlog_constraint, generate_agile_output_with_report
+
+
+def to_prompt_schema(example: dict) -> dict:
+    # training_eg uses the playground schema (summary / stories / lists)
+    epic = example["epic"]
+    features = []
+    for i, feat in enumerate(example["features"], start=1):
+        features.append({
+            "id": f"F{i}",
+            "title": feat["title"],
+            "description": feat["description"],
+            "acceptance_criteria": f"Available on the {feat.get('webpage', 'main')} page.",
+            "user_stories": [
+                {
+                    "id": f"US{j}",
+                    "title": story["title"],
+                    "description": story["description"],
+                    "acceptance_criteria": "; ".join(story.get("acceptance_criteria", [])) or "Works as described.",
+                }
+                for j, story in enumerate(feat.get("stories", []), start=1)
+            ],
+        })
+    return {
+        "epic": {"id": "E1", "title": epic["title"], "description": epic["summary"], "acceptance_criteria": epic["summary"]},
+        "features": features,
+    }
+
+
+def replay(tokenizer):
+    constraint = _backlog_constraint(tokenizer)
+    grammar = constraint.grammar
+    print(f"{'example':<24} {'tokens':>6} {'stop_at':>7} {'saved':>5} {'allowed':>7} {'cold_ms/step':>12} {'warm_ms/step':>12}")
+    for path in sorted(glob(os.path.join(REPO_ROOT, "training_eg", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            backlog = to_prompt_schema(json.load(f))
+        text = json.dumps(backlog, indent=2, ensure_ascii=False) + "\n\nThis backlog covers the whole project."
+        ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+
+        timings = []
+        for _ in range(2):
+            state, allowed, stop_at = grammar.start(), 0, None
+            start = time.perf_counter()
+            for pos, token_id in enumerate(ids):
+                allowed += bool(constraint.allowed(state, first=pos == 0)[token_id])
+                state = constraint.advance(state, token_id, first=pos == 0)
+                if state is None:
+                    break
+                if grammar.is_done(state):
+                    stop_at = pos + 1
+                    break
+            timings.append((time.perf_counter() - start) / max(stop_at or pos + 1, 1) * 1000)
+        steps = stop_at or pos + 1
+        print(f"{os.path.basename(path):<24} {len(ids):>6} {str(stop_at):>7} {len(ids) - steps:>5} "
+              f"{allowed}/{steps:<5} {timings[0]:>12.2f} {timings[1]:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--new-tokens", type=int, default=200)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--chars", type=int, default=1500, help="project text characters per prompt")
+    args = parser.parse_args()
+
+    replay(load_tokenizer(args.model_dir) if args.model_dir else load_tokenizer())
+
+    model, tokenizer = load_model(args.model_dir)
+    docs = load_clean_texts(limit=args.docs)
+    print(f"\n{len(docs)} documents, max_new_tokens={args.new_tokens}, up to {args.attempts} attempts")
+    print(f"{'mode':<12} {'parsed':>6} {'attempts':>8} {'tokens':>7} {'closed_at_max':>13} {'seconds':>8}")
+    for constrained in (False, True):
+        parsed = attempts = tokens = truncated = 0
+        start = time.perf_counter()
+        for _, text in docs:
+            _, _, report = generate_agile_output_with_report(
+                model,
+                tokenizer,
+                text[:args.chars],
+                constrained=constrained,
+                max_attempts=args.attempts,
+                max_new_tokens=args.new_tokens,
+            )
+            parsed += report["parsed"]
+            attempts += report["attempts"]
+            tokens += report["generated_tokens"]
+            truncated += report["truncated"]
+        seconds = time.perf_counter() - start
+        mode = "constrained" if constrained else "free"
+        print(f"{mode:<12} {parsed:>4}/{len(docs)} {attempts:>8} {tokens:>7} {truncated:>13} {seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
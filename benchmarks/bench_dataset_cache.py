@@ -0,0 +1,113 @@
+# bench_dataset_cache.py
+"""
+Training dataset preparation: the notebook's per-run rebuild vs the
+memory-mapped cache (backend/dataset_cache.py).
+
+    python benchmarks/bench_dataset_cache.py [--repeats 3]
+
+Labels: every clean_text/ document gets one of the training_eg/ backlogs
+(round-robin) as <name>.json in a temporary label folder, so the notebook's
+file matching applies. Reports, for the notebook path (read + match files,
+build prompts, tokenize example by example), a cold cache build and a warm
+cache load: seconds and the process RSS growth while holding the dataset,
+and checks that all three give the same examples.
+"""
+
+import os
+import gc
+import json
+import shutil
+import argparse
+import tempfile
+from glob import glob
+
+from common import REPO_ROOT, CLEAN_TEXT_DIR, load_tokenizer, time_call, summarize
+
+from training_data import build_title_examples, tokenize_example
+from dataset_cache import load_clean_texts, load_json_labels, match_training_pairs, load_or_build_dataset
+
+MAX_LEN = 1024
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def write_labels(label_dir: str):
+    labels = []
+    for path in sorted(glob(os.path.join(REPO_ROOT, "training_eg", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for feat in data.get("features", []):
+            feat.setdefault("user_stories", feat.get("stories", []))
+        labels.append(data)
+    names = sorted(n[: -len("_clean.txt")] for n in os.listdir(CLEAN_TEXT_DIR) if n.endswith("_clean.txt"))
+    for i, name in enumerate(names):
+        with open(os.path.join(label_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(labels[i % len(labels)], f)
+
+
+def notebook_rebuild(tokenizer, label_dir):
+    pairs = match_training_pairs(load_clean_texts(CLEAN_TEXT_DIR), load_json_labels(label_dir), verbose=False)
+    return [tokenize_example(tokenizer, ex, MAX_LEN) for ex in build_title_examples(pairs)]
+
+
+def measure(fn):
+    gc.collect()
+    before = rss_bytes()
+    result, samples = time_call(fn, repeats=1, warmup=0)
+    return result, samples[0], rss_bytes() - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer()
+    work = tempfile.mkdtemp()
+    try:
+        label_dir = os.path.join(work, "labels")
+        cache_dir = os.path.join(work, "cache")
+        os.makedirs(label_dir)
+        write_labels(label_dir)
+
+        def build():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            return load_or_build_dataset(tokenizer, CLEAN_TEXT_DIR, label_dir, cache_dir, MAX_LEN)
+
+        def load():
+            return load_or_build_dataset(tokenizer, CLEAN_TEXT_DIR, label_dir, cache_dir, MAX_LEN)
+
+        rows = []
+        reference, seconds, rss = measure(lambda: notebook_rebuild(tokenizer, label_dir))
+        rows.append(("notebook rebuild", seconds, rss))
+        del reference
+        _, seconds, rss = measure(build)
+        rows.append(("cache build", seconds, rss))
+        dataset, seconds, rss = measure(load)
+        rows.append(("cache load", seconds, rss))
+
+        _, samples = time_call(load, repeats=args.repeats)
+        load_s = summarize(samples)["median_s"]
+        _, samples = time_call(lambda: notebook_rebuild(tokenizer, label_dir), repeats=args.repeats)
+        rebuild_s = summarize(samples)["median_s"]
+
+        same = list(dataset) == notebook_rebuild(tokenizer, label_dir)
+        size = sum(os.path.getsize(p) for p in glob(os.path.join(dataset.path, "*")))
+        print(f"{len(dataset)} examples, {dataset.meta['tokens']} tokens, "
+              f"cache entry {size / 1e6:.2f} MB, same examples={same}")
+        print(f"{'step':<17} {'seconds':>8} {'rss_delta_MB':>12}")
+        for name, s, r in rows:
+            print(f"{name:<17} {s:>8.3f} {r / 1e6:>12.1f}")
+        print(f"median of {args.repeats}: rebuild {rebuild_s:.3f}s, load {load_s * 1000:.1f} ms "
+              f"({rebuild_s / load_s:.0f}x)")
+        if not same:
+            raise SystemExit("cached dataset differs from the notebook rebuild")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# bench_json_stream.py
+"""
+Full-backlog JSON: parse after generation vs the incremental parser
+(backend/json_stream.py, backlog_json.iter_agile_output).
+
+    python benchmarks/bench_json_stream.py [--model-dir DIR] [--docs 3] [--features 3] [--stories 3]
+
+For every clean_text/ document runs
+  full:    generate_agile_output_with_report, parse_json_safely at the end
+  stream:  iter_agile_output with no limits
+  limited: iter_agile_output(num_features=--features, stories_per_feature=--stories)
+and reports generated tokens, seconds to the first story, the first feature
+and the parsed backlog, whether the streamed backlog equals the parsed one
+(modulo the id / acceptance_criteria repairs) and the validation errors
+left after repair.
+
+A random model does not write JSON, so without --model-dir the tiny random
+Llama is made to write a training_eg/ backlog (mapped to the prompt's
+schema, as in bench_constrained_json.py) token by token, standing in for a
+model that follows the prompt.
+"""
+
+import os
+import json
+import time
+import argparse
+from glob import glob
+
+from common import REPO_ROOT, load_model, load_clean_texts
+from bench_constrained_json import to_prompt_schema
+
+from backlog_json import build_inference_prompt, generate_agile_output_with_report, iter_agile_output
+from json_stream import repair_feature, _repair_item
+
+
+def force_completion(model, tokenizer):
+    """
+    Make the model write target["ids"] after a prompt of target["prompt_len"]
+    tokens (then EOS). Returns the dict to fill in before each run.
+    """
+    target = {"ids": [], "prompt_len": 0}
+    position = {}
+
+    def remember_positions(module, args, kwargs):
+        position["ids"] = kwargs.get("position_ids")
+
+    def force(module, args, output):
+        ids = position.get("ids")
+        if ids is not None and target["ids"]:
+            step = int(ids[0, -1]) + 1 - target["prompt_len"]
+            if 0 <= step:
+                token = target["ids"][step] if step < len(target["ids"]) else tokenizer.eos_token_id
+                output[:, -1, token] += 100.0
+        return output
+
+    model.register_forward_pre_hook(remember_positions, with_kwargs=True)
+    model.lm_head.register_forward_hook(force)
+    return target
+
+
+def repaired(backlog):
+    # what the parser's repairs make of a backlog that parsed at the end
+    if backlog is None:
+        return None
+    features = [repair_feature(json.loads(json.dumps(f)), i) for i, f in enumerate(backlog.get("features", []))]
+    return {"epic": _repair_item(dict(backlog["epic"]), "E1"), "features": features}
+
+
+def run_stream(model, tokenizer, text, max_new_tokens, **limits):
+    start = time.perf_counter()
+    first = {}
+    errors = 0
+    for event in iter_agile_output(model, tokenizer, text, max_new_tokens=max_new_tokens, **limits):
+        first.setdefault(event["type"], time.perf_counter() - start)
+        errors += len(event.get("errors", []))
+        if event["type"] == "done":
+            done = event
+    return done, first, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--features", type=int, default=3)
+    parser.add_argument("--stories", type=int, default=3)
+    parser.add_argument("--new-tokens", type=int, default=800)
+    parser.add_argument("--chars", type=int, default=1500, help="project text characters per prompt")
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir)
+    docs = load_clean_texts(limit=args.docs)
+    examples = sorted(glob(os.path.join(REPO_ROOT, "training_eg", "*.json")))
+    target = None
+    if not args.model_dir:
+        target = force_completion(model, tokenizer)
+        print("tiny random Llama, forced to write the training_eg/ backlogs")
+
+    print(f"{'document':<16} {'mode':<8} {'tokens':>6} {'story_s':>8} {'feature_s':>9} {'total_s':>8} "
+          f"{'features':>8} {'same':>5} {'errors':>6}")
+    for d, (name, text) in enumerate(docs):
+        text = text[:args.chars]
+        new_tokens = args.new_tokens
+        if target is not None:
+            with open(examples[d % len(examples)], "r", encoding="utf-8") as f:
+                backlog = json.dumps(to_prompt_schema(json.load(f)), indent=2, ensure_ascii=False)
+            target["ids"] = tokenizer(backlog, add_special_tokens=False)["input_ids"]
+            target["prompt_len"] = tokenizer(build_inference_prompt(text), return_tensors="pt")["input_ids"].shape[1]
+            new_tokens = len(target["ids"]) + 1
+
+        start = time.perf_counter()
+        parsed, _, report = generate_agile_output_with_report(model, tokenizer, text, max_new_tokens=new_tokens)
+        full_s = time.perf_counter() - start
+        n_features = len(parsed["features"]) if parsed else 0
+        print(f"{name:<16} {'full':<8} {report['generated_tokens']:>6} {full_s:>8.2f} {full_s:>9.2f} "
+              f"{full_s:>8.2f} {n_features:>8} {'-':>5} {'-':>6}")
+
+        for mode, limits in (
+            ("stream", {}),
+            ("limited", {"num_features": args.features, "stories_per_feature": args.stories}),
+        ):
+            done, first, errors = run_stream(model, tokenizer, text, new_tokens, **limits)
+            streamed, stream_report = done["agile_output"], done["report"]
+            same = "-"
+            if not limits:
+                same = str(streamed == repaired(parsed))
+            print(f"{name:<16} {mode:<8} {stream_report['generated_tokens']:>6} "
+                  f"{first.get('story', float('nan')):>8.2f} {first.get('feature', float('nan')):>9.2f} "
+                  f"{first['done']:>8.2f} {stream_report['features']:>8} {same:>5} {errors:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# bench_line_stopping.py
+"""
+Titles pipeline with and without line-based early stopping (backend/stopping.py).
+
+    python benchmarks/bench_line_stopping.py [--model-dir DIR] [--docs 3] [--line-tokens 8]
+
+For every clean_text/ document runs run_agileai_titles_only_with_report
+with stop_early=False and stop_early=True and reports, per document, the
+row-tokens decoded (decode steps x batch rows, i.e. what generate() paid
+for), seconds, the share of both saved and whether the backlog titles are
+identical.
+
+A random model almost never emits a line break, so without --model-dir the
+tiny random Llama is made to end a line every --line-tokens tokens, to
+stand in for a model that writes one title per line (and, like a model
+that ignores the requested count, keeps going until max_new_tokens).
+"""
+
+import time
+import argparse
+
+import torch
+
+from common import load_model, load_clean_texts
+
+from titles import run_agileai_titles_only_with_report
+
+
+class CountingModel:
+    """
+    Passes everything to `model`; adds up the row-tokens of every generate().
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self.row_tokens = 0
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self._model(*args, **kwargs)
+
+    def generate(self, *args, **kwargs):
+        out = self._model.generate(*args, **kwargs)
+        sequences = out.sequences if hasattr(out, "sequences") else out
+        prompt = kwargs["input_ids"] if "input_ids" in kwargs else args[0]
+        self.row_tokens += (sequences.shape[1] - prompt.shape[1]) * sequences.shape[0]
+        return out
+
+
+def force_line_breaks(model, tokenizer, line_tokens: int):
+    """
+    Make the model emit a line break at every position that is a multiple
+    of `line_tokens` (per row, from its position ids, so a run is the same
+    whether or not it stops early).
+    """
+    newline = tokenizer.convert_tokens_to_ids("<0x0A>")
+    position = {}
+
+    def remember_positions(module, args, kwargs):
+        ids = kwargs.get("position_ids")
+        if ids is None and kwargs.get("input_ids") is not None:
+            # direct forward calls (speculative.py) pass no position ids
+            past = kwargs.get("past_key_values")
+            start = past.get_seq_length() if past is not None else 0
+            width = kwargs["input_ids"].shape[1]
+            ids = torch.arange(start, start + width, device=kwargs["input_ids"].device).unsqueeze(0)
+        position["ids"] = ids
+
+    def add_break(module, args, output):
+        ids = position.get("ids")
+        if ids is not None:
+            # every position of the call (a prompt-lookup pass verifies several)
+            breaks = ((ids + 1) % line_tokens == 0).expand(output.shape[0], -1)
+            output[..., newline][breaks[:, -output.shape[1]:]] += 100.0
+        return output
+
+    model.register_forward_pre_hook(remember_positions, with_kwargs=True)
+    model.lm_head.register_forward_hook(add_break)
+
+
+def titles_of(agile_output):
+    return [
+        agile_output["epic"]["title"],
+        [(f["title"], [s["title"] for s in f["user_stories"]]) for f in agile_output["features"]],
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--features", type=int, default=5)
+    parser.add_argument("--stories", type=int, default=3)
+    parser.add_argument("--line-tokens", type=int, default=8, help="line length of the random model")
+    parser.add_argument("--unbatched", action="store_true", help="one generate() per feature's stories")
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir)
+    docs = load_clean_texts(limit=args.docs)
+    if not args.model_dir:
+        force_line_breaks(model, tokenizer, args.line_tokens)
+        print(f"tiny random Llama, one line every {args.line_tokens} tokens")
+    counting = CountingModel(model)
+    run = dict(
+        num_features=args.features,
+        stories_per_feature=args.stories,
+        batch_stories=not args.unbatched,
+    )
+
+    print(f"{'document':<16} {'tokens_full':>11} {'tokens_stop':>11} {'saved':>6} "
+          f"{'full_s':>7} {'stop_s':>7} {'saved':>6}  same")
+    totals = [0, 0, 0.0, 0.0]
+    for name, text in docs:
+        results = []
+        for stop_early in (False, True):
+            counting.row_tokens = 0
+            start = time.perf_counter()
+            agile_output, _ = run_agileai_titles_only_with_report(
+                counting, tokenizer, text, stop_early=stop_early, **run,
+            )
+            results.append((counting.row_tokens, time.perf_counter() - start, titles_of(agile_output)))
+        (full_tokens, full_s, full_titles), (stop_tokens, stop_s, stop_titles) = results
+        totals = [totals[0] + full_tokens, totals[1] + stop_tokens, totals[2] + full_s, totals[3] + stop_s]
+        print(f"{name:<16} {full_tokens:>11} {stop_tokens:>11} {1 - stop_tokens / full_tokens:>6.0%} "
+              f"{full_s:>7.2f} {stop_s:>7.2f} {1 - stop_s / full_s:>6.0%}  {full_titles == stop_titles}")
+    print(f"{'total':<16} {totals[0]:>11} {totals[1]:>11} {1 - totals[1] / totals[0]:>6.0%} "
+          f"{totals[2]:>7.2f} {totals[3]:>7.2f} {1 - totals[3] / totals[2]:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
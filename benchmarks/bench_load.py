@@ -0,0 +1,307 @@
+# bench_load.py
+"""
+Load test of POST /analyze: replayed or synthesized traffic against the backend with a stand-in model.
+
+    python benchmarks/bench_load.py [--requests 40] [--rate 2] [--concurrency 16] [--token-ms 5]
+    python benchmarks/bench_load.py --log captured.jsonl --max-batch 8 --window-ms 50
+    python benchmarks/bench_load.py --url http://localhost:8000 --rate 0.5
+
+Traffic is either replayed from an NDJSON log of /analyze bodies (--log; a
+line may carry "t", its arrival in seconds from the start of the capture,
+which is kept unless --rate is given; lines without project_text or
+pdf_base64 are skipped) or synthesized from the clean_text/ corpus.
+Arrivals are Poisson at --rate requests/s (0: all at once), with at most
+--concurrency requests in flight on the client.
+
+By default the real backend/server.py app (micro-batcher, bounded queue,
+timeouts, result cache in a temporary folder) runs in-process on the tiny
+random Llama of common.py, made as slow as a bigger model with
+  --token-ms    sleep per decode step of a batch
+  --row-cost    extra share of --token-ms per additional row in the batch
+  --prefill-ms  sleep per 100 prompt tokens per row
+so queueing and batching can be studied without weights. The batcher is
+instrumented, which splits each request's latency into queue wait (arrival
+to the start of its batch) and compute (its batch). Every request gets a
+unique marker line, so the result cache never answers for the model.
+
+With --url the requests go to a running backend instead; only end-to-end
+latency is known then.
+
+Reports throughput, p50 / p95 / p99 latency, queue wait and compute, the
+mean batch size and the rates of 429 rejections, timeouts and errors.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from common import load_clean_texts, build_tiny_llama, load_tokenizer
+
+MARKER = "\n\n[load-test request {}]"
+MARKER_RE = re.compile(r"\[load-test request (\d+)\]\s*$")
+
+
+# ----------------- TRAFFIC ----------------- #
+
+def read_log(path: str):
+    """
+    [(arrival_s or None, body)] from an NDJSON log of /analyze bodies.
+    """
+    requests, skipped = [], 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not (record.get("project_text") or record.get("pdf_base64")):
+                skipped += 1
+                continue
+            arrival = record.pop("t", None)
+            requests.append((arrival, record))
+    if skipped:
+        print(f"⚠️ Skipped {skipped} lines of {path} that are not /analyze bodies")
+    return requests
+
+
+def synthesize(n: int, num_features: int, stories_per_feature: int, chars: int):
+    docs = load_clean_texts()
+    return [
+        (None, {
+            "project_text": docs[i % len(docs)][1][:chars or None],
+            "num_features": num_features,
+            "stories_per_feature": stories_per_feature,
+        })
+        for i in range(n)
+    ]
+
+
+def arrival_times(requests, rate: float, seed: int = 0):
+    """
+    Seconds from the start for each request: the logged times, Poisson
+    arrivals at `rate`, or all at once.
+    """
+    if rate <= 0 and all(t is not None for t, _ in requests):
+        start = min(t for t, _ in requests)
+        return [t - start for t, _ in requests]
+    if rate <= 0:
+        return [0.0] * len(requests)
+    rng = random.Random(seed)
+    times, t = [], 0.0
+    for _ in requests:
+        times.append(t)
+        t += rng.expovariate(rate)
+    return times
+
+
+# ----------------- STAND-IN MODEL ----------------- #
+
+def slow_down(model, token_ms: float, row_cost: float, prefill_ms: float):
+    """
+    Sleep in every forward pass as a bigger model would compute: a decode
+    step of a batch of B rows takes token_ms * (1 + row_cost * (B - 1)),
+    a prefill prefill_ms per 100 prompt tokens per row.
+    """
+    def sleep(module, args, kwargs):
+        ids = kwargs.get("input_ids")
+        if ids is None:
+            ids = kwargs.get("inputs_embeds")
+        if ids is None:
+            return
+        rows, width = ids.shape[0], ids.shape[1]
+        if width == 1:
+            time.sleep(token_ms / 1000 * (1 + row_cost * (rows - 1)))
+        else:
+            time.sleep(prefill_ms / 1000 * rows * width / 100)
+
+    model.register_forward_pre_hook(sleep, with_kwargs=True)
+    return model
+
+
+def start_local_backend(args):
+    """
+    Import backend/server.py configured from `args` and give its service the
+    stand-in model. Returns (app, server module, timings per request id).
+    """
+    os.environ["AGILEAI_MAX_QUEUE"] = str(args.max_queue)
+    os.environ["AGILEAI_MAX_BATCH"] = str(args.max_batch)
+    os.environ["AGILEAI_BATCH_WINDOW_MS"] = str(args.window_ms)
+    os.environ["AGILEAI_REQUEST_TIMEOUT_S"] = str(args.request_timeout)
+    os.environ["AGILEAI_CONTEXT"] = args.context
+    os.environ["AGILEAI_RESULT_CACHE_DIR"] = tempfile.mkdtemp(prefix="agileai-load-cache-")
+    import server
+    from packing import PromptPacker
+
+    service = server.service
+    service.model = slow_down(build_tiny_llama(), args.token_ms, args.row_cost, args.prefill_ms)
+    service.tokenizer = load_tokenizer()
+    service.model_version = "stand-in"
+    if server.CONTEXT_MODE == "packed":
+        service.packer = PromptPacker(service.tokenizer)
+
+    timings = {}
+    process_batch = server.batcher.process_batch
+
+    def timed_batch(payloads):
+        start = time.perf_counter()
+        try:
+            return process_batch(payloads)
+        finally:
+            end = time.perf_counter()
+            for p in payloads:
+                match = MARKER_RE.search(p["project_text"])
+                if match:
+                    timings[int(match.group(1))] = (start, end, len(payloads))
+
+    server.batcher.process_batch = timed_batch
+    return server.app, server, timings
+
+
+# ----------------- CLIENT ----------------- #
+
+async def run_load(client, requests, arrivals, concurrency: int, timeout: float):
+    """
+    Returns one record per request:
+      {"id", "sent", "done", "status"}   status: HTTP code, "timeout" or "error"
+    """
+    start = time.perf_counter()
+    gate = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def one(i, body, at):
+        await asyncio.sleep(max(0.0, start + at - time.perf_counter()))
+        async with gate:
+            sent = time.perf_counter()
+            try:
+                response = await client.post("/analyze", json=body, timeout=timeout)
+                status = response.status_code
+            except Exception as e:
+                status = "timeout" if "Timeout" in type(e).__name__ else "error"
+            records.append({"id": i, "sent": sent, "done": time.perf_counter(), "status": status})
+
+    await asyncio.gather(*(one(i, body, at) for i, ((_, body), at) in enumerate(zip(requests, arrivals))))
+    return records
+
+
+def percentiles(values):
+    # nearest rank
+    if not values:
+        return {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+    ordered = sorted(values)
+    return {f"p{q}": ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)] for q in (50, 95, 99)}
+
+
+def report(records, timings, wall_s: float):
+    ok = [r for r in records if r["status"] == 200]
+    counts = {
+        "ok": len(ok),
+        "rejected_429": sum(r["status"] == 429 for r in records),
+        # client timeout, or 503 from the server's queue timeout
+        "timeout": sum(r["status"] in ("timeout", 503) for r in records),
+        "error": sum(r["status"] not in (200, 429, 503, "timeout") for r in records),
+    }
+    latency = percentiles([r["done"] - r["sent"] for r in ok])
+    queue = percentiles([timings[r["id"]][0] - r["sent"] for r in ok if r["id"] in timings])
+    compute = percentiles([timings[r["id"]][1] - timings[r["id"]][0] for r in ok if r["id"] in timings])
+    batches = [timings[r["id"]][2] for r in ok if r["id"] in timings]
+
+    summary = {
+        "requests": len(records),
+        **counts,
+        "seconds": wall_s,
+        "throughput_rps": len(ok) / wall_s if wall_s > 0 else 0.0,
+        "latency_s": latency,
+        "queue_wait_s": queue,
+        "compute_s": compute,
+        "mean_batch_size": sum(batches) / len(batches) if batches else float("nan"),
+    }
+    n = max(len(records), 1)
+    print(f"{len(records)} requests in {wall_s:.1f}s: {summary['throughput_rps']:.2f} ok/s, "
+          f"mean batch {summary['mean_batch_size']:.2f}")
+    print(f"ok {counts['ok']} ({counts['ok'] / n:.0%}), 429 {counts['rejected_429']} ({counts['rejected_429'] / n:.0%}), "
+          f"timeout {counts['timeout']} ({counts['timeout'] / n:.0%}), error {counts['error']} ({counts['error'] / n:.0%})")
+    print(f"{'seconds':<12} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for label, values in (("latency", latency), ("queue wait", queue), ("compute", compute)):
+        print(f"{label:<12} {values['p50']:>8.2f} {values['p95']:>8.2f} {values['p99']:>8.2f}")
+    return summary
+
+
+async def amain(args, requests, arrivals):
+    import httpx
+
+    timings = {}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url)
+        server = None
+    else:
+        app, server, timings = start_local_backend(args)
+        server.batcher.start()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stand-in")
+    try:
+        start = time.perf_counter()
+        records = await run_load(client, requests, arrivals, args.concurrency, args.timeout)
+        wall_s = time.perf_counter() - start
+    finally:
+        await client.aclose()
+        if server is not None:
+            await server.batcher.stop()
+    return report(records, timings, wall_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--log", default=None, help="NDJSON of /analyze bodies to replay")
+    parser.add_argument("--requests", type=int, default=40, help="synthesized requests (without --log)")
+    parser.add_argument("--rate", type=float, default=None, help="arrivals per second, 0 = all at once "
+                                                                 "(default: the log's times, else 2)")
+    parser.add_argument("--concurrency", type=int, default=16, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request (s)")
+    parser.add_argument("--features", type=int, default=3)
+    parser.add_argument("--stories", type=int, default=2)
+    parser.add_argument("--chars", type=int, default=2000, help="project text characters (synthesized)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", default=None, help="running backend to load instead of the stand-in")
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--row-cost", type=float, default=0.1)
+    parser.add_argument("--prefill-ms", type=float, default=2.0)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-batch", type=int, default=4)
+    parser.add_argument("--window-ms", type=float, default=20.0)
+    parser.add_argument("--request-timeout", type=float, default=300.0, help="server-side queue timeout (s)")
+    parser.add_argument("--context", choices=("packed", "truncate"), default="truncate")
+    parser.add_argument("--out", default=None, help="write the summary as JSON here")
+    args = parser.parse_args()
+
+    if args.log:
+        requests = read_log(args.log)
+        if not requests:
+            sys.exit(f"❌ {args.log} has no /analyze bodies")
+    else:
+        requests = synthesize(args.requests, args.features, args.stories, args.chars)
+    rate = args.rate
+    if rate is None:
+        rate = 0.0 if requests and all(t is not None for t, _ in requests) else 2.0
+    arrivals = arrival_times(requests, rate, args.seed)
+    if not args.url:
+        # unique texts: the result cache must not answer for the model
+        for i, (_, body) in enumerate(requests):
+            if body.get("project_text"):
+                body["project_text"] += MARKER.format(i)
+
+    print(f"{len(requests)} requests, rate {rate or 'all at once'}, concurrency {args.concurrency}, "
+          + (f"backend {args.url}" if args.url else
+             f"stand-in model: {args.token_ms}ms/step, max batch {args.max_batch}, window {args.window_ms}ms"))
+    summary = asyncio.run(amain(args, requests, arrivals))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
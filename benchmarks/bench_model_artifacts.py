@@ -0,0 +1,157 @@
+# bench_model_artifacts.py
+"""
+Service start: adapter folder (AutoPeftModelForCausalLM) vs the merged
+artifact (backend/model_artifacts.py) as fp32, bf16 and int8.
+
+    python benchmarks/bench_model_artifacts.py [--hidden 1024 --layers 8] [--new-tokens 32]
+
+Builds a random Llama of the agileai_merged_model_v1 shape (scaled by
+--hidden / --layers) saved as float32, like agileai_merged_model_v1, plus a
+LoRA adapter on q/v_proj with non-zero weights, like
+agileai_tinyllama_qlora_v4. Then merges it once and, for every variant, in
+a fresh process: cold-start seconds (load + first forward, after the
+library imports), RSS growth over the imported libraries, decode
+tokens/sec (greedy) and the share of greedy tokens equal to the adapter
+run's. A random model's next-token margins are tiny, so int8 / bf16 token
+agreement here is a lower bound for the trained model.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from common import BACKEND_DIR, TINY_OVERRIDES, build_tiny_llama, load_tokenizer, load_clean_texts
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def build_source(work: str, hidden: int, layers: int) -> str:
+    import torch
+    from peft import LoraConfig, get_peft_model
+
+    TINY_OVERRIDES.update(
+        hidden_size=hidden,
+        intermediate_size=hidden * 11 // 4,
+        num_hidden_layers=layers,
+        num_attention_heads=max(hidden // 64, 1),
+        num_key_value_heads=max(hidden // 512, 1),
+    )
+    base_dir = os.path.join(work, "base")
+    adapter_dir = os.path.join(work, "adapter")
+    model = build_tiny_llama()
+    model.save_pretrained(base_dir)
+    load_tokenizer().save_pretrained(base_dir)
+
+    model = get_peft_model(model, LoraConfig(
+        r=16, lora_alpha=32, target_modules=["q_proj", "v_proj"], task_type="CAUSAL_LM",
+    ))
+    with torch.no_grad():
+        for name, p in model.named_parameters():
+            if "lora_B" in name:
+                p.normal_(std=0.02)
+    model.save_pretrained(adapter_dir)
+    load_tokenizer().save_pretrained(adapter_dir)
+    with open(os.path.join(adapter_dir, "adapter_config.json"), "r") as f:
+        cfg = json.load(f)
+    cfg["base_model_name_or_path"] = base_dir
+    with open(os.path.join(adapter_dir, "adapter_config.json"), "w") as f:
+        json.dump(cfg, f)
+    return adapter_dir
+
+
+def child(args):
+    # One variant in this (fresh) process; prints a JSON line
+    sys.path.insert(0, BACKEND_DIR)
+    import torch
+    from peft import AutoPeftModelForCausalLM
+    from transformers import AutoTokenizer
+    from model_artifacts import load_artifact
+
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    if args.child == "adapter":
+        model = AutoPeftModelForCausalLM.from_pretrained(args.path)
+        model.eval()
+        tokenizer = AutoTokenizer.from_pretrained(args.path)
+    else:
+        model, tokenizer = load_artifact(args.path, variant=args.child)
+    _, text = load_clean_texts(limit=1)[0]
+    input_ids = tokenizer(text[:800], return_tensors="pt")["input_ids"]
+    with torch.no_grad():
+        model(input_ids=input_ids[:, :8])
+    cold_start = time.perf_counter() - start
+    rss = rss_mb() - base_rss
+
+    with torch.no_grad():
+        t = time.perf_counter()
+        out = model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            max_new_tokens=args.new_tokens,
+            min_new_tokens=args.new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id,
+        )
+        seconds = time.perf_counter() - t
+    print(json.dumps({
+        "cold_start_s": cold_start,
+        "rss_mb": rss,
+        "tok_s": args.new_tokens / seconds,
+        "tokens": out[0, input_ids.shape[1]:].tolist(),
+    }))
+
+
+def run_child(variant: str, path: str, new_tokens: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", variant, "--path", path,
+         "--new-tokens", str(new_tokens)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hidden", type=int, default=1024)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--new-tokens", type=int, default=32)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--path", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    sys.path.insert(0, BACKEND_DIR)
+    from model_artifacts import ensure_artifact
+
+    work = tempfile.mkdtemp()
+    try:
+        adapter_dir = build_source(work, args.hidden, args.layers)
+        start = time.perf_counter()
+        artifact = ensure_artifact(adapter_dir, root=os.path.join(work, "models"))
+        merge_s = time.perf_counter() - start
+        size = sum(
+            os.path.getsize(os.path.join(d, n)) for d, _, names in os.walk(artifact) for n in names
+        ) / 1e6
+        print(f"hidden={args.hidden} layers={args.layers}: one-time merge {merge_s:.1f}s, artifact {size:.0f} MB")
+
+        reference = run_child("adapter", adapter_dir, args.new_tokens)
+        print(f"{'variant':<12} {'cold_start_s':>12} {'model_rss_MB':>12} {'tok/s':>7} {'same_tokens':>11}")
+        for variant in ("adapter", "fp32", "bf16", "int8"):
+            r = reference if variant == "adapter" else run_child(variant, artifact, args.new_tokens)
+            same = sum(a == b for a, b in zip(r["tokens"], reference["tokens"])) / len(reference["tokens"])
+            print(f"{variant:<12} {r['cold_start_s']:>12.2f} {r['rss_mb']:>12.0f} {r['tok_s']:>7.1f} {same:>10.0%}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench_packing.py
+"""
+Prompt length and prefill latency: first-800-characters context vs PromptPacker.
+
+    python benchmarks/bench_packing.py [--model-dir DIR] [--docs 20]
+
+For every document of clean_text/ builds the epic, feature and story
+prompts both ways (story prompts with the document's first heading as a
+stand-in feature title), counts their tokens and times one prefill forward
+pass of each. Reports mean / min / max / stdev per stage.
+"""
+
+import argparse
+import statistics
+
+import torch
+
+from common import load_model, load_clean_texts, time_call
+
+from packing import PromptPacker, split_sections
+from titles import _epic_title_prompt, _feature_titles_prompt, _story_titles_prompt
+
+
+def stage_prompts(text, packer, num_features=5, num_stories=3):
+    sections = split_sections(text)
+    feature_title = sections[-1].splitlines()[0] if sections else "Feature"
+    epic = {"title": "Project Epic"}
+    return {
+        "epic": _epic_title_prompt(text, packer),
+        "features": _feature_titles_prompt(text, num_features, packer),
+        "stories": _story_titles_prompt(text, epic, {"id": "F1", "title": feature_title}, num_stories, packer),
+    }
+
+
+def prefill_seconds(model, input_ids, repeats):
+    with torch.no_grad():
+        _, samples = time_call(lambda: model(input_ids=input_ids), repeats=repeats)
+    return statistics.median(samples)
+
+
+def describe(values, fmt="{:.0f}"):
+    return " / ".join(fmt.format(v) for v in (
+        statistics.fmean(values), min(values), max(values), statistics.pstdev(values),
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir)
+    packer = PromptPacker(tokenizer)
+
+    tokens = {}    # (mode, stage) -> [n]
+    seconds = {}   # (mode, stage) -> [s]
+    for _, text in load_clean_texts(limit=args.docs):
+        for mode, p in (("truncate", None), ("packed", packer)):
+            for stage, prompt in stage_prompts(text, p).items():
+                ids = tokenizer(prompt, return_tensors="pt")["input_ids"].to(model.device)
+                tokens.setdefault((mode, stage), []).append(ids.shape[1])
+                seconds.setdefault((mode, stage), []).append(prefill_seconds(model, ids, args.repeats))
+
+    print(f"{'stage':<9} {'context':<9} {'prompt tokens mean/min/max/std':>32} {'prefill ms mean/min/max/std':>30}")
+    for stage in ("epic", "features", "stories"):
+        for mode in ("truncate", "packed"):
+            ms = [s * 1000 for s in seconds[(mode, stage)]]
+            print(f"{stage:<9} {mode:<9} {describe(tokens[(mode, stage)]):>32} {describe(ms, '{:.1f}'):>30}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench_pages.py
+"""
+Compiled UI-page detection (backend/pages.py) against the playground1.ipynb cells.
+
+    python benchmarks/bench_pages.py [--repeats 5]
+
+The reference functions are executed straight from the notebook (Cell 5
+and the function part of Cell 7). Checks, on every document of clean_text/
+and on the same documents after the notebook's final refinement:
+  - detect_ui_pages_from_text gives the same pages in the same order,
+  - is_irrelevant_line / normalize_heading_variant agree on every line,
+and reports MB/s for page detection.
+"""
+
+import os
+import re
+import json
+import argparse
+from typing import Dict, List, Tuple
+
+from common import REPO_ROOT, load_clean_texts, time_call, summarize
+
+import pages
+
+NOTEBOOK = os.path.join(REPO_ROOT, "playground1.ipynb")
+# Cell 7 ends with code that reads the notebook's output files
+CELL_7_STOP = "# --- Recompute UI pages"
+
+
+def load_notebook_functions(path: str = NOTEBOOK) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        nb = json.load(f)
+    namespace = {"re": re, "Dict": Dict, "List": List, "Tuple": Tuple}
+    for cell in nb["cells"]:
+        source = "".join(cell["source"])
+        if cell["cell_type"] != "code":
+            continue
+        if "# Cell 5 " in source:
+            exec(compile(source, path, "exec"), namespace)
+        elif "# Cell 7 " in source:
+            exec(compile(source.split(CELL_7_STOP)[0], path, "exec"), namespace)
+    return namespace
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    reference = load_notebook_functions()
+
+    docs = load_clean_texts()
+    texts = [text for _, text in docs]
+    all_same = True
+    trimmed = []
+    for (name, _), t in zip(docs, texts):
+        ref = reference["refine_cleaned_text_and_pages"](t)
+        new = pages.refine_cleaned_text_and_pages(t)
+        if (ref["block"], ref["trimmed_text"]) != (new["block"], new["trimmed_text"]):
+            print(f"refinement differs on {name}")
+            all_same = False
+        trimmed.append(ref["trimmed_text"])
+    inputs = texts + trimmed
+    megabytes = sum(len(t.encode("utf-8")) for t in inputs) / 1e6
+
+    mismatched_lines = 0
+    for t in inputs:
+        for ln in t.splitlines():
+            if reference["is_irrelevant_line"](ln) != pages.is_irrelevant_line(ln):
+                mismatched_lines += 1
+            if reference["normalize_heading_variant"](ln) != pages.normalize_heading_variant(ln):
+                mismatched_lines += 1
+    all_same &= mismatched_lines == 0
+
+    ref_pages, ref_s = time_call(
+        lambda: [reference["detect_ui_pages_from_text"](t) for t in inputs], repeats=args.repeats
+    )
+    new_pages, new_s = time_call(
+        lambda: [pages.detect_ui_pages_from_text(t) for t in inputs], repeats=args.repeats
+    )
+    all_same &= ref_pages == new_pages
+
+    ref_t = summarize(ref_s)["median_s"]
+    new_t = summarize(new_s)["median_s"]
+    print(f"{len(inputs)} documents, {megabytes:.2f} MB, "
+          f"{sum(len(p) for p in new_pages)} pages detected")
+    print(f"line helpers mismatches: {mismatched_lines}")
+    print(f"detect_ui_pages_from_text  notebook {megabytes / ref_t:.1f} MB/s  "
+          f"compiled {megabytes / new_t:.1f} MB/s  ({ref_t / new_t:.1f}x)  same={ref_pages == new_pages}")
+
+    if not all_same:
+        raise SystemExit("compiled page detection differs from the notebook")
+
+
+if __name__ == "__main__":
+    main()
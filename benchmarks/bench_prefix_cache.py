@@ -0,0 +1,84 @@
+# bench_prefix_cache.py
+"""
+Titles pipeline with and without the shared project-prefix KV cache.
+
+    python benchmarks/bench_prefix_cache.py [--model-dir DIR] [--docs 3]
+
+Reports per-document latency, the number of prompt tokens prefilled without
+and with the cache, and checks that both runs produce the same backlog.
+"""
+
+import argparse
+
+from common import load_model, load_clean_texts, time_call, summarize
+
+from prefix_cache import PrefixKVCache
+from titles import run_agileai_titles_only_with_report
+
+
+def count_prompt_tokens(tokenizer, agile_output, project_text, num_features, stories_per_feature):
+    # epic + features prompts, plus one story prompt per feature
+    from prompts import (
+        truncate,
+        EPIC_TITLE_PROMPT_TEXT,
+        FEATURE_TITLES_PROMPT_TEXT,
+        STORY_TITLES_PROMPT_TEXT,
+    )
+    proj = truncate(project_text, max_chars=800)
+    prompts = [
+        EPIC_TITLE_PROMPT_TEXT.format(project_text=proj),
+        FEATURE_TITLES_PROMPT_TEXT.format(project_text=proj, num_features=num_features),
+    ]
+    for feat in agile_output["features"]:
+        prompts.append(STORY_TITLES_PROMPT_TEXT.format(
+            project_text=proj,
+            epic_title=agile_output["epic"]["title"],
+            feature_title=feat["title"],
+            num_stories=stories_per_feature,
+        ))
+    return sum(len(tokenizer(p)["input_ids"]) for p in prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--features", type=int, default=5)
+    parser.add_argument("--stories", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir)
+
+    print(f"{'document':<16} {'no_cache_s':>10} {'cache_s':>8} {'prefill_off':>10} {'prefill_on':>10}  same")
+    for name, text in load_clean_texts(limit=args.docs):
+        run = lambda cache: run_agileai_titles_only_with_report(
+            model,
+            tokenizer,
+            text,
+            num_features=args.features,
+            stories_per_feature=args.stories,
+            prefix_cache=cache,
+        )
+        (plain, _), plain_t = time_call(lambda: run(None), repeats=args.repeats)
+
+        # fresh cache per repeat so every timed run pays its one prefill
+        caches = []
+
+        def cached_run():
+            caches.append(PrefixKVCache())
+            return run(caches[-1])
+
+        (cached, _), cached_t = time_call(cached_run, repeats=args.repeats)
+
+        prompt_tokens = count_prompt_tokens(tokenizer, plain, text, args.features, args.stories)
+        stats = caches[-1].stats()
+        prefilled = prompt_tokens - stats["tokens_reused"] + stats["tokens_prefilled"]
+        print(
+            f"{name:<16} {summarize(plain_t)['median_s']:>10.3f} {summarize(cached_t)['median_s']:>8.3f} "
+            f"{prompt_tokens:>10} {prefilled:>10}  {plain == cached}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# bench_prompt_lookup.py
+"""
+Prompt-lookup speculative decoding (backend/speculative.py) vs plain greedy.
+
+    python benchmarks/bench_prompt_lookup.py [--model-dir DIR] [--docs 3] [--draft 10]
+
+For the epic, feature and story prompts of every clean_text/ document
+(story prompts use the features the model generated), decodes each prompt
+with generate_scored with and without prompt_lookup and reports per stage:
+generated tokens, draft acceptance rate (accepted / proposed), tokens per
+forward pass, seconds of both modes, the speedup and whether the token ids
+are identical. Then runs the whole titles pipeline (stories unbatched, as
+in the streaming endpoint) both ways and checks the backlogs match.
+
+A random model's acceptance comes from its own repetition loops rather
+than from copying the project text, so pass --model-dir for the numbers
+that matter.
+"""
+
+import time
+import argparse
+from collections import defaultdict
+
+from common import load_model, load_clean_texts, time_call, summarize
+
+from scored_generation import generate_scored
+from speculative import prompt_lookup_generate
+from titles import (
+    _epic_title_prompt,
+    _feature_titles_prompt,
+    _story_titles_prompt,
+    _parse_feature_titles,
+    run_agileai_titles_only_with_report,
+)
+
+# (stage, max_new_tokens) as in titles.py
+STAGES = (("epic", 40), ("features", 120), ("stories", 120))
+
+
+def stage_prompts(model, tokenizer, text, num_features, num_stories):
+    epic = {"title": generate_scored(model, tokenizer, _epic_title_prompt(text), max_new_tokens=40)["completion"]}
+    feature_rec = generate_scored(model, tokenizer, _feature_titles_prompt(text, num_features), max_new_tokens=120)
+    features, _, _ = _parse_feature_titles(feature_rec, num_features)
+    return {
+        "epic": [_epic_title_prompt(text)],
+        "features": [_feature_titles_prompt(text, num_features)],
+        "stories": [_story_titles_prompt(text, epic, feat, num_stories) for feat in features],
+    }
+
+
+def print_row(label, t):
+    accept = t["accepted"] / t["proposed"] if t["proposed"] else 0.0
+    print(f"{label:<9} {int(t['prompts']):>7} {int(t['tokens']):>6} {accept:>7.1%} "
+          f"{t['generated'] / t['forward_passes']:>8.2f} {t['plain_s']:>8.2f} {t['lookup_s']:>8.2f} "
+          f"{t['plain_s'] / t['lookup_s']:>6.2f}x  {int(t['same'])}/{int(t['prompts'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--features", type=int, default=3)
+    parser.add_argument("--stories", type=int, default=3)
+    parser.add_argument("--draft", type=int, default=10, help="max draft tokens per step")
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir)
+    docs = load_clean_texts(limit=args.docs)
+
+    totals = defaultdict(lambda: defaultdict(float))
+    for name, text in docs:
+        prompts = stage_prompts(model, tokenizer, text, args.features, args.stories)
+        for stage, max_new_tokens in STAGES:
+            t = totals[stage]
+            for prompt in prompts[stage]:
+                plain, plain_s = time_call(
+                    lambda: generate_scored(model, tokenizer, prompt, max_new_tokens=max_new_tokens),
+                    repeats=args.repeats,
+                )
+                lookup, lookup_s = time_call(
+                    lambda: generate_scored(
+                        model, tokenizer, prompt, max_new_tokens=max_new_tokens, prompt_lookup=args.draft,
+                    ),
+                    repeats=args.repeats,
+                )
+                input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"].to(model.device)
+                outputs, stats = prompt_lookup_generate(
+                    model, input_ids, tokenizer.eos_token_id, max_new_tokens, max_draft=args.draft,
+                )
+                t["prompts"] += 1
+                t["tokens"] += len(plain["token_ids"])
+                t["same"] += plain["token_ids"] == lookup["token_ids"]
+                t["proposed"] += stats["proposed"]
+                t["accepted"] += stats["accepted"]
+                t["forward_passes"] += stats["forward_passes"]
+                t["generated"] += outputs.sequences.shape[1] - input_ids.shape[1]
+                t["plain_s"] += summarize(plain_s)["median_s"]
+                t["lookup_s"] += summarize(lookup_s)["median_s"]
+
+    print(f"{len(docs)} documents, up to {args.draft} draft tokens per step")
+    print(f"{'stage':<9} {'prompts':>7} {'tokens':>6} {'accept':>7} {'tok/pass':>8} "
+          f"{'plain_s':>8} {'lookup_s':>8} {'speedup':>7}  same")
+    overall = defaultdict(float)
+    for stage, _ in STAGES:
+        for key, value in totals[stage].items():
+            overall[key] += value
+        print_row(stage, totals[stage])
+    print_row("all", overall)
+
+    # whole pipeline, stories one feature at a time
+    run = dict(num_features=args.features, stories_per_feature=args.stories, batch_stories=False)
+    same, plain_total, lookup_total = 0, 0.0, 0.0
+    for _, text in docs:
+        start = time.perf_counter()
+        plain, _ = run_agileai_titles_only_with_report(model, tokenizer, text, **run)
+        plain_total += time.perf_counter() - start
+        start = time.perf_counter()
+        lookup, _ = run_agileai_titles_only_with_report(model, tokenizer, text, prompt_lookup=args.draft, **run)
+        lookup_total += time.perf_counter() - start
+        same += plain == lookup
+    print(f"titles pipeline: plain {plain_total:.2f}s, prompt lookup {lookup_total:.2f}s "
+          f"({plain_total / lookup_total:.2f}x), same backlog: {same}/{len(docs)}")
+
+
+if __name__ == "__main__":
+    main()
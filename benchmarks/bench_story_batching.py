@@ -0,0 +1,71 @@
+# bench_story_batching.py
+"""
+Story stage latency: one generate() per feature vs. one batched generate().
+
+    python benchmarks/bench_story_batching.py [--model-dir DIR] [--docs 3]
+
+Also checks that both paths return the same story titles.
+"""
+
+import argparse
+
+from common import load_model, load_clean_texts, time_call, summarize
+
+from titles import (
+    generate_epic_title,
+    generate_feature_titles,
+    generate_story_titles_for_feature,
+    generate_story_titles_batched,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--docs", type=int, default=3, help="number of clean_text documents")
+    parser.add_argument("--features", type=int, default=5)
+    parser.add_argument("--stories", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir)
+
+    print(f"{'document':<16} {'serial_s':>9} {'batched_s':>10} {'speedup':>8}  same")
+    total_serial = total_batched = 0.0
+    for name, text in load_clean_texts(limit=args.docs):
+        epic = generate_epic_title(model, tokenizer, text)
+        features, _, _ = generate_feature_titles(
+            model, tokenizer, text, epic, num_features=args.features
+        )
+
+        serial, serial_t = time_call(
+            lambda: [
+                generate_story_titles_for_feature(
+                    model, tokenizer, text, epic, feat, num_stories=args.stories
+                )
+                for feat in features
+            ],
+            repeats=args.repeats,
+        )
+        batched, batched_t = time_call(
+            lambda: generate_story_titles_batched(
+                model, tokenizer, text, epic, features, num_stories=args.stories
+            ),
+            repeats=args.repeats,
+        )
+
+        same = all(
+            [s["title"] for s in a[0]] == [s["title"] for s in b[0]]
+            for a, b in zip(serial, batched)
+        )
+        s_med = summarize(serial_t)["median_s"]
+        b_med = summarize(batched_t)["median_s"]
+        total_serial += s_med
+        total_batched += b_med
+        print(f"{name:<16} {s_med:>9.3f} {b_med:>10.3f} {s_med / b_med:>7.2f}x  {same}")
+
+    print(f"{'total':<16} {total_serial:>9.3f} {total_batched:>10.3f} {total_serial / total_batched:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
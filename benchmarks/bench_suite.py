@@ -0,0 +1,235 @@
+# bench_suite.py
+"""
+CPU benchmark suite with stored baselines: ingestion, cleaning, generation and UI build.
+
+    python benchmarks/bench_suite.py                      # compare with benchmarks/baselines.json
+    python benchmarks/bench_suite.py --update-baseline    # record the current numbers
+    python benchmarks/bench_suite.py --only generation --threshold 0.3
+
+Fixtures come from the repo: dataset/*.pdf (ingestion and the raw text for
+cleaning), clean_text/*_clean.txt (generation prompts) and training_eg/*.json
+(backlogs for the results page). Generation runs on the tiny randomly
+initialized Llama of common.py (agileai_merged_model_v1/config.json, shrunk),
+so nothing is downloaded.
+
+Every case is timed with time_call (warmup + --repeats samples; a fast case
+is looped so one sample takes at least --min-sample seconds) and its best
+sample compared with the stored baseline, the minimum being the statistic
+least disturbed by other load on the machine. A case slower than baseline x
+(1 + --threshold) is flagged REGRESSION and the script exits with status 1,
+so it can gate a change. Baselines are per machine: record them on the
+machine that runs the comparison.
+
+The focused scripts next to this one (bench_cleaning.py, bench_line_stopping.py,
+...) check one optimization each against its reference; this suite tracks the
+end-to-end numbers over time.
+"""
+
+import io
+import os
+import sys
+import json
+import glob
+import argparse
+import platform
+import contextlib
+
+from common import REPO_ROOT, load_model, load_clean_texts, time_call, summarize
+
+import torch
+
+from preprocess import extract_project_text, extract_text_from_pdf, clean_project_text
+from cleaning import clean_text_pipeline_with_toc_removal
+from scored_generation import generate_text_and_confidence
+from titles import _epic_title_prompt, run_agileai_titles_only_with_report
+from backlog_json import parse_json_safely
+from json_stream import BacklogStreamParser
+
+APP_DIR = os.path.join(REPO_ROOT, "app")
+DATASET_DIR = os.path.join(REPO_ROOT, "dataset")
+TRAINING_EG_DIR = os.path.join(REPO_ROOT, "training_eg")
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines.json")
+
+
+# ----------------- CASES ----------------- #
+
+def ingestion_cases(args):
+    pdfs = sorted(glob.glob(os.path.join(DATASET_DIR, "*.pdf")))[:args.pdfs]
+    return {
+        "ingestion/extract_project_text": lambda: [extract_project_text(p) for p in pdfs],
+        "ingestion/extract_project_text_800": lambda: [extract_project_text(p, max_chars=800) for p in pdfs],
+    }
+
+
+def cleaning_cases(args):
+    pdfs = sorted(glob.glob(os.path.join(DATASET_DIR, "*.pdf")))[:args.pdfs]
+    raw = [extract_text_from_pdf(p) for p in pdfs]
+    return {
+        "cleaning/clean_project_text": lambda: [clean_project_text(t) for t in raw],
+        "cleaning/toc_removal_pipeline": lambda: [clean_text_pipeline_with_toc_removal(t) for t in raw],
+    }
+
+
+def generation_cases(args):
+    model, tokenizer = load_model()
+    docs = load_clean_texts(limit=args.docs)
+    prompts = [_epic_title_prompt(text) for _, text in docs]
+    return {
+        "generation/generate_text_and_confidence": lambda: [
+            generate_text_and_confidence(model, tokenizer, p, max_new_tokens=40) for p in prompts
+        ],
+        "generation/titles_pipeline": lambda: [
+            run_agileai_titles_only_with_report(
+                model, tokenizer, text, num_features=3, stories_per_feature=2, stop_early=True,
+            )
+            for _, text in docs
+        ],
+    }
+
+
+def _training_examples():
+    examples = []
+    for path in sorted(glob.glob(os.path.join(TRAINING_EG_DIR, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            examples.append(json.load(f))
+    return examples
+
+
+def json_cases(args):
+    texts = [json.dumps(e, indent=2, ensure_ascii=False) for e in _training_examples()]
+
+    def parse_all():
+        # parse_json_safely prints a line per document
+        with contextlib.redirect_stdout(io.StringIO()):
+            return [parse_json_safely(t) for t in texts]
+
+    def stream_parse():
+        for text in texts:
+            parser = BacklogStreamParser()
+            parser.feed(text)
+
+    return {
+        "json/parse_json_safely": parse_all,
+        "json/stream_parser": stream_parse,
+    }
+
+
+def ui_cases(args):
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import results
+
+    examples = _training_examples()
+    return {
+        "ui/build_results_app": results.build_results_app,
+        "ui/results_tree_html": lambda: [
+            results.results_tree_html(results.new_view(e, proj_key=str(i))) for i, e in enumerate(examples)
+        ],
+    }
+
+
+GROUPS = {
+    "ingestion": ingestion_cases,
+    "cleaning": cleaning_cases,
+    "generation": generation_cases,
+    "json": json_cases,
+    "ui": ui_cases,
+}
+
+
+def looped(fn, min_sample_s: float):
+    """
+    `fn` repeated often enough that one call takes >= min_sample_s; returns
+    (looped fn, loops). Sample times are divided by `loops` afterwards.
+    """
+    _, samples = time_call(fn, repeats=1)
+    loops = max(1, int(min_sample_s / max(samples[0], 1e-9)) + 1) if samples[0] < min_sample_s else 1
+
+    def run():
+        for _ in range(loops):
+            result = fn()
+        return result
+
+    return run, loops
+
+
+# ----------------- BASELINES ----------------- #
+
+def machine_info() -> dict:
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_baselines(path: str = BASELINE_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"machine": None, "cases": {}}
+
+
+def save_baselines(results: dict, path: str = BASELINE_PATH):
+    baselines = load_baselines(path)
+    baselines["machine"] = machine_info()
+    baselines["cases"].update(results)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="*", default=None, help=f"groups to run ({', '.join(GROUPS)})")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown over the baseline")
+    parser.add_argument("--min-sample", type=float, default=0.2, help="seconds; fast cases are looped up to this")
+    parser.add_argument("--pdfs", type=int, default=3, help="dataset/ PDFs per ingestion / cleaning case")
+    parser.add_argument("--docs", type=int, default=2, help="clean_text/ documents per generation case")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    groups = args.only or list(GROUPS)
+    baselines = load_baselines(args.baseline)
+    if baselines["machine"] and baselines["machine"] != machine_info() and not args.update_baseline:
+        print(f"⚠️ Baselines were recorded on {baselines['machine']}; timings may not compare.")
+
+    results = {}
+    regressions = []
+    print(f"{'case':<44} {'median_s':>9} {'min_s':>8} {'base_min':>9} {'ratio':>6}")
+    for group in groups:
+        for name, fn in GROUPS[group](args).items():
+            fn, loops = looped(fn, args.min_sample)
+            _, samples = time_call(fn, repeats=args.repeats)
+            stats = summarize([s / loops for s in samples])
+            results[name] = {"median_s": stats["median_s"], "min_s": stats["min_s"]}
+
+            base = baselines["cases"].get(name)
+            if base is None:
+                print(f"{name:<44} {stats['median_s']:>9.4f} {stats['min_s']:>8.4f} {'-':>9} {'-':>6}")
+                continue
+            ratio = stats["min_s"] / base["min_s"]
+            flag = ""
+            if ratio > 1 + args.threshold:
+                flag = "  ❌ REGRESSION"
+                regressions.append(name)
+            elif ratio < 1 - args.threshold:
+                flag = "  ✅ faster"
+            print(f"{name:<44} {stats['median_s']:>9.4f} {stats['min_s']:>8.4f} "
+                  f"{base['min_s']:>9.4f} {ratio:>5.2f}x{flag}")
+
+    if args.update_baseline:
+        save_baselines(results, args.baseline)
+        print(f"✅ Baselines saved to {args.baseline}")
+    elif regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# bench_training_data.py
+"""
+Training throughput: the notebook's pad-to-1024 collator vs dynamic padding
+vs sample packing, all with the notebook's LoRA setup.
+
+    python benchmarks/bench_training_data.py [--model-dir DIR] [--examples 48]
+
+Training pairs are the clean_text/ documents, labelled round-robin with the
+backlogs in training_eg/ (only lengths matter here). Each mode runs one
+epoch of optimizer steps over the same examples. Reports steps, real (non
+pad) tokens, supervised tokens and effective tokens/sec, i.e. real tokens
+per second of training.
+"""
+
+import os
+import json
+import time
+import argparse
+from glob import glob
+
+import torch
+
+from common import REPO_ROOT, load_model, load_clean_texts
+
+from training_data import (
+    IGNORE_INDEX,
+    build_title_examples,
+    tokenize_example,
+    pack_examples,
+    DynamicPaddingCollator,
+    PackedCollator,
+    check_packed_attention,
+)
+
+MAX_LEN = 1024
+
+
+def load_training_pairs():
+    labels = []
+    for path in sorted(glob(os.path.join(REPO_ROOT, "training_eg", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for feat in data.get("features", []):
+            feat.setdefault("user_stories", feat.get("stories", []))
+        labels.append(data)
+    return [
+        {"project_text": text, "label_json": labels[i % len(labels)]}
+        for i, (_, text) in enumerate(load_clean_texts())
+    ]
+
+
+# The notebook's tokenization + collator (training.ipynb, "Training" section)
+def notebook_tokenize(tokenizer, example):
+    encoded = tokenizer(
+        example["prompt"] + example["completion"],
+        max_length=MAX_LEN,
+        truncation=True,
+        padding="max_length",
+    )
+    return {"input_ids": encoded["input_ids"], "attention_mask": encoded["attention_mask"]}
+
+
+def notebook_collator(features):
+    batch = {
+        "input_ids": [f["input_ids"] for f in features],
+        "attention_mask": [f["attention_mask"] for f in features],
+    }
+    batch["labels"] = [f["input_ids"] for f in features]
+    batch = {k: torch.tensor(v) for k, v in batch.items()}
+    return batch
+
+
+def with_lora(model):
+    from peft import LoraConfig, get_peft_model
+
+    lora_config = LoraConfig(
+        r=16,
+        lora_alpha=32,
+        target_modules=["q_proj", "v_proj"],
+        lora_dropout=0.05,
+        bias="none",
+        task_type="CAUSAL_LM",
+    )
+    return get_peft_model(model, lora_config)
+
+
+def train_epoch(model, batches):
+    model.train()
+    optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=1e-4)
+    start = time.perf_counter()
+    for batch in batches:
+        loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", default=None, help="checkpoint to load (default: tiny random Llama)")
+    parser.add_argument("--examples", type=int, default=48)
+    parser.add_argument("--batch-size", type=int, default=1, help="dynamic padding batch size (notebook: 1)")
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model_dir)
+    examples = build_title_examples(load_training_pairs())[:args.examples]
+    print(f"{len(examples)} examples")
+
+    packed_ok = check_packed_attention(model, tokenizer)
+    print(f"packed attention isolates examples: {packed_ok}")
+    model = with_lora(model)
+
+    tokenized = [tokenize_example(tokenizer, ex, MAX_LEN) for ex in examples]
+    real = sum(len(t["input_ids"]) for t in tokenized)
+    supervised = sum(sum(l != IGNORE_INDEX for l in t["labels"]) for t in tokenized)
+
+    # notebook: batch of 1, padded to 1024, loss on everything
+    notebook = [notebook_collator([notebook_tokenize(tokenizer, ex)]) for ex in examples]
+
+    # dynamic padding, length-grouped batches
+    dyn_collator = DynamicPaddingCollator(tokenizer.pad_token_id)
+    by_len = sorted(tokenized, key=lambda t: len(t["input_ids"]))
+    dynamic = [
+        dyn_collator(by_len[i:i + args.batch_size])
+        for i in range(0, len(by_len), args.batch_size)
+    ]
+
+    notebook_real = sum(int(b["attention_mask"].sum()) for b in notebook)
+    modes = [("notebook", notebook, notebook_real, sum(int(b["labels"].numel()) for b in notebook)),
+             ("dynamic", dynamic, real, supervised)]
+    if packed_ok:
+        packed_collator = PackedCollator(tokenizer.pad_token_id)
+        packed = [packed_collator([row]) for row in pack_examples(tokenized, MAX_LEN)]
+        modes.append(("packed", packed, real, supervised))
+
+    print(f"{'mode':<9} {'steps':>5} {'seq_tokens':>10} {'real_tokens':>11} {'loss_tokens':>11} "
+          f"{'seconds':>8} {'eff_tok/s':>9} {'speedup':>7}")
+    base = None
+    for name, batches, n_real, n_loss in modes:
+        seq_tokens = sum(int(b["input_ids"].numel()) for b in batches)
+        seconds = train_epoch(model, batches)
+        rate = n_real / seconds
+        base = base or rate
+        print(f"{name:<9} {len(batches):>5} {seq_tokens:>10} {n_real:>11} {n_loss:>11} "
+              f"{seconds:>8.1f} {rate:>9.0f} {rate / base:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
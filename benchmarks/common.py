@@ -0,0 +1,114 @@
+# common.py
+"""
+Shared helpers for the benchmark scripts.
+
+Generation benchmarks run on CPU against either a real checkpoint
+(`--model-dir`) or, by default, a tiny randomly initialized Llama that keeps
+the architecture of agileai_merged_model_v1/config.json but shrinks its
+width and depth, so they need no weight download.
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+MERGED_MODEL_DIR = os.path.join(REPO_ROOT, "agileai_merged_model_v1")
+CLEAN_TEXT_DIR = os.path.join(REPO_ROOT, "clean_text")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Scaled-down copy of the TinyLlama shape (same vocab, rope and head ratios)
+TINY_OVERRIDES = {
+    "hidden_size": 256,
+    "intermediate_size": 704,
+    "num_hidden_layers": 4,
+    "num_attention_heads": 8,
+    "num_key_value_heads": 1,
+}
+
+
+def load_tokenizer(model_dir: str = MERGED_MODEL_DIR):
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+
+def build_tiny_llama(seed: int = 0):
+    """
+    Randomly initialized LlamaForCausalLM mirroring agileai_merged_model_v1.
+    """
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    with open(os.path.join(MERGED_MODEL_DIR, "config.json"), "r") as f:
+        cfg = json.load(f)
+    for key in ("_name_or_path", "architectures", "transformers_version", "torch_dtype"):
+        cfg.pop(key, None)
+    cfg.update(TINY_OVERRIDES)
+
+    torch.manual_seed(seed)
+    model = LlamaForCausalLM(LlamaConfig(**cfg))
+    model.eval()
+    return model
+
+
+def load_model(model_dir: str | None = None):
+    """
+    Returns (model, tokenizer). With no `model_dir`, the tiny random Llama.
+    """
+    if not model_dir:
+        return build_tiny_llama(), load_tokenizer()
+
+    if os.path.exists(os.path.join(model_dir, "adapter_config.json")):
+        from peft import AutoPeftModelForCausalLM
+        model = AutoPeftModelForCausalLM.from_pretrained(model_dir)
+    else:
+        from transformers import AutoModelForCausalLM
+        model = AutoModelForCausalLM.from_pretrained(model_dir)
+    model.eval()
+    return model, load_tokenizer(model_dir)
+
+
+def load_clean_texts(limit: int | None = None):
+    """
+    [(name, text)] from clean_text/*_clean.txt, sorted by name.
+    """
+    names = sorted(n for n in os.listdir(CLEAN_TEXT_DIR) if n.endswith("_clean.txt"))
+    if limit:
+        names = names[:limit]
+    docs = []
+    for name in names:
+        with open(os.path.join(CLEAN_TEXT_DIR, name), "r", encoding="utf-8") as f:
+            docs.append((name[: -len("_clean.txt")], f.read()))
+    return docs
+
+
+def time_call(fn, repeats: int = 3, warmup: int = 1):
+    """
+    Run `fn` `warmup` + `repeats` times; returns (last_result, [seconds, ...]).
+    """
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def summarize(samples):
+    return {
+        "mean_s": statistics.fmean(samples),
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+    }
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# backend/ and app/ modules import each other by bare name, as when run from
+# their folders; benchmarks/common.py builds the tiny test model
+for folder in ("backend", "app", "benchmarks"):
+    path = os.path.join(REPO_ROOT, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def tokenizer():
+    from common import load_tokenizer
+
+    return load_tokenizer()
+
+
+@pytest.fixture(scope="session")
+def tiny_model():
+    from common import build_tiny_llama
+
+    return build_tiny_llama()
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+
+import pytest
+
+from batching import MicroBatcher, QueueFullError
+
+
+def test_requests_are_grouped_into_micro_batches():
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(process, max_batch_size=3, batch_window_s=0.05)
+        batcher.start()
+        try:
+            futures = [batcher.submit(i) for i in range(5)]
+            return await asyncio.gather(*futures)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2], [3, 4]]
+
+
+def test_full_queue_rejects_instead_of_waiting():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(process, max_queue=2, max_batch_size=1, batch_window_s=0)
+        batcher.start()
+        try:
+            first = batcher.submit("running")
+            await asyncio.sleep(0.05)           # taken off the queue by the worker
+            queued = [batcher.submit("a"), batcher.submit("b")]
+            with pytest.raises(QueueFullError):
+                batcher.submit("c")
+            assert batcher.qsize() == 2
+            release.set()
+            return await asyncio.gather(first, *queued)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == ["running", "a", "b"]
+
+
+def test_a_failing_batch_fails_its_requests_only():
+    def process(items):
+        if "bad" in items:
+            raise ValueError("boom")
+        return items
+
+    async def main():
+        batcher = MicroBatcher(process, max_batch_size=2, batch_window_s=0.05)
+        batcher.start()
+        try:
+            failed = await asyncio.gather(batcher.submit("bad"), batcher.submit("x"), return_exceptions=True)
+            ok = await batcher.submit("y")
+            return failed, ok
+        finally:
+            await batcher.stop()
+
+    failed, ok = asyncio.run(main())
+    assert all(isinstance(e, ValueError) for e in failed)
+    assert ok == "y"
+
+
+def test_cancelled_requests_are_dropped_from_the_batch():
+    seen = []
+    release = threading.Event()
+
+    def process(items):
+        seen.extend(items)
+        release.wait(5)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(process, max_batch_size=4, batch_window_s=0)
+        batcher.start()
+        try:
+            first = batcher.submit("running")
+            await asyncio.sleep(0.05)
+            gone, kept = batcher.submit("gone"), batcher.submit("kept")
+            gone.cancel()
+            release.set()
+            return await first, await kept
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == ("running", "kept")
+    assert "gone" not in seen
+
+
+def test_run_exclusive_shares_the_batch_thread():
+    threads = set()
+
+    def process(items):
+        threads.add(threading.current_thread().name)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(process)
+        batcher.start()
+        try:
+            await batcher.submit(1)
+            await batcher.run_exclusive(lambda: threads.add(threading.current_thread().name))
+        finally:
+            await batcher.stop()
+
+    asyncio.run(main())
+    assert len(threads) == 1
+    assert threads.pop().startswith("agileai-batch")
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+import torch
+
+from constrained_json import Array, JsonSchemaGrammar, TokenConstraint
+from backlog_json import BACKLOG_SCHEMA, generate_agile_output_with_report
+
+SCHEMA = {"epic": {"title": str}, "features": Array({"title": str}, min_items=2, max_items=3)}
+
+
+def accepts(grammar, text):
+    state = grammar.advance_text(grammar.start(), text)
+    return state is not None and grammar.is_done(state)
+
+
+def test_docstring_example_schema_compiles():
+    grammar = JsonSchemaGrammar({"epic": {"title": str}, "features": Array({"title": str}, 1)})
+    assert accepts(grammar, '{"epic": {"title": "E"}, "features": [{"title": "F"}]}')
+
+
+def test_grammar_accepts_the_schema():
+    grammar = JsonSchemaGrammar(SCHEMA)
+    doc = {"epic": {"title": "E"}, "features": [{"title": "a"}, {"title": 'b "quoted" \\ end'}]}
+    assert accepts(grammar, json.dumps(doc))
+    assert accepts(grammar, json.dumps(doc, indent=2))
+
+
+@pytest.mark.parametrize("text", [
+    '{"epic": {"title": "E"}, "features": [{"title": "a"}]}',                    # too few items
+    '{"epic": {"title": "E"}, "features": [{"title": "a"}, {"title": "b"}, '
+    '{"title": "c"}, {"title": "d"}]}',                                           # too many items
+    '{"epic": {"title": ""}, "features": [{"title": "a"}, {"title": "b"}]}',     # empty string
+    '{"features": [{"title": "a"}, {"title": "b"}], "epic": {"title": "E"}}',    # key order
+    '{"epic": {"title": "E"}, "features": [{"title": "a"}, {"title": "b"}]} x',  # text after the root
+])
+def test_grammar_rejects(text):
+    assert not accepts(JsonSchemaGrammar(SCHEMA), text)
+
+
+def test_completion_closes_any_prefix():
+    grammar = JsonSchemaGrammar(SCHEMA)
+    doc = json.dumps({"epic": {"title": "E"}, "features": [{"title": "a"}, {"title": "b"}]})
+    for cut in range(len(doc)):
+        state = grammar.advance_text(grammar.start(), doc[:cut])
+        closed = json.loads(doc[:cut] + grammar.completion(state))
+        assert 2 <= len(closed["features"]) <= 3
+
+
+def test_backlog_schema_enforces_the_prompt_counts():
+    grammar = JsonSchemaGrammar(BACKLOG_SCHEMA)
+    backlog = json.loads(grammar.completion(grammar.start()))
+    assert len(backlog["features"]) == 5
+    assert all(len(f["user_stories"]) == 3 for f in backlog["features"])
+
+    item = {"id": "x", "title": "x", "description": "x", "acceptance_criteria": "x"}
+    one_feature = {"epic": item, "features": [{**item, "user_stories": [item] * 3}]}
+    assert not accepts(grammar, json.dumps(one_feature))
+    eight_stories = {"epic": item, "features": [{**item, "user_stories": [item] * 8}] * 5}
+    assert not accepts(grammar, json.dumps(eight_stories))
+    five_by_three = {"epic": item, "features": [{**item, "user_stories": [item] * 3}] * 5}
+    assert accepts(grammar, json.dumps(five_by_three))
+
+
+def test_token_masks_follow_the_grammar(tokenizer):
+    constraint = TokenConstraint(JsonSchemaGrammar(SCHEMA), tokenizer)
+    state = constraint.grammar.start()
+    allowed = constraint.allowed(state)
+    for token_id in torch.nonzero(allowed).flatten().tolist()[:50]:
+        assert constraint.advance(state, token_id) is not None
+    assert not allowed[tokenizer.convert_tokens_to_ids("▁}")]
+
+
+def test_first_token_is_read_as_decode_reads_it(tokenizer):
+    # SentencePiece: "▁{" is " {" inside a sequence but "{" at its start
+    constraint = TokenConstraint(JsonSchemaGrammar(SCHEMA), tokenizer)
+    brace = tokenizer.convert_tokens_to_ids("▁{")
+    assert constraint.texts[brace] == " {"
+    assert constraint.first_texts[brace] == tokenizer.decode([brace]) == "{"
+
+    ids = tokenizer('{"epic": {"title": "A"}, "features": [{"title": "B"}, {"title": "C"}]}',
+                    add_special_tokens=False)["input_ids"]
+    assert tokenizer.convert_ids_to_tokens(ids[0]).startswith("▁")
+    decoded = tokenizer.decode(ids)
+    assert constraint.first_texts[ids[0]] + "".join(constraint.texts[i] for i in ids[1:]) == decoded
+
+
+def test_processor_tracks_the_decoded_text(tokenizer):
+    from constrained_json import SchemaLogitsProcessor
+
+    constraint = TokenConstraint(JsonSchemaGrammar(SCHEMA), tokenizer)
+    prompt = tokenizer("Backlog:", return_tensors="pt")["input_ids"]
+    # leading whitespace: the grammar must count what decode() keeps of it
+    ids = tokenizer('  {"epic": {"title": "A"}, "features": [{"title": "B"}, {"title": "C"}]}',
+                    add_special_tokens=False)["input_ids"]
+    processor = SchemaLogitsProcessor(constraint)
+    scores = torch.zeros(1, len(tokenizer))
+    for n in range(len(ids)):
+        input_ids = torch.cat([prompt, torch.tensor([ids[:n]], dtype=torch.long)], dim=1)
+        masked = processor(input_ids, scores.clone())
+        assert masked[0, ids[n]] == 0, tokenizer.convert_ids_to_tokens(ids[n])
+        expected = constraint.grammar.advance_text(constraint.grammar.start(), tokenizer.decode(ids[:n]))
+        assert processor.states[0] == expected
+    processor.sync(torch.cat([prompt, torch.tensor([ids])], dim=1))
+    assert processor.done(0)
+
+
+@pytest.mark.parametrize("max_new_tokens", [5, 60])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_constrained_output_always_parses(tiny_model, tokenizer, max_new_tokens, seed):
+    torch.manual_seed(seed)
+    parsed, raw, report = generate_agile_output_with_report(
+        tiny_model, tokenizer, "A farm irrigation app.",
+        constrained=True, max_new_tokens=max_new_tokens, score=True,
+    )
+    assert json.loads(raw) == parsed
+    assert report["parsed"] and report["truncated"]
+    assert len(parsed["features"]) >= 5
+    assert all(3 <= len(f["user_stories"]) <= 7 for f in parsed["features"])
+    assert 0.0 < report["confidence"] < 1.0
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import sqlite3
+import subprocess
+
+import pytest
+
+from feedback_store import FeedbackStore, project_key, item_key
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT project_key, item_type, item_key, label, direction FROM votes").fetchall()
+    finally:
+        conn.close()
+
+
+def test_keys_are_stable_and_scoped_to_the_project():
+    pk = project_key("Build  an\nonline shop")
+    assert pk == project_key("Build an online shop")
+    assert pk != project_key("Build a bookshop")
+    assert item_key(pk, "feature", "Checkout") == item_key(pk, "feature", "  checkout ")
+    assert item_key(pk, "feature", "Checkout") != item_key(project_key("other"), "feature", "Checkout")
+    assert item_key(pk, "story", "Checkout", "Pay") != item_key(pk, "story", "Cart", "Pay")
+
+
+def test_record_counts_in_memory_without_touching_disk(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    store = FeedbackStore(path, flush_interval_s=3600)
+    pk = project_key("project")
+    key = item_key(pk, "feature", "Checkout")
+
+    assert store.record(pk, "feature", key, "up", label="F1") == {"up": 1, "down": 0}
+    assert store.record(pk, "feature", key, "up", label="F1") == {"up": 2, "down": 0}
+    assert store.record(pk, "feature", key, "down", label="F1") == {"up": 2, "down": 1}
+    assert store.counts(key) == {"up": 2, "down": 1}
+    assert store.counts("unknown") == {"up": 0, "down": 0}
+    assert store.totals() == {("feature", "up"): 2, ("feature", "down"): 1}
+    assert store.pending() == 3
+    assert rows(path) == []
+    store.close()
+
+
+def test_invalid_direction_is_rejected(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"))
+    with pytest.raises(ValueError):
+        store.record("p", "story", "k", "sideways")
+    assert store.pending() == 0
+    store.close()
+
+
+def test_flush_writes_the_buffer_in_one_batch(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    store = FeedbackStore(path, flush_interval_s=3600)
+    store.record("p", "story", "k1", "up", label="F1-S1")
+    store.record("p", "story", "k2", "down", label="F1-S2")
+
+    assert store.flush() == 2
+    assert store.pending() == 0
+    assert store.flush() == 0
+    assert sorted(rows(path)) == [("p", "story", "k1", "F1-S1", "up"), ("p", "story", "k2", "F1-S2", "down")]
+    store.close()
+
+
+def test_failed_flush_keeps_the_votes_buffered(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    store = FeedbackStore(path, flush_interval_s=3600)
+    store.record("p", "story", "k1", "up")
+    store.record("p", "story", "k2", "down")
+
+    # the write fails: the table is gone
+    other = sqlite3.connect(path)
+    other.execute("ALTER TABLE votes RENAME TO votes_moved")
+    other.commit()
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    assert store.pending() == 2
+
+    store.record("p", "story", "k3", "up")
+    other.execute("ALTER TABLE votes_moved RENAME TO votes")
+    other.commit()
+    other.close()
+    assert store.flush() == 3
+    # the failed batch is written before the newer vote
+    assert [r[2] for r in rows(path)] == ["k1", "k2", "k3"]
+    store.close()
+
+
+def test_full_buffer_wakes_the_flusher(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    store = FeedbackStore(path, flush_interval_s=3600, max_buffer=3)
+    for _ in range(3):
+        store.record("p", "epic", "k", "up")
+    deadline = time.monotonic() + 5
+    while len(rows(path)) < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert store.pending() == 0
+    assert len(rows(path)) == 3
+    store.close()
+
+
+def test_buffered_votes_are_on_disk_after_close(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    store = FeedbackStore(path, flush_interval_s=3600)
+    store.record("p", "feature", "k", "up")
+    store.record("p", "feature", "k", "down")
+    store.close()
+    store.close()   # idempotent (atexit calls it again)
+
+    assert len(rows(path)) == 2
+    reopened = FeedbackStore(path)
+    assert reopened.counts("k") == {"up": 1, "down": 1}
+    assert reopened.totals() == {("feature", "up"): 1, ("feature", "down"): 1}
+    reopened.close()
+
+
+def test_buffered_votes_are_flushed_at_exit(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    script = (
+        "import sys\n"
+        "from feedback_store import FeedbackStore\n"
+        "store = FeedbackStore(sys.argv[1], flush_interval_s=3600)\n"
+        "for _ in range(5):\n"
+        "    store.record('p', 'story', 'k', 'up')\n"
+        "assert store.pending() == 5\n"
+    )
+    subprocess.run([sys.executable, "-c", script, path], cwd=APP_DIR, check=True, timeout=60)
+
+    store = FeedbackStore(path)
+    assert store.counts("k") == {"up": 5, "down": 0}
+    store.close()
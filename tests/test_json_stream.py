@@ -0,0 +1,140 @@
+import json
+
+from json_stream import BacklogStreamParser
+
+
+def make_backlog(n_features=3, n_stories=3):
+    return {
+        "epic": {"id": "epic-1", "title": "Online shop", "description": "Sell online.",
+                 "acceptance_criteria": "Customers can order."},
+        "features": [
+            {
+                "id": f"feat-{i}",
+                "title": f"Feature {i}",
+                "description": f"Does thing {i}.",
+                "acceptance_criteria": f"Thing {i} works.",
+                "user_stories": [
+                    {
+                        "id": f"story-{j}",
+                        "title": f"Story {i}.{j}",
+                        "description": "As a user, I want it {\"braces\": [in strings]}.",
+                        "acceptance_criteria": ["Given A", "When B", "Then C"],
+                    }
+                    for j in range(n_stories)
+                ],
+            }
+            for i in range(n_features)
+        ],
+    }
+
+
+def feed_in_chunks(parser, text, size=7):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+def test_full_stream_matches_parsed_backlog_with_repairs():
+    backlog = make_backlog()
+    text = "Here is the backlog:\n" + json.dumps(backlog, indent=2) + "\nDone."
+    parser = BacklogStreamParser()
+    events = feed_in_chunks(parser, text)
+
+    assert parser.done and parser.satisfied()
+    assert parser.close() == []
+    assert parser.errors == []
+    assert [e["type"] for e in events] == ["epic"] + (["story"] * 3 + ["feature"]) * 3
+    assert all(e["errors"] == [] for e in events)
+
+    result = parser.backlog()
+    assert result["epic"]["id"] == "E1"
+    assert [f["id"] for f in result["features"]] == ["F1", "F2", "F3"]
+    for i, feature in enumerate(result["features"]):
+        assert feature["title"] == backlog["features"][i]["title"]
+        assert [s["id"] for s in feature["user_stories"]] == ["US1", "US2", "US3"]
+        story = feature["user_stories"][0]
+        assert story["description"] == backlog["features"][i]["user_stories"][0]["description"]
+        assert story["acceptance_criteria"] == "Given A; When B; Then C"
+
+
+def test_story_events_carry_their_feature_index():
+    parser = BacklogStreamParser()
+    events = parser.feed(json.dumps(make_backlog(n_features=2, n_stories=2)))
+    stories = [e for e in events if e["type"] == "story"]
+    assert [(e["feature_index"], e["story"]["id"]) for e in stories] == [
+        (0, "US1"), (0, "US2"), (1, "US1"), (1, "US2"),
+    ]
+
+
+def test_truncated_stream_yields_repaired_objects():
+    text = json.dumps(make_backlog(), indent=2)
+    # cut inside the second story of the third feature
+    third = text.index('"Feature 2"')
+    cut = text.index('"Story 2.1"', third) + 3
+    parser = BacklogStreamParser()
+    events = feed_in_chunks(parser, text[:cut])
+
+    assert not parser.done
+    assert [e["type"] for e in events].count("feature") == 2
+    closed = parser.close()
+    assert len(closed) == 1
+    feature = closed[0]["feature"]
+    assert feature["id"] == "F3"
+    assert feature["title"] == "Feature 2"
+    # only the story that was complete survives the cut
+    assert [s["title"] for s in feature["user_stories"]] == ["Story 2.0"]
+    assert closed[0]["errors"] == []
+    assert len(parser.backlog()["features"]) == 3
+
+
+def test_truncated_stream_without_a_story_drops_the_feature():
+    text = json.dumps(make_backlog(), indent=2)
+    cut = text.index('"user_stories"', text.index('"Feature 1"'))
+    parser = BacklogStreamParser()
+    parser.feed(text[:cut])
+    assert parser.close() == []
+    assert [f["id"] for f in parser.backlog()["features"]] == ["F1"]
+
+
+def test_limits_stop_early_and_close_the_last_feature():
+    parser = BacklogStreamParser(num_features=2, stories_per_feature=2)
+    text = json.dumps(make_backlog(n_features=4, n_stories=3))
+    fed = 0
+    while not parser.satisfied():
+        parser.feed(text[fed:fed + 5])
+        fed += 5
+    assert fed < len(text)
+    assert not parser.done
+
+    closed = parser.close()
+    features = parser.backlog()["features"]
+    assert len(closed) == 1 and closed[0]["feature"] is features[-1]
+    assert [f["id"] for f in features] == ["F1", "F2"]
+    assert [len(f["user_stories"]) for f in features] == [2, 2]
+
+
+def test_limits_ignore_extra_features_and_stories():
+    parser = BacklogStreamParser(num_features=2, stories_per_feature=1)
+    events = parser.feed(json.dumps(make_backlog(n_features=4, n_stories=3)))
+    assert [e["type"] for e in events] == ["epic", "story", "feature", "story", "feature"]
+    assert parser.close() == []
+    assert [len(f["user_stories"]) for f in parser.backlog()["features"]] == [1, 1]
+
+
+def test_invalid_objects_are_recorded_and_skipped():
+    text = (
+        '{"epic": {"id": "E1", "title": "", "description": "d", "acceptance_criteria": "a"}, '
+        '"features": [{"id": "F1", "title": "t", "description": "d", "acceptance_criteria": "a", '
+        '"user_stories": [{"id": "US1", "title": bogus}]}]}'
+    )
+    parser = BacklogStreamParser()
+    events = parser.feed(text)
+
+    epic = events[0]
+    assert epic["type"] == "epic"
+    assert epic["errors"] == ["epic.title must be a non-empty string"]
+    assert any(e.startswith("story 0 is not valid JSON") for e in parser.errors)
+    assert any(e.startswith("feature 0 is not valid JSON") for e in parser.errors)
+    assert parser.done
+    assert parser.backlog()["features"] == []
@@ -0,0 +1,81 @@
+import pytest
+
+from common import load_clean_texts
+from packing import STAGE_TOKEN_BUDGETS, PromptPacker, split_sections
+
+
+def count(tokenizer, text):
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def test_split_sections_keeps_headings_with_their_text():
+    text = (
+        "AquaGuard for fish farms.\n\n"
+        "1. INTRODUCTION\n\nWater quality matters.\nIt changes fast.\n\n"
+        "2. FEATURES\nAlerts on phones.\n\n"
+        "3. EMPTY\n\n"
+        "4. REFERENCES\n[1] Someone, 2020.\n"
+    )
+    assert split_sections(text) == [
+        "AquaGuard for fish farms.",
+        "1. INTRODUCTION\nWater quality matters.\nIt changes fast.",
+        "2. FEATURES\nAlerts on phones.",
+    ]
+
+
+@pytest.fixture(scope="module")
+def documents():
+    return [text for _, text in load_clean_texts(limit=4)]
+
+
+@pytest.mark.parametrize("stage", list(STAGE_TOKEN_BUDGETS))
+def test_contexts_fit_the_stage_budget(tokenizer, documents, stage):
+    packer = PromptPacker(tokenizer)
+    for text in documents:
+        context = packer.pack(text, stage, query="notifications")
+        assert context
+        assert count(tokenizer, context) <= STAGE_TOKEN_BUDGETS[stage]
+
+
+def test_every_context_starts_with_the_same_lead(tokenizer, documents):
+    packer = PromptPacker(tokenizer)
+    text = documents[0]
+    contexts = [
+        packer.pack(text, "epic"),
+        packer.pack(text, "features"),
+        packer.pack(text, "stories", query="login"),
+        packer.pack(text, "stories", query="payment"),
+    ]
+    lead = text.strip().splitlines()[0]
+    assert all(c.startswith(lead) for c in contexts)
+
+
+def test_chunks_come_in_document_order_and_follow_the_query(tokenizer):
+    sections = [
+        "Intro: a farm app.",
+        "Weather forecasts for every field, updated hourly.",
+        "Invoices and payments for the shop, with receipts.",
+        "Irrigation schedules from the weather forecast.",
+    ]
+    text = "\n\n".join(sections)
+    packer = PromptPacker(tokenizer, budgets={"stories": 40}, lead_tokens=8)
+    context = packer.pack(text, "stories", query="weather forecast")
+    assert context.startswith(sections[0])
+    assert sections[1] in context and sections[3] in context
+    assert sections[2] not in context
+    assert context.index(sections[1]) < context.index(sections[3])
+
+
+def test_an_oversized_single_chunk_is_cut_to_the_budget(tokenizer):
+    text = " ".join(["irrigation"] * 300)
+    packer = PromptPacker(tokenizer, budgets={"epic": 50})
+    context = packer.pack(text, "epic")
+    assert 0 < count(tokenizer, context) <= 50
+    assert text.startswith(context)
+
+
+def test_empty_text_and_fingerprint(tokenizer):
+    packer = PromptPacker(tokenizer)
+    assert packer.pack("", "epic") == ""
+    assert packer.pack(None, "epic") == ""
+    assert packer.fingerprint != PromptPacker(tokenizer, lead_tokens=32).fingerprint
@@ -0,0 +1,90 @@
+import pytest
+import torch
+
+from prefix_cache import PrefixKVCache, common_prefix_len
+from prompts import project_prefix, truncate
+from scored_generation import generate_scored, generate_scored_batch
+from titles import run_agileai_titles_only_with_report
+
+PROJECT = (
+    "AquaGuard monitors water quality in fish farms. Sensors report pH, oxygen and "
+    "temperature every minute. Farmers get alerts on their phones and see trends on a dashboard."
+)
+PREFIX = project_prefix(truncate(PROJECT))
+SUFFIXES = ["\nEpic title:", "\nList 3 feature titles, one per line:\n", "\nStories for Alerts:"]
+
+
+def test_common_prefix_len():
+    assert common_prefix_len([1, 2, 3], [1, 2, 4, 5]) == 2
+    assert common_prefix_len([1, 2], [1, 2, 3]) == 2
+    assert common_prefix_len([], [1]) == 0
+
+
+def test_fork_continues_like_a_plain_prefill(tiny_model, tokenizer):
+    cache = PrefixKVCache()
+    ids = tokenizer(PREFIX + SUFFIXES[0])["input_ids"]
+    kv, n_cached = cache.fork(tiny_model, tokenizer, PREFIX, [ids])
+    assert 0 < n_cached < len(ids)
+
+    with torch.no_grad():
+        plain = tiny_model(input_ids=torch.tensor([ids])).logits[0, n_cached:]
+        forked = tiny_model(input_ids=torch.tensor([ids[n_cached:]]), past_key_values=kv).logits[0]
+    torch.testing.assert_close(forked, plain, atol=1e-4, rtol=1e-4)
+
+
+def test_forks_are_private_copies(tiny_model, tokenizer):
+    cache = PrefixKVCache()
+    ids = tokenizer(PREFIX + SUFFIXES[1])["input_ids"]
+    kv, n_cached = cache.fork(tiny_model, tokenizer, PREFIX, [ids])
+    with torch.no_grad():
+        tiny_model(input_ids=torch.tensor([ids[n_cached:]]), past_key_values=kv)
+    assert kv.get_seq_length() == len(ids)
+
+    again, _ = cache.fork(tiny_model, tokenizer, PREFIX, [ids])
+    assert again.get_seq_length() == n_cached
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["tokens_reused"] == 2 * n_cached
+
+
+def test_scored_generation_is_the_same_with_the_cache(tiny_model, tokenizer):
+    cache = PrefixKVCache()
+    for suffix in SUFFIXES:
+        prompt = PREFIX + suffix
+        plain = generate_scored(tiny_model, tokenizer, prompt, max_new_tokens=10)
+        cached = generate_scored(tiny_model, tokenizer, prompt, max_new_tokens=10,
+                                 prefix_cache=cache, prefix_text=PREFIX)
+        assert cached["token_ids"] == plain["token_ids"]
+        assert cached["token_log_probs"] == pytest.approx(plain["token_log_probs"], abs=1e-4)
+    assert cache.stats()["hits"] == len(SUFFIXES) - 1
+
+
+def test_batched_forks_match_a_plain_prefill(tiny_model, tokenizer):
+    # suffixes of different lengths: the padding goes between prefix and suffix
+    prompts = [PREFIX + s for s in SUFFIXES]
+    plain = generate_scored_batch(tiny_model, tokenizer, prompts, max_new_tokens=10)
+    cached = generate_scored_batch(tiny_model, tokenizer, prompts, max_new_tokens=10,
+                                   prefix_cache=PrefixKVCache(), prefix_text=PREFIX)
+    for p, c in zip(plain, cached):
+        assert c["token_ids"] == p["token_ids"]
+        assert c["token_log_probs"] == pytest.approx(p["token_log_probs"], abs=1e-4)
+
+
+def test_lru_is_bounded(tiny_model, tokenizer):
+    cache = PrefixKVCache(max_entries=2)
+    for i in range(3):
+        prefix = project_prefix(f"Project number {i}.")
+        cache.fork(tiny_model, tokenizer, prefix, [tokenizer(prefix + "\nEpic title:")["input_ids"]])
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["misses"] == 3
+
+
+def test_titles_pipeline_is_the_same_with_the_cache(tiny_model, tokenizer):
+    run = dict(num_features=2, stories_per_feature=2)
+    plain, _ = run_agileai_titles_only_with_report(tiny_model, tokenizer, PROJECT, **run)
+    cache = PrefixKVCache()
+    cached, _ = run_agileai_titles_only_with_report(tiny_model, tokenizer, PROJECT, prefix_cache=cache, **run)
+    assert cached == plain
+    assert cache.stats()["hits"] >= 2
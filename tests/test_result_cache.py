@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from result_cache import ResultCache
+
+
+def make_compute(calls, value=None, gate=None, error=None):
+    async def compute():
+        calls.append(1)
+        if gate is not None:
+            await gate.wait()
+        if error is not None:
+            raise error
+        return value
+    return compute
+
+
+def test_concurrent_identical_requests_compute_once(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    calls = []
+
+    async def main():
+        gate = asyncio.Event()
+        compute = make_compute(calls, {"answer": 42}, gate)
+        waiters = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(8)]
+        await asyncio.sleep(0.05)
+        gate.set()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert results == [{"answer": 42}] * 8
+    assert cache.stats()["inflight_joins"] == 7
+    assert cache.stats()["inflight"] == 0
+    assert (tmp_path / "k.json").exists()
+
+
+def test_cancelled_leader_does_not_fail_joiners(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    calls = []
+
+    async def main():
+        gate = asyncio.Event()
+        compute = make_compute(calls, {"answer": 42}, gate)
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.05)
+        joiner = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await joiner
+
+    assert asyncio.run(main()) == {"answer": 42}
+    assert calls == [1]
+    assert cache.get("k") == {"answer": 42}
+
+
+def test_exceptions_are_shared_and_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    calls = []
+
+    async def main():
+        gate = asyncio.Event()
+        compute = make_compute(calls, gate=gate, error=RuntimeError("boom"))
+        waiters = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        gate.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.get("k") is None
+
+    assert asyncio.run(cache.get_or_compute("k", make_compute(calls, "second"))) == "second"
+    assert calls == [1, 1]
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    calls = []
+    first = ResultCache(str(tmp_path))
+    asyncio.run(first.get_or_compute("k", make_compute(calls, {"answer": 42})))
+
+    second = ResultCache(str(tmp_path))
+    assert asyncio.run(second.get_or_compute("k", make_compute(calls, "unused"))) == {"answer": 42}
+    assert calls == [1]
+    assert second.stats()["disk_hits"] == 1
@@ -0,0 +1,59 @@
+import math
+
+import pytest
+import torch
+from transformers.generation.utils import GenerateDecoderOnlyOutput
+
+from scored_generation import (
+    EMPTY_MEAN_LOG_PROB,
+    generate_scored,
+    score_generated_sequences,
+)
+
+PROMPTS = [
+    "Project description:\nA mobile app for farmers.\n\nEpic title:",
+    "Project description:\nAn online shop that sells books, e-books and audio books.\n\nFeature titles:",
+]
+
+
+def two_pass_log_probs(model, tokenizer, prompt, token_ids):
+    # the old notebook scoring: one more forward pass over prompt + completion
+    prompt_ids = tokenizer(prompt)["input_ids"]
+    ids = torch.tensor([prompt_ids + token_ids])
+    with torch.no_grad():
+        log_probs = torch.log_softmax(model(input_ids=ids).logits.float(), dim=-1)
+    positions = range(len(prompt_ids) - 1, len(prompt_ids) - 1 + len(token_ids))
+    return [log_probs[0, p, t].item() for p, t in zip(positions, token_ids)]
+
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_single_pass_scores_match_a_second_forward_pass(tiny_model, tokenizer, prompt):
+    rec = generate_scored(tiny_model, tokenizer, prompt, max_new_tokens=12)
+    assert len(rec["token_ids"]) == 12
+    reference = two_pass_log_probs(tiny_model, tokenizer, prompt, rec["token_ids"])
+    assert rec["token_log_probs"] == pytest.approx(reference, abs=1e-4)
+    assert rec["mean_log_prob"] == pytest.approx(sum(reference) / len(reference), abs=1e-4)
+    assert rec["confidence"] == pytest.approx(1 / (1 + math.exp(-rec["mean_log_prob"])))
+    assert rec["completion"] == tokenizer.decode(rec["token_ids"], skip_special_tokens=True).strip()
+
+
+def fake_outputs(vocab, prompt_len, rows, logit_rows):
+    sequences = torch.tensor([[1] * prompt_len + row for row in rows])
+    logits = tuple(torch.tensor(step, dtype=torch.float32) for step in logit_rows)
+    assert all(step.shape == (len(rows), vocab) for step in logits)
+    return GenerateDecoderOnlyOutput(sequences=sequences, logits=logits)
+
+
+def test_scoring_stops_at_the_first_eos(tokenizer):
+    eos = tokenizer.eos_token_id
+    vocab = max(eos, 5) + 1
+    # uniform logits: every token has log-prob -log(vocab)
+    uniform = [[0.0] * vocab] * 3
+    outputs = fake_outputs(vocab, 2, [[3, eos, 4], [3, 4, 5], [eos, 4, 4]], [uniform] * 3)
+    records = score_generated_sequences(tokenizer, outputs, prompt_len=2)
+
+    assert [r["token_ids"] for r in records] == [[3], [3, 4, 5], []]
+    assert records[0]["token_log_probs"] == pytest.approx([-math.log(vocab)])
+    assert records[1]["mean_log_prob"] == pytest.approx(-math.log(vocab))
+    assert records[2]["mean_log_prob"] == EMPTY_MEAN_LOG_PROB
+    assert records[2]["completion"] == ""
@@ -0,0 +1,76 @@
+import pytest
+import torch
+
+from prefix_cache import PrefixKVCache
+from prompts import project_prefix, truncate
+from scored_generation import generate_scored
+from speculative import find_draft, prompt_lookup_generate
+
+PROJECT = (
+    "AquaGuard monitors water quality in fish farms. Sensors report pH, oxygen and "
+    "temperature every minute. Farmers get alerts on their phones and see trends on a dashboard."
+)
+PROMPTS = [
+    project_prefix(truncate(PROJECT)) + "\nEpic title:",
+    "Water quality, water quality, water quality and fish farms. Fish farms and water quality:",
+]
+
+
+def test_find_draft_copies_what_followed_the_latest_match():
+    assert find_draft([1, 2, 3, 9, 1, 2, 3, 8, 1, 2, 3], max_draft=2) == [8, 1]
+    # the longest suffix n-gram wins over a later shorter match
+    assert find_draft([1, 2, 9, 2, 8, 1, 2], max_ngram=2) == [9, 2, 8, 1, 2]
+    assert find_draft([1, 2, 3]) == []
+    assert find_draft([4]) == []
+
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_prompt_lookup_is_greedy_identical(tiny_model, tokenizer, prompt):
+    input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"]
+    with torch.no_grad():
+        greedy = tiny_model.generate(
+            input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=30, do_sample=False,
+            eos_token_id=tokenizer.eos_token_id, pad_token_id=tokenizer.pad_token_id,
+            return_dict_in_generate=True, output_logits=True,
+        )
+    outputs, stats = prompt_lookup_generate(tiny_model, input_ids, tokenizer.eos_token_id, max_new_tokens=30)
+
+    assert outputs.sequences.tolist() == greedy.sequences.tolist()
+    assert len(outputs.logits) == len(greedy.logits)
+    for ours, theirs in zip(outputs.logits, greedy.logits):
+        torch.testing.assert_close(ours, theirs, atol=1e-3, rtol=1e-3)
+    assert stats["forward_passes"] <= len(outputs.logits)
+    assert stats["accepted"] <= stats["proposed"]
+
+
+def test_prompt_lookup_accepts_drafts_and_saves_passes(tiny_model, tokenizer):
+    # the random model repeats itself, so drafts from its own output land
+    input_ids = tokenizer(PROMPTS[1], return_tensors="pt")["input_ids"]
+    outputs, stats = prompt_lookup_generate(tiny_model, input_ids, tokenizer.eos_token_id, max_new_tokens=40)
+    assert stats["accepted"] > 0
+    assert stats["forward_passes"] < len(outputs.logits)
+
+
+def test_scored_records_are_the_same_with_prompt_lookup(tiny_model, tokenizer):
+    for prompt in PROMPTS:
+        plain = generate_scored(tiny_model, tokenizer, prompt, max_new_tokens=25)
+        drafted = generate_scored(tiny_model, tokenizer, prompt, max_new_tokens=25, prompt_lookup=10)
+        assert drafted["token_ids"] == plain["token_ids"]
+        assert drafted["token_log_probs"] == pytest.approx(plain["token_log_probs"], abs=1e-4)
+
+
+def test_prompt_lookup_on_a_prefix_cache_fork(tiny_model, tokenizer):
+    prefix = project_prefix(truncate(PROJECT))
+    plain = generate_scored(tiny_model, tokenizer, PROMPTS[0], max_new_tokens=20)
+    drafted = generate_scored(
+        tiny_model, tokenizer, PROMPTS[0], max_new_tokens=20,
+        prefix_cache=PrefixKVCache(), prefix_text=prefix, prompt_lookup=10,
+    )
+    assert drafted["token_ids"] == plain["token_ids"]
+    assert drafted["token_log_probs"] == pytest.approx(plain["token_log_probs"], abs=1e-4)
+
+
+def test_prompt_lookup_decodes_one_prompt_at_a_time(tiny_model, tokenizer):
+    input_ids = torch.ones(2, 4, dtype=torch.long)
+    with pytest.raises(ValueError):
+        prompt_lookup_generate(tiny_model, input_ids, tokenizer.eos_token_id)
@@ -0,0 +1,73 @@
+import pytest
+
+from bench_line_stopping import force_line_breaks, titles_of
+from common import build_tiny_llama
+from scored_generation import generate_scored, generate_scored_batch
+from stopping import count_complete_lines
+from titles import _clean_title_line, run_agileai_titles_only_with_report
+
+PROJECT = (
+    "AquaGuard monitors water quality in fish farms. Sensors report pH, oxygen and "
+    "temperature every minute. Farmers get alerts on their phones and see trends on a dashboard."
+)
+PROMPTS = [
+    "Project description:\nA mobile app for farmers.\n\nFeature titles:\n",
+    "Stories:\n",
+]
+
+
+@pytest.fixture(scope="module")
+def lined_model(tokenizer):
+    # a random model that ends a line every 6 tokens, like one writing a title per line
+    model = build_tiny_llama(seed=1)
+    force_line_breaks(model, tokenizer, 6)
+    return model
+
+
+def test_count_complete_lines():
+    assert count_complete_lines("a\nb\nc") == 2
+    assert count_complete_lines("a\nb\n") == 2
+    assert count_complete_lines("a\n\n  \nb\n") == 2
+    assert count_complete_lines("1. Login\n2. -\n", keep=_clean_title_line) == 1
+    assert count_complete_lines("") == 0
+
+
+def test_stopped_completion_is_a_prefix_of_the_full_one(lined_model, tokenizer):
+    for prompt in PROMPTS:
+        full = generate_scored(lined_model, tokenizer, prompt, max_new_tokens=60)
+        stopped = generate_scored(lined_model, tokenizer, prompt, max_new_tokens=60, stop_after_lines=3)
+        n = len(stopped["token_ids"])
+        assert n < len(full["token_ids"])
+        assert stopped["token_ids"] == full["token_ids"][:n]
+        assert stopped["token_log_probs"] == pytest.approx(full["token_log_probs"][:n], abs=1e-4)
+        text = tokenizer.decode(stopped["token_ids"], skip_special_tokens=True)
+        assert count_complete_lines(text) == 3
+        assert full["completion"].splitlines()[:3] == stopped["completion"].splitlines()[:3]
+
+
+def test_rows_of_a_batch_stop_on_their_own(lined_model, tokenizer):
+    full = generate_scored_batch(lined_model, tokenizer, PROMPTS, max_new_tokens=60)
+    stopped = generate_scored_batch(lined_model, tokenizer, PROMPTS, max_new_tokens=60, stop_after_lines=[1, 3])
+    for f, s, lines in zip(full, stopped, (1, 3)):
+        n = len(s["token_ids"])
+        # the padding decoded after a stopped row is not part of its record
+        assert s["token_ids"] == f["token_ids"][:n]
+        assert count_complete_lines(tokenizer.decode(s["token_ids"], skip_special_tokens=True)) == lines
+    assert len(stopped[0]["token_ids"]) < len(stopped[1]["token_ids"])
+
+
+def test_prompt_lookup_stops_at_the_same_token(lined_model, tokenizer):
+    plain = generate_scored(lined_model, tokenizer, PROMPTS[1], max_new_tokens=60, stop_after_lines=2)
+    drafted = generate_scored(lined_model, tokenizer, PROMPTS[1], max_new_tokens=60,
+                              stop_after_lines=2, prompt_lookup=10)
+    assert drafted["token_ids"] == plain["token_ids"]
+
+
+@pytest.mark.parametrize("batch_stories", [True, False])
+def test_stop_early_keeps_the_titles(lined_model, tokenizer, batch_stories):
+    run = dict(num_features=3, stories_per_feature=2, batch_stories=batch_stories)
+    full, _ = run_agileai_titles_only_with_report(lined_model, tokenizer, PROJECT, **run)
+    early, _ = run_agileai_titles_only_with_report(lined_model, tokenizer, PROJECT, stop_early=True, **run)
+    assert titles_of(early) == titles_of(full)
+    # real titles, not the "Feature N" fillers
+    assert not any(f["title"].startswith("Feature ") for f in full["features"])
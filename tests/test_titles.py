@@ -0,0 +1,54 @@
+import pytest
+
+from scored_generation import generate_scored, generate_scored_batch
+from titles import (
+    generate_epic_title,
+    generate_feature_titles,
+    generate_story_titles_batched,
+    generate_story_titles_for_feature,
+)
+
+PROJECT = (
+    "AquaGuard monitors water quality in fish farms. Sensors report pH, oxygen and "
+    "temperature every minute. Farmers get alerts on their phones and see trends on a dashboard."
+)
+PROMPTS = [
+    "Project description:\nA mobile app for farmers.\n\nEpic title:",
+    "Project description:\nAn online shop that sells books, e-books and audio books.\n\nFeature titles:",
+    "Stories:",
+]
+
+
+def test_batched_records_match_one_prompt_at_a_time(tiny_model, tokenizer):
+    # prompts of different lengths: the shorter ones are left-padded
+    batched = generate_scored_batch(tiny_model, tokenizer, PROMPTS, max_new_tokens=12)
+    assert len(batched) == len(PROMPTS)
+    for prompt, rec in zip(PROMPTS, batched):
+        alone = generate_scored(tiny_model, tokenizer, prompt, max_new_tokens=12)
+        assert rec["token_ids"] == alone["token_ids"]
+        assert rec["token_log_probs"] == pytest.approx(alone["token_log_probs"], abs=1e-4)
+
+
+def test_batched_story_titles_match_one_feature_at_a_time(tiny_model, tokenizer):
+    epic = generate_epic_title(tiny_model, tokenizer, PROJECT)
+    features, _, _ = generate_feature_titles(tiny_model, tokenizer, PROJECT, epic, num_features=3)
+    # titles of different lengths, so the story prompts differ in length too
+    features[1]["title"] = "Alerts"
+    features[2]["title"] = "Dashboard with water quality trends per pond"
+
+    serial = [
+        generate_story_titles_for_feature(tiny_model, tokenizer, PROJECT, epic, feat, num_stories=2)
+        for feat in features
+    ]
+    batched = generate_story_titles_batched(tiny_model, tokenizer, PROJECT, epic, features, num_stories=2)
+
+    assert len(batched) == len(serial)
+    for (stories, conf, mean_lp), (b_stories, b_conf, b_mean_lp) in zip(serial, batched):
+        assert [s["title"] for s in b_stories] == [s["title"] for s in stories]
+        assert [s["id"] for s in b_stories] == [s["id"] for s in stories]
+        assert b_conf == pytest.approx(conf, abs=1e-5)
+        assert b_mean_lp == pytest.approx(mean_lp, abs=1e-4)
+
+
+def test_empty_batch(tiny_model, tokenizer):
+    assert generate_scored_batch(tiny_model, tokenizer, [], max_new_tokens=5) == []